@@ -1,15 +1,24 @@
 # -*- coding: utf-8 -*-
 import sys
+import importlib
 
-from typing import List
+from typing import Iterator, List, Tuple
 
+import numpy as np
+
+import OCC.TopAbs
 import OCC.TopoDS
-import aocutils.display.topology
+import OCC.BRepCheck
+import aocutils.topology
 
-from XcMath        import utils
+from point3d       import point3d, Points3D
+from point2d       import point2d, Points2D
 
-from point3d       import point3d
-from point2d       import point2d
+import icp_io
+import icp_binary
+import frames
+import surface_sampler
+import shape_index
 
 # http://opencascade.blogspot.com/2009/02/topology-and-geometry-in-open-cascade_12.html
 
@@ -24,34 +33,102 @@ curves: List[str] = ["Geom_BezierCurve", "Geom_BSplineCurve", "Geom_TrimmedCurve
                      "Geom_Line", "Geom_OffsetCurve", "ShapeExtend_ComplexCurve"]
 
 
-def get_surface(surface) -> str:
+def _is_handle(obj) -> bool:
     """
-    Given surface or its handle, return what kind it is
+    Given object, returns True if it is a handle, memoized per Python type
     """
-    ss = surface
-    if "Handle" in str(type(ss)): # we got handle, getting actual surface
-        ss = surface.GetObject()
+    t = type(obj)
+    rc = _handle_types.get(t)
+    if rc is None:
+        rc = "Handle" in str(t)
+        _handle_types[t] = rc
+    return rc
 
-    for s in surfaces:
-        if ss.IsKind(s):
-            return s
 
-    return None
+class KindTable(object):
+    """
+    Dispatch table from the OCC dynamic type name to the kind from the list
+    and to the DownCast of the handle to this kind
+    """
 
+    def __init__(self, kinds: List[str]):
+        """
+        Constructor. Build table for the list of known kinds,
+        names outside of it are resolved with IsKind once and remembered
+        """
+        self._kinds = kinds
+        self._kind  = {k: k for k in kinds}
+        self._cast  = dict()
 
-def get_curve(curve) -> str:
+    def _fallback(self, obj) -> str:
+        """
+        Given object, returns first kind from the list it IsKind of
+        """
+        for k in self._kinds:
+            if obj.IsKind(k):
+                return k
+        return None
+
+    def kind(self, obj) -> str:
+        """
+        Given object or its handle, returns its kind or None
+        """
+        if _is_handle(obj):
+            obj = obj.GetObject()
+
+        name = obj.DynamicType().GetObject().Name()
+        try:
+            return self._kind[name]
+        except KeyError:
+            rc = self._fallback(obj)
+            self._kind[name] = rc
+            return rc
+
+    def downcaster(self, kind: str):
+        """
+        Given kind, returns DownCast of the matching handle class,
+        looked up in OCC.Geom, OCC.ShapeExtend, ... by the kind prefix
+        """
+        f = self._cast.get(kind)
+        if f is None:
+            module = importlib.import_module("OCC." + kind.split("_")[0])
+            f = getattr(module, "Handle_" + kind).DownCast
+            self._cast[kind] = f
+        return f
+
+    def cast(self, handle):
+        """
+        Given base handle, returns it downcasted to the actual kind,
+        None if it is not a handle or of unknown kind
+        """
+        if not _is_handle(handle):
+            return None
+
+        k = self.kind(handle)
+        if k is None:
+            return None
+
+        return self.downcaster(k)(handle)
+
+
+_handle_types = dict()
+
+_surface_table = KindTable(surfaces)
+_curve_table   = KindTable(curves)
+
+
+def get_surface(surface) -> str:
     """
-    Given curve or its handle, return what kind it is
+    Given surface or its handle, return what kind it is
     """
-    cc = curve
-    if "Handle" in str(type(cc)): # we got handle, getting actual surface
-        cc = curve.GetObject()
+    return _surface_table.kind(surface)
 
-    for c in curves:
-        if cc.IsKind(c):
-            return c
 
-    return None
+def get_curve(curve) -> str:
+    """
+    Given curve or its handle, return what kind it is
+    """
+    return _curve_table.kind(curve)
 
 
 def str_shape(sh_type: int) -> str:
@@ -100,68 +177,14 @@ def cast_surface(surface):
     """
     Given the base surface handle, cast it to the actual one
     """
-    if not ("Handle" in str(type(surface))): # it is not a handle, bail out
-        return None
-
-    ss: str = get_surface(surface)
-    if ss is None:
-        return None
-
-    if ss == "Geom_BezierSurface":
-        return OCC.Geom.Handle_Geom_BezierSurface.DownCast(surface)
-    if ss == "Geom_BSplineSurface":
-        return OCC.Geom.Handle_Geom_BSplineSurface.DownCast(surface)
-    if ss == "Geom_RectangularTrimmedSurface":
-        return OCC.Geom.Handle_Geom_RectangularTrimmedSurface.DownCast(surface)
-    if ss == "Geom_ConicalSurface":
-        return OCC.Geom.Handle_Geom_ConicalSurface.DownCast(surface)
-    if ss == "Geom_Plane":
-        return OCC.Geom.Handle_Geom_Plane.DownCast(surface)
-    if ss == "Geom_SphericalSurface":
-        return OCC.Geom.Handle_Geom_SphericalSurface.DownCast(surface)
-    if ss == "Geom_ToroidalSurface":
-        return OCC.Geom.Handle_Geom_ToroidalSurface.DownCast(surface)
-    if ss == "Geom_SurfaceOfLinearExtrusion":
-        return OCC.Geom.Handle_Geom_SurfaceOfLinearExtrusion.DownCast(surface)
-    if ss == "Geom_SurfaceOfRevolution":
-        return OCC.Geom.Handle_Geom_SurfaceOfRevolution.DownCast(surface)
-
-    return None
+    return _surface_table.cast(surface)
 
 
 def cast_curve(curve):
     """
     Given the base curve handle, cast it to the actual one
     """
-    if not ("Handle" in str(type(curve))): # it is not a handle, bail out
-        return None
-
-    cc = get_curve(curve)
-    if cc is None:
-        return None
-
-    if cc == "Geom_BezierCurve":
-        return OCC.Geom.Handle_Geom_BezierCurve.DownCast(curve)
-    if cc == "Geom_BSplineCurve":
-        return OCC.Geom.Handle_Geom_BSplineCurve.DownCast(curve)
-    if cc == "Geom_TrimmedCurve":
-        return OCC.Geom.Handle_Geom_TrimmedCurve.DownCast(curve)
-    if cc == "Geom_Circle":
-        return OCC.Geom.Handle_Geom_Circle.DownCast(curve)
-    if cc == "Geom_Ellipse":
-        return OCC.Geom.Handle_Geom_Ellipse.DownCast(curve)
-    if cc == "Geom_Hyperbola":
-        return OCC.Geom.Handle_Geom_Hyperbola.DownCast(curve)
-    if cc == "Geom_Parabola":
-        return OCC.Geom.Handle_Geom_Parabola.DownCast(curve)
-    if cc == "Geom_Line":
-        return OCC.Geom.Handle_Geom_Line.DownCast(curve)
-    if cc == "Geom_OffsetCurve":
-        return OCC.Geom.Handle_Geom_OffsetCurve.DownCast(curve)
-    if cc == "ShapeExtend_ComplexCurve":
-        return OCC.Geom.Handle_ShapeExtend_ComplexCurve.DownCast(curve)
-
-    return None
+    return _curve_table.cast(curve)
 
 
 def print_solids(shape):
@@ -213,139 +236,77 @@ def print_all(shape, separator = None):
     """
     Print all pieces of the shape, with optional separator in between
     """
-    print_solids(shape)
-    if separator != None:
-        print(separator)
-    print_shells(shape)
-    if separator != None:
-        print(separator)
-    print_faces(shape)
-    if separator != None:
-        print(separator)
-    print_edges(shape)
-    if separator != None:
-        print(separator)
-    print_wires(shape)
+    index = shape_index.ShapeIndex(shape)
+    groups = [index.solids, index.shells, index.faces, index.edges, index.wires]
+    for k, group in enumerate(groups):
+        for i, piece in enumerate(group):
+            print("{0} {1}".format(i, type(piece)))
+        if separator != None and k != len(groups) - 1:
+            print(separator)
 
-def surface2gnuplot(surface, Nu:int = 40, Nv:int = 40) -> List[List[point3d]]:
+def surface2gnuplot(surface, Nu:int = 40, Nv:int = 40) -> Iterator[Tuple[Points3D, Points2D]]:
     """
-    Makes gnuplot representation of a surface,
-    returns both spatial values and parameters
+    Makes gnuplot representation of a surface, generator of blocks,
+    one per U row, with both spatial values and parameters.
+    Rows are sampled when consumed, None if surface is unbounded
     """
-    U1, U2, V1, V2 = surface.Bounds()
-
-    if U1 > 2e99 or U1 < -2e99:
-        return None
-
-    if U2 > 2e99 or U2 < -2e99:
-        return None
-
-    if V1 > 2e99 or V1 < -2e99:
-        return None
-
-    if V2 > 2e99 or V2 < -2e99:
+    if surface_sampler.grid_params(surface, Nu, Nv) is None:
         return None
 
-    stepu = (U2 - U1) / float(Nu)
-    stepv = (V2 - V1) / float(Nv)
+    return ((Points3D(frames.GNUPLOT(xyz), np.float64), Points2D(uv, np.float64))
+            for xyz, uv in surface_sampler.sample_rows(surface, Nu, Nv))
 
-    pt = OCC.gp.gp_Pnt()
-    blocks = list()
-    for ku in range(0, Nu+1):
-        u = utils.clamp(U1 + float(ku)*stepu, U1, U2)
-        block = list()
-        for kv in range(0, Nv+1):
-            v = utils.clamp(V1 + float(kv)*stepv, V1, V2)
-            surface.D0(u, v, pt)
-            block.append((point3d(pt.X(), pt.Z(), pt.Y()), point2d(u, v)))
-        blocks.append(block)
 
-    return blocks
+GNUPLOT_FMT = "  %.9g    %.9g    %.9g"
 
 
 def save_gnuplot_surface(prefix: str, i:int, blocks, full: bool = False):
     """
-    Save sphere block in the gnuplot format,
-    if full is set, print parameters as well
+    Save sphere block in the gnuplot format, in one pass over blocks,
+    each block is formatted with one call.
+    If full is set, print parameters as well
     """
     if blocks is None:
         return
 
+    fmt = GNUPLOT_FMT + ("    %.9g    %.9g" if full else "")
+
     fname: str = prefix + "_" + str(i) + ".dat"
     with open(fname, "w", encoding="utf-8") as f:
-        for block in blocks:
-            for pt in block:
-                pt3, pt2 = pt
-                if full:
-                    s = "  {0}    {1}    {2}    {3}    {4}\n".format(pt3.x, pt3.y, pt3.z, pt2.x, pt2.y)
-                else:
-                    s = "  {0}    {1}    {2}\n".format(pt3.x, pt3.y, pt3.z)
-                f.write(s)
+        for pts3, pts2 in blocks:
+            a = np.hstack((pts3.array, pts2.array)) if full else pts3.array
+            np.savetxt(f, a, fmt=fmt)
             f.write("\n")
 
 
-def write_ICP(RU, OuterCup, InnerCup, shift, yiw, riw, yow, row):
+def write_ICP(RU, OuterCup, InnerCup, shift, yiw, riw, yow, row, binary: bool = False) -> str:
     """
-    write the ICP compatible data to file
+    write the ICP compatible data to file atomically, returns file name.
+    If binary is set, .icpb sidecar is written after it from the text as written,
+    so both hold the same rounded values and the sidecar is not older than the text
     """
-    fname = "R" + str(RU) + "O" + str(OuterCup) + "I" + InnerCup + ".icp"
+    fname = icp_io.icp_name(RU, OuterCup, InnerCup)
 
-    with open(fname, 'w') as os:
-        save_ICP(RU, OuterCup, InnerCup, shift, yiw, riw, yow, row, os)
+    cup = icp_io.make_cup(RU, OuterCup, InnerCup, shift, yiw, riw, yow, row)
+    icp_io.write(fname, cup)
+    if binary:
+        icp_binary.text_to_binary(fname)
+
+    return fname
 
 
 def save_ICP(RU, OuterCup, InnerCup, shift, yiw, riw, yow, row, os = sys.stdout):
     """
-    write the ICP compatible data to output stream os
+    write the ICP compatible data to output stream os,
+    raises ValueError if wall arrays are of different length
     """
     if RU is None:
         return
 
-    if yiw is None:
-        return
-
-    if riw is None:
+    if yiw is None or riw is None or yow is None or row is None:
         return
 
-    if yow is None:
-        return
-
-    if row is None:
-        return
-
-    # RU
-    os.write(RU)
-    os.write("\n")
-
-    # Outer cup
-    os.write(OuterCup)
-    os.write("\n")
-
-    # Inner cup
-    os.write(InnerCup)
-    os.write("\n")
-
-    # nof points in the inner wall
-    niw = len(riw)
-    if niw != len(yiw):
-        return None
-    os.write(str(niw))
-    os.write("\n")
-
-    # inner wall
-    for r, y in zip(riw, yiw):
-        os.write("{0:13.6e} {1:13.6e}\n".format(shift - y, r))
-
-    # nof points in the outer wall
-    now = len(row)
-    if now != len(yow):
-        return None
-    os.write(str(now))
-    os.write("\n")
-
-    # outer wall
-    for r, y in zip(row, yow):
-        os.write("{0:13.6e} {1:13.6e}\n".format(shift - y, r))
+    os.write(icp_io.dumps(icp_io.make_cup(RU, OuterCup, InnerCup, shift, yiw, riw, yow, row)))
 
 
 def print_flags(shape):
@@ -359,3 +320,47 @@ def print_flags(shape):
     print(shape.Convex())
     print(shape.Free())
     print(shape.Infinite())
+
+
+if __name__ == "__main__":
+
+    import os
+    import glob
+    import time
+
+    import OCC.BRep
+    import OCC.Geom
+    import step_cache
+
+    def legacy_kind(surface) -> str:
+        ss = surface
+        if "Handle" in str(type(ss)):
+            ss = surface.GetObject()
+        return _surface_table._fallback(ss)
+
+    def legacy_cast(surface):
+        if not ("Handle" in str(type(surface))):
+            return None
+        k = legacy_kind(surface)
+        if k is None:
+            return None
+        return getattr(OCC.Geom, "Handle_" + k).DownCast(surface)
+
+    # the large cups, ~3 MB each
+    for fname in sorted(glob.glob("cups/*.STEP")):
+        if os.path.getsize(fname) < 3000000:
+            continue
+
+        handles = list()
+        for shape in step_cache.read_step(fname):
+            index = shape_index.ShapeIndex(shape)
+            handles.extend(OCC.BRep.BRep_Tool.Surface(face) for face in index.faces)
+
+        for title, kind, cast in (("legacy",   legacy_kind, legacy_cast),
+                                  ("dispatch", get_surface, cast_surface)):
+            t = time.perf_counter()
+            for h in handles:
+                kind(h)
+                cast(h)
+            t = time.perf_counter() - t
+            print("{0:8s} {1:6d} faces {2:9.3f} ms {3:7.2f} us/face {4}".format(title, len(handles), 1000.0*t, 1.0e6*t/max(len(handles), 1), os.path.basename(fname)))
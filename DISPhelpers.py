@@ -2,17 +2,50 @@
 
 from __future__ import print_function
 
-import OCC.TopoDS
-import aocutils.display.topology
+from functools import partial
+
+r"""This module contains several helper functions to deal with OCC display.
+GUI modules are imported when display is actually requested, importing this module is cheap"""
+
+# face kinds with their own entry in the faces menu
+FACE_KINDS = (("Bezier",      "Geom_BezierSurface"),
+              ("Conical",     "Geom_ConicalSurface"),
+              ("Cylindrical", "Geom_CylindricalSurface"),
+              ("Spherical",   "Geom_SphericalSurface"),
+              ("BSpline",     "Geom_BSplineSurface"),
+              ("Plane",       "Geom_Plane"),
+              ("Toro",        "Geom_ToroidalSurface"),
+              ("RecT",        "Geom_RectangularTrimmedSurface"),
+              ("LinExt",      "Geom_SurfaceOfLinearExtrusion"),
+              ("SurfRev",     "Geom_SurfaceOfRevolution"))
+
+
+def _topology():
+    """
+    Import display topology helpers on first use
+    """
+    import aocutils.display.topology
+    return aocutils.display.topology
+
+
+def init_display():
+    """
+    Initialize GUI with the default backend, returns
+    (display, start_display, add_menu, add_function_to_menu)
+    """
+    import OCC.Display.SimpleGui
+    import aocutils.display.defaults
+    import aocutils.display.backends
+
+    return OCC.Display.SimpleGui.init_display(aocutils.display.defaults.backend)
 
-r"""This module contains several helper functions to deal with OCC display"""
 
 def display_solids(display, shape, event = None):
     """
     Display shape solids given the display
     """
     display.EraseAll()
-    aocutils.display.topology.solids(display, shape, transparency=0.8)
+    _topology().solids(display, shape, transparency=0.8)
     display.FitAll()
     display.View_Iso()
 
@@ -22,7 +55,7 @@ def display_shells(display, shape, event = None):
     Display shape shells given the display
     """
     display.EraseAll()
-    aocutils.display.topology.shells(display, shape, transparency=0.8)
+    _topology().shells(display, shape, transparency=0.8)
     display.FitAll()
     display.View_Iso()
 
@@ -32,7 +65,7 @@ def display_edges(display, shape, event = None):
     Display shape edges given the display
     """
     display.EraseAll()
-    aocutils.display.topology.edges(display, shape)
+    _topology().edges(display, shape)
     display.FitAll()
     display.View_Iso()
 
@@ -42,7 +75,7 @@ def display_wires(display, shape, event = None):
     Display shape wires given the display
     """
     display.EraseAll()
-    aocutils.display.topology.wires(display, shape)
+    _topology().wires(display, shape)
     display.FitAll()
     display.View_Iso()
 
@@ -52,6 +85,86 @@ def display_faces(display, shape, event = None):
     Display shape faces given the display
     """
     display.EraseAll()
-    aocutils.display.topology.faces(display, shape, transparency=0.8)
+    _topology().faces(display, shape, transparency=0.8)
     display.FitAll()
     display.View_Iso()
+
+
+def display_faces_of_kind(display, shape, pattern: str, event = None) -> None:
+    """
+    Display shape faces which surface kind contains pattern, numbered, given the display
+    """
+    import OCC.AIS
+    import OCC.BRep
+    import aocutils.brep.face
+    import aocutils.display.color
+    import aocutils.topology
+
+    import CADhelpers
+
+    transparency=0.8
+    show_numbers=True
+    numbers_height=20
+    color_sequence = aocutils.display.color.prism_color_sequence
+
+    display.EraseAll()
+
+    the_faces = aocutils.topology.Topo(shape, return_iter=False).faces
+    ais_context = display.GetContext().GetObject()
+
+    for i, face in enumerate(the_faces):
+        s = OCC.BRep.BRep_Tool.Surface(face).GetObject() # make surface from face, get back handle
+        t = CADhelpers.get_surface(s)
+        if pattern not in t:
+            continue
+
+        ais_face = OCC.AIS.AIS_Shape(face)
+        ais_face.SetColor(color_sequence[i % len(color_sequence)])
+        ais_face.SetTransparency(transparency)
+        if show_numbers:
+            display.DisplayMessage(point=aocutils.brep.face.Face(face).midpoint,
+                                   text_to_write = "{0}".format(i),
+                                   height=numbers_height,
+                                   message_color=(1, 0, 0))
+        ais_context.Display(ais_face.GetHandle())
+
+    display.FitAll()
+    display.View_Iso()
+
+
+def _add(add_function_to_menu, menu: str, name: str, f, *args) -> None:
+    """
+    Add function with bound arguments to the menu under given name
+    """
+    p = partial(f, *args)
+    p.__name__ = name
+    add_function_to_menu(menu, p)
+
+
+def display_all(display, shape, add_menu, add_function_to_menu, by_kind: bool = True) -> None:
+    """
+    display every part of the shape, faces either split by surface kind or all together
+    """
+    add_menu('solids')
+    _add(add_function_to_menu, 'solids', "dsolids", display_solids, display, shape)
+    add_menu('edges')
+    _add(add_function_to_menu, 'edges', "dedges", display_edges, display, shape)
+    add_menu('faces')
+    if by_kind:
+        for name, kind in FACE_KINDS:
+            _add(add_function_to_menu, 'faces', name, display_faces_of_kind, display, shape, kind)
+    else:
+        _add(add_function_to_menu, 'faces', "dfaces", display_faces, display, shape)
+    add_menu('shells')
+    _add(add_function_to_menu, 'shells', "dshells", display_shells, display, shape)
+    add_menu('wires')
+    _add(add_function_to_menu, 'wires', "dwires", display_wires, display, shape)
+
+
+def show(shape, by_kind: bool = True) -> None:
+    """
+    Open GUI with the menus for the shape and run it until closed
+    """
+    display, start_display, add_menu, add_function_to_menu = init_display()
+    display_all(display, shape, add_menu, add_function_to_menu, by_kind)
+    start_display()
@@ -0,0 +1,186 @@
+# coding: utf-8
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import logging
+import argparse
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+r"""This module runs import -> shell/midline -> ICP/OCP pipeline over the whole cups catalogue"""
+
+logger = logging.getLogger(__name__)
+
+STEP_PATTERNS = ("*.STEP", "*.step", "*.stp", "*.STP")
+
+# sources the outputs depend on, hashed into the manifest parameters
+PIPELINE = ("import_cup", "import_Ocup", "import_curve", "CADhelpers", "cup_profile", "face_roles",
+            "offset_curve", "surface_sampler", "shape_index", "simplify", "dedupe", "frames",
+            "icp_io", "icp_binary", "point2d", "point3d", "Idx", "XcIO.write_OCP")
+
+
+def discover(root: str = "cups"):
+    """
+    Given the root folder, returns sorted list of all STEP files below it
+    """
+    found = set()
+    for pattern in STEP_PATTERNS:
+        found.update(glob.glob(os.path.join(root, "**", pattern), recursive=True))
+    return sorted(found)
+
+
+def make_job(fname: str, outdir: str):
+    """
+    Given STEP file name, returns job description: which pipeline to run,
+    where to put the output and how to name the inner cup
+    """
+    stem = os.path.splitext(os.path.basename(fname))[0]
+    name = stem.lower()
+
+    if "fiducial" in name:
+        kind = "fiducial"
+    elif "outer" in name:
+        kind = "outer_cup"
+    else:
+        kind = "cup"
+
+    # NS01 -> S01, as in R8O1IS01.icp
+    m = re.search(r"NS(\d+)", stem)
+    inner = "S" + m.group(1) if m else ("G01" if kind == "outer_cup" else "S01")
+
+    return {"step":   os.path.abspath(fname),
+            "kind":   kind,
+            "inner":  inner,
+            "outdir": os.path.abspath(os.path.join(outdir, stem))}
+
+
+def run_job(job, force: bool = False):
+    """
+    Run single job in the current process unless its outputs are up to date,
+    returns its manifest record with the action taken and the reason
+    """
+    rec = dict(job)
+    rec["outputs"] = list()
+
+    cwd = os.getcwd()
+    t = time.perf_counter()
+    c = time.process_time()
+    try:
+        # import before changing folder, scripts are found next to this module
+        import deps
+        import step_cache
+        if job["kind"] == "fiducial":
+            import import_curve
+            convert, faces, kwargs = import_curve.convert, None, {}
+        elif job["kind"] == "outer_cup":
+            import import_Ocup
+            convert, faces, kwargs = import_Ocup.convert, import_Ocup.faces, {"InnerCup": job["inner"]}
+        else:
+            import import_cup
+            convert, faces, kwargs = import_cup.convert, import_cup.faces, {"InnerCup": job["inner"]}
+
+        params = deps.params_of(convert, job["step"], **kwargs)
+        params["kind"] = job["kind"]
+        params["pipeline"] = deps.code_hash(PIPELINE)
+        input_hash = step_cache.file_hash(job["step"])
+
+        os.makedirs(job["outdir"], exist_ok=True)
+
+        reason = "forced" if force else deps.check(job["outdir"], input_hash, params)
+        rec["params"] = params
+        if reason is None:
+            rec["action"] = "skipped"
+            rec["reason"] = "up to date"
+            rec["status"] = "ok"
+        else:
+            rec["action"] = "rebuilt"
+            rec["reason"] = reason
+
+            os.chdir(job["outdir"]) # ICP and OCP writers put files in the current folder
+            before = deps.snapshot(".")
+
+            if faces is not None:
+                # faces chosen by role detection are recorded, and exactly those are converted
+                outer, inner = faces(job["step"], kwargs.get("outer_faces"), kwargs.get("inner_faces"))
+                kwargs = dict(kwargs, outer_faces=outer, inner_faces=inner)
+                params["faces"] = {"outer": list(outer), "inner": list(inner)}
+
+            convert(job["step"], **kwargs)
+
+            rec["outputs"] = deps.changed(before, deps.snapshot("."))
+            deps.record(".", input_hash, params, rec["outputs"])
+            rec["status"] = "ok"
+    except Exception:
+        rec["status"] = "error"
+        rec["error"]  = traceback.format_exc()
+    finally:
+        os.chdir(cwd)
+
+    rec["seconds"]     = time.perf_counter() - t
+    rec["cpu_seconds"] = time.process_time() - c
+    return rec
+
+
+def run_batch(root: str = "cups", outdir: str = "batch_out", workers: int = None, force: bool = False):
+    """
+    Given the cups root and output folder, run all jobs which are out of date
+    in a process pool, write manifest.json into outdir and return the list of job records
+    """
+    jobs = [make_job(fname, outdir) for fname in discover(root)]
+
+    t = time.perf_counter()
+    records = list()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_job, job, force): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    rec = future.result()
+                except Exception:
+                    # worker died, e.g. OCC crash breaks the whole pool
+                    rec = dict(futures[future], outputs=list(), status="error", error=traceback.format_exc(),
+                               seconds=0.0, cpu_seconds=0.0)
+                logger.info("{0:6s} {1:8s} {2:8.2f}s {3} ({4})".format(rec["status"], rec.get("action", "-"), rec["seconds"], rec["step"], rec.get("reason", "")))
+                records.append(rec)
+    finally:
+        wall = time.perf_counter() - t
+
+        records.sort(key=lambda r: r["step"])
+
+        os.makedirs(outdir, exist_ok=True)
+        manifest = {"root": os.path.abspath(root), "wall_seconds": wall,
+                    "job_seconds": sum(r["seconds"] for r in records),
+                    "cpu_seconds": sum(r["cpu_seconds"] for r in records), "jobs": records}
+        with open(os.path.join(outdir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+
+    return records
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s :: %(levelname)6s :: %(module)20s :: %(lineno)3d :: %(message)s')
+
+    parser = argparse.ArgumentParser(description="Convert every STEP file of the cups catalogue")
+    parser.add_argument("--root",    default="cups",      help="folder to search for STEP files")
+    parser.add_argument("--outdir",  default="batch_out", help="output folder, one subfolder per STEP file")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--force",   action="store_true", help="rebuild even up to date outputs")
+    args = parser.parse_args()
+
+    records = run_batch(args.root, args.outdir, args.workers, args.force)
+
+    for r in records:
+        if r.get("action") == "rebuilt":
+            print("rebuilt {0}: {1}".format(os.path.basename(r["step"]), r["reason"]))
+
+    failed  = [r for r in records if r["status"] != "ok"]
+    skipped = [r for r in records if r.get("action") == "skipped"]
+    print("{0} jobs, {1} up to date, {2} failed, manifest in {3}".format(len(records), len(skipped), len(failed), os.path.join(args.outdir, "manifest.json")))
+
+    sys.exit(1 if failed else 0)
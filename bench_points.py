@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import math
+import timeit
+import numpy as np
+
+from Idx     import X, Y, Z
+from point2d import point2d
+from point3d import point3d
+
+r"""This module benchmarks slotted point2d/point3d against the former np.float32 based classes"""
+
+N: int = 100000 # points per run
+
+
+class legacy_point3d(object):
+    """
+    point3d as it was: __dict__ and np.float32 per coordinate
+    """
+
+    def __init__(self, x = np.float32(0.0), y = np.float32(0.0), z = np.float32(0.0)):
+        self._x = np.float32( x )
+        self._y = np.float32( y )
+        self._z = np.float32( z )
+
+    @property
+    def x(self):
+        return self._x
+
+    @property
+    def y(self):
+        return self._y
+
+    @property
+    def z(self):
+        return self._z
+
+    @staticmethod
+    def cvt2array(tuples):
+        rc = []
+        for t in tuples:
+            rc.append(legacy_point3d(np.float32(t[X]), np.float32(t[Y]), np.float32(t[Z])))
+        return rc
+
+
+def bench(title: str, f, number: int = 5) -> float:
+    """
+    Given title and callable, print and return best time per point in ns
+    """
+    t = min(timeit.repeat(f, number=1, repeat=number)) / N * 1.0e9
+    print("{0:40s} {1:9.1f} ns/point".format(title, t))
+    return t
+
+
+if __name__ == "__main__":
+
+    xyz = np.random.rand(N, 3).tolist()
+
+    legacy = legacy_point3d.cvt2array(xyz)
+    slotted = point3d.cvt2array(xyz)
+
+    for title, cls, pts in (("legacy", legacy_point3d, legacy), ("slotted", point3d, slotted)):
+        bench("{0} construction".format(title), lambda: [cls(x, y, z) for x, y, z in xyz])
+        bench("{0} cvt2array".format(title), lambda: cls.cvt2array(xyz))
+        bench("{0} attribute access".format(title), lambda: sum(p.x + p.y + p.z for p in pts))
+
+    # segment lengths, unpacked by hand vs vector arithmetic
+    bench("legacy segment length", lambda: [math.sqrt((b.x - a.x)**2 + (b.y - a.y)**2 + (b.z - a.z)**2) for a, b in zip(legacy, legacy[1:])])
+    bench("slotted segment length", lambda: [(b - a).norm() for a, b in zip(slotted, slotted[1:])])
+
+    print("legacy  {0} bytes/point".format(sys.getsizeof(legacy[0]) + sys.getsizeof(legacy[0].__dict__) + 3*sys.getsizeof(legacy[0].x)))
+    print("slotted {0} bytes/point".format(sys.getsizeof(slotted[0]) + 3*sys.getsizeof(slotted[0].x)))
+
+    p = point2d(3.0, 4.0)
+    q = point3d(1.0, 0.0, 0.0).cross(point3d(0.0, 1.0, 0.0))
+    print(p.norm(), q, hash(p) == hash(point2d(3.0, 4.0)))
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import subprocess
+
+r"""This module measures cold start of the headless conversion path: fresh interpreter,
+import of the converter modules, no display. Fails if the budget is exceeded or GUI got imported"""
+
+MODULES = ("import_cup", "import_Ocup", "import_curve", "batch_cups", "sweep")
+
+BUDGET: float = 3.0 # seconds per module import in a fresh interpreter
+
+RUNS: int = 5 # cold starts per module, best one is reported
+
+# modules which must not be loaded on the headless path
+GUI_PREFIXES = ("OCC.Display", "aocutils.display", "PyQt4", "PyQt5", "PySide", "wx", "OpenGL", "tkinter")
+
+PROBE = r"""
+import sys, time, json
+t = time.perf_counter()
+import {0}
+t = time.perf_counter() - t
+gui = sorted(m for m in sys.modules if m.startswith({1!r}))
+print(json.dumps({{"seconds": t, "gui": gui}}))
+"""
+
+
+def cold_start(module: str, runs: int = RUNS):
+    """
+    Given module name, imports it in fresh interpreters, returns (best seconds, loaded GUI modules)
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ)
+    env.pop("DISPLAY", None) # as on batch workers
+
+    best = None
+    gui  = list()
+    for k in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE.format(module, GUI_PREFIXES)], cwd=here, env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        rec  = json.loads(out.stdout.strip().splitlines()[-1])
+        best = rec["seconds"] if best is None else min(best, rec["seconds"])
+        gui  = rec["gui"]
+
+    return (best, gui)
+
+
+if __name__ == "__main__":
+
+    failed = False
+    for module in (sys.argv[1:] or MODULES):
+        try:
+            t, gui = cold_start(module)
+        except subprocess.CalledProcessError as e:
+            print("{0:14s} import failed: {1}".format(module, e.stderr.strip().splitlines()[-1] if e.stderr.strip() else e))
+            failed = True
+            continue
+
+        ok = t <= BUDGET and not gui
+        failed = failed or not ok
+        print("{0:14s} {1:8.3f} s  budget {2:.1f} s  {3}{4}".format(module, t, BUDGET, "ok" if ok else "FAIL",
+                                                                    "  GUI: " + ", ".join(gui) if gui else ""))
+
+    sys.exit(1 if failed else 0)
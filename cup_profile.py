@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+import math
+import numpy as np
+
+import dedupe
+import surface_sampler
+
+from Idx import Y, Z
+
+r"""This module computes (y, r) meridian profiles of the cup shells"""
+
+EPS: float = 1.0e-3 # distance below which profile point is the same as the last kept one
+
+PROBES = np.array([0.25, 0.5, 0.75]) # where chordal deviation is checked inside the interval
+
+
+def meridian(surface, u: float, v):
+    """
+    Given surface, fixed u and array of v parameters,
+    returns (y, r) arrays of the meridian profile
+    """
+    pts = surface_sampler.evaluate(surface, u, v)
+    return (pts[..., Y], pts[..., Z])
+
+
+def meridian_tangent(surface, u: float, v):
+    """
+    Given surface, fixed u and array of v parameters,
+    returns (ty, tr) arrays of the meridian derivative along v
+    """
+    d = surface_sampler.derivative_v(surface, u, v)
+    return (d[..., Y], d[..., Z])
+
+
+def segment_distance(qy, qr, ay, ar, by, br):
+    """
+    Given probe points q and segments [a, b] as broadcastable arrays,
+    returns distances from probes to segments
+    """
+    dy = by - ay
+    dr = br - ar
+    ll = dy*dy + dr*dr
+    t  = np.where(ll > 0.0, ((qy - ay)*dy + (qr - ar)*dr) / np.where(ll > 0.0, ll, 1.0), 0.0)
+    t  = np.clip(t, 0.0, 1.0)
+    return np.hypot(qy - (ay + t*dy), qr - (ar + t*dr))
+
+
+def adaptive_params(surface, u: float, v1: float, v2: float, tol: float,
+                    N0: int = 2, max_level: int = 24):
+    """
+    Given surface, fixed u and [v1, v2] range, returns v parameters such that
+    the meridian polyline deviates from the curve by no more than tol.
+
+    Intervals are bisected level by level, all intervals of the level at once,
+    chordal deviation is probed at quarter points of each interval
+    """
+    v = np.linspace(v1, v2, N0+1)
+    y, r = meridian(surface, u, v)
+
+    for level in range(max_level):
+        a = v[:-1]
+        h = v[1:] - a
+        qy, qr = meridian(surface, u, a[:, None] + h[:, None]*PROBES)
+        dev = segment_distance(qy, qr, y[:-1, None], r[:-1, None], y[1:, None], r[1:, None])
+
+        split = dev.max(axis=1) > tol
+        if not split.any():
+            break
+
+        # insert interval middles, they were already evaluated as probes
+        m = np.flatnonzero(split)
+        v = np.insert(v, m+1, a[m] + 0.5*h[m])
+        y = np.insert(y, m+1, qy[m, 1])
+        r = np.insert(r, m+1, qr[m, 1])
+
+    return v
+
+
+def max_deviation(surface, u: float, v, Nref: int = 64):
+    """
+    Given surface, fixed u and sorted v samples, returns max distance
+    from the true meridian to the sampled polyline, measured
+    on Nref reference points per interval
+    """
+    v = np.asarray(v, dtype=np.float64)
+    y, r = meridian(surface, u, v)
+
+    t = np.linspace(0.0, 1.0, Nref+1)
+    qy, qr = meridian(surface, u, v[:-1, None] + (v[1:] - v[:-1])[:, None]*t)
+    dev = segment_distance(qy, qr, y[:-1, None], r[:-1, None], y[1:, None], r[1:, None])
+
+    return float(dev.max()) if dev.size else 0.0
+
+
+def _params(surface, u: float, v1: float, v2: float, N: int, tol: float):
+    """
+    Either uniform N intervals or adaptive parameters for given tolerance
+    """
+    if tol is None:
+        return np.linspace(v1, v2, N+1)
+    return adaptive_params(surface, u, v1, v2, tol)
+
+
+def sphere_samples(sphere, Nv: int = 40, tol: float = None):
+    """
+    Given sphere surface, returns (y, r) arrays of its lower half meridian at u = pi/2
+    """
+    U1s, U2s, V1s, V2s = sphere.Bounds()
+
+    us = 0.5*math.pi
+    return meridian(sphere, us, _params(sphere, us, V1s, 0.5*(V1s + V2s), Nv, tol))
+
+
+def wall_samples(cone, top, u_wall: float, Nv: int = 40, Nt: int = 4, tol: float = None):
+    """
+    Given cone and top surfaces, returns (y, r, ty, tr) arrays of their meridians
+    at u_wall, cone first, with the derivatives along v from the surfaces
+    """
+    U1c, U2c, V1c, V2c = cone.Bounds()
+    U1t, U2t, V1t, V2t = top.Bounds()
+
+    vc = _params(cone, u_wall, V1c, V2c, Nv, tol)
+    vt = _params(top,  u_wall, V1t, V2t, Nt, tol)
+
+    yc, rc = meridian(cone, u_wall, vc)
+    yt, rt = meridian(top,  u_wall, vt)
+    tyc, trc = meridian_tangent(cone, u_wall, vc)
+    tyt, trt = meridian_tangent(top,  u_wall, vt)
+
+    return (np.concatenate((yc, yt)), np.concatenate((rc, rt)),
+            np.concatenate((tyc, tyt)), np.concatenate((trc, trt)))
+
+
+def join_profile(sphere, wall, ymin: float, eps: float = EPS):
+    """
+    Given (y, r) sphere samples, (y, r) wall samples and y where sphere ends,
+    returns (y, r) profile of the shell, sphere part goes in reverse order
+    """
+    ys, rs = sphere
+    inside = ys <= ymin
+    ys = ys[inside]
+    rs = rs[inside]
+
+    # duplicates are checked in sampling order, across the pieces
+    y = np.concatenate((ys, wall[0]))
+    r = np.concatenate((rs, wall[1]))
+    keep = dedupe.consecutive(np.stack((y, r), axis=-1), eps)
+
+    ns = len(ys)
+    ks = keep[keep < ns]
+    kw = keep[keep >= ns]
+
+    yy = np.concatenate((y[ks][::-1], y[kw]))
+    rr = np.concatenate((r[ks][::-1], r[kw]))
+
+    return (yy, rr)
+
+
+def shell_profile(surfaces, u_cut: float, u_wall: float, offset = (0.0, 0.0),
+                  Nv: int = 40, Nt: int = 4, eps: float = EPS, tol: float = None):
+    """
+    Given list of sphere, cone and top surfaces, computes (y, r) profile of the cup shell
+
+    u_cut  - u at which cone start is evaluated to find where sphere ends
+    u_wall - u at which cone and top meridians are taken, sphere is taken at pi/2
+    offset - (dy, dr) shift applied to cone, top and the sphere cut
+    Nv     - number of intervals for the sphere and cone
+    Nt     - number of intervals for the top
+    tol    - if set, Nv and Nt are ignored and every piece is sampled
+             adaptively with max chordal deviation tol
+
+    Returns tuple of (y, r) numpy arrays, sphere part goes in reverse order
+    """
+    sphere = surfaces[0]
+    cone   = surfaces[1]
+    top    = surfaces[2]
+
+    U1c, U2c, V1c, V2c = cone.Bounds()
+
+    dy, dr = offset
+
+    # determine where sphere ends
+    ymin, _ = meridian(cone, u_cut, V1c)
+    ymin = float(ymin) + dy
+
+    y, r, _, _ = wall_samples(cone, top, u_wall, Nv, Nt, tol)
+
+    return join_profile(sphere_samples(sphere, Nv, tol), (y + dy, r + dr), ymin, eps)
+
+
+if __name__ == "__main__":
+
+    import glob
+    import time
+
+    import OCC.BRep
+    import aocutils.topology
+
+    import CADhelpers
+    import import_cup
+
+    # points versus max deviation, fixed Nv = 40 against adaptive sampling,
+    # for every analytic meridian of every cup
+    Nv   = 40
+    tols = [1.0e-1, 1.0e-2, 1.0e-3]
+
+    print("{0:>5s} {1:>24s} {2:>12s} {3:>5s}".format("face", "kind", "tol", "npts") + "    max dev")
+    for fname in sorted(glob.glob("cups/**/*.STEP", recursive=True)):
+        print(fname)
+        for shape in import_cup.readSTEP(fname):
+            the_faces = aocutils.topology.Topo(shape, return_iter=False).faces
+            for i, face in enumerate(the_faces):
+                ss = CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(face)).GetObject()
+                kind, _ = surface_sampler.resolve(ss)
+                if kind not in ("Geom_SphericalSurface", "Geom_ConicalSurface", "Geom_ToroidalSurface"):
+                    continue
+
+                U1, U2, V1, V2 = ss.Bounds() # trimmed bounds, not the basis ones
+                u = 0.5*math.pi
+
+                v = np.linspace(V1, V2, Nv+1)
+                print("{0:5d} {1:>24s} {2:>12s} {3:5d}    {4:.3e}".format(i, kind, "Nv=40", len(v), max_deviation(ss, u, v)))
+                for tol in tols:
+                    t = time.perf_counter()
+                    v = adaptive_params(ss, u, V1, V2, tol)
+                    t = time.perf_counter() - t
+                    print("{0:5d} {1:>24s} {2:12.1e} {3:5d}    {4:.3e}   {5:.2f} ms".format(i, kind, tol, len(v), max_deviation(ss, u, v), 1000.0*t))
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+import math
+import itertools
+import numpy as np
+
+r"""This module removes duplicate points from 2D and 3D point sequences, returning kept indices"""
+
+CONSECUTIVE: str = "consecutive" # compare with the preceding points only
+GLOBAL:      str = "global"      # compare with every point kept so far
+
+
+def _as_array(pts, columns = None) -> np.ndarray:
+    """
+    Given (n, d) array-like or Points2D/Points3D and optional columns to compare,
+    returns (n, k) float64 array
+    """
+    a = np.asarray(pts, dtype=np.float64)
+    if a.ndim == 1:
+        a = a[:, None]
+    if columns is not None:
+        a = a[:, list(columns)]
+    return a
+
+
+def consecutive(pts, tol: float, columns = None, previous: bool = False) -> np.ndarray:
+    """
+    Given points in order and tolerance, returns indices of the points
+    which are farther than tol from the last kept point.
+    First point is always kept.
+
+    columns  - coordinates to measure distance with, all by default
+    previous - compare with the previous sample instead of the last kept one,
+               a run of small steps is then removed even if it drifts beyond tol
+    """
+    a = _as_array(pts, columns)
+    n = len(a)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    keep = np.empty(n, dtype=np.bool_)
+    keep[0]  = True
+    keep[1:] = np.linalg.norm(np.diff(a, axis=0), axis=-1) > tol
+
+    if previous:
+        return np.flatnonzero(keep)
+
+    # after a kept point the step test is exact, after a dropped one the point
+    # is compared with the last kept point, which may flip it either way.
+    # Only points after a drop are visited, in order
+    xs = a.tolist()
+    kept = keep.tolist()
+    last = 0
+    done = 0
+    for k in (np.flatnonzero(~keep[:-1]) + 1).tolist():
+        if k <= done:
+            continue
+        while True:
+            if kept[k-1]:
+                last = k - 1
+            elif k - 1 != done:
+                last = k - 2 # k-1 dropped by the exact step test, k-2 is kept
+            kept[k] = math.dist(xs[k], xs[last]) > tol
+            if kept[k]:
+                last = k
+            done = k
+            # point after a dropped one may be missing from the list, visit it now
+            if kept[k] or k + 1 == n:
+                break
+            k += 1
+
+    return np.flatnonzero(kept)
+
+
+def _neighbour_pairs(a, tol: float):
+    """
+    Given (n, d) points and tolerance, returns arrays (i, j) of all pairs
+    with j < i and distance not above tol.
+    Cells of size tol are sorted once, the 3^d neighbour cells are found by binary search
+    """
+    n, dim = a.shape
+    cells = np.floor(a / tol).astype(np.int64)
+    shifts = list(itertools.product((-1, 0, 1), repeat=dim))
+
+    # cell coordinates and their neighbours ranked per axis, then packed into one int64 key,
+    # rows of int64 are compared as records if the packed key would overflow
+    axes = [np.unique(np.concatenate((c - 1, c, c + 1))) for c in cells.T]
+    if np.prod([float(len(v)) for v in axes]) < 2.0**62:
+        radix = np.cumprod([1] + [len(v) for v in axes[:-1]]).astype(np.int64)
+        ranks = [np.searchsorted(v, cells[:, k])*radix[k] for k, v in enumerate(axes)]
+        keys  = sum(ranks)
+        order = np.argsort(keys, kind="stable")
+        ranks = [r[order] for r in ranks]
+
+        def shifted(d):
+            return sum(r + o*radix[k] for k, (r, o) in enumerate(zip(ranks, d)))
+    else:
+        rows  = [("c{0}".format(c), np.int64) for c in range(dim)]
+        keys  = np.ascontiguousarray(cells).view(rows).ravel()
+        order = np.argsort(keys, kind="stable")
+        cells = cells[order]
+
+        def shifted(d):
+            return np.ascontiguousarray(cells + np.array(d, dtype=np.int64)).view(rows).ravel()
+
+    # points are visited in key order, so neighbour lookups are nearly sorted
+    ukeys, start, count = np.unique(keys[order], return_index=True, return_counts=True)
+
+    tol2 = tol*tol
+    ii = list()
+    jj = list()
+    for d in shifts:
+        nb  = shifted(d)
+        pos = np.minimum(np.searchsorted(ukeys, nb), len(ukeys) - 1)
+        hit = np.flatnonzero(ukeys[pos] == nb)
+        if len(hit) == 0:
+            continue
+
+        # expand every hit into the run of points of its neighbour cell
+        cnt = count[pos[hit]]
+        i   = order[np.repeat(hit, cnt)]
+        off = np.arange(len(i)) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+        j   = order[np.repeat(start[pos[hit]], cnt) + off]
+
+        m = j < i
+        i, j = i[m], j[m]
+        diff = a[i] - a[j]
+        m = np.einsum("ij,ij->i", diff, diff) <= tol2
+        ii.append(i[m])
+        jj.append(j[m])
+
+    if not ii:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+    return (np.concatenate(ii), np.concatenate(jj))
+
+
+def grid(pts, tol: float, columns = None) -> np.ndarray:
+    """
+    Given points and tolerance, returns indices of the points which
+    are farther than tol from every earlier kept point, in input order.
+
+    Close pairs are found on a grid of cells of size tol, then points are decided in rounds:
+    a point with a kept earlier neighbour is dropped, a point whose earlier neighbours
+    are all dropped is kept. Points without earlier neighbours are kept in the first round
+    """
+    a = _as_array(pts, columns)
+    n = len(a)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    if tol <= 0.0:
+        _, first = np.unique(a, axis=0, return_index=True)
+        return np.sort(first)
+
+    i, j = _neighbour_pairs(a, tol)
+
+    UNDECIDED, KEPT, DROPPED = 0, 1, 2
+    state = np.where(np.bincount(i, minlength=n) == 0, KEPT, UNDECIDED).astype(np.int8)
+    while True:
+        open_ = np.flatnonzero(state[i] == UNDECIDED)
+        if len(open_) == 0:
+            break
+        pi, sj = i[open_], state[j[open_]]
+        dropped = np.bincount(pi, weights=(sj == KEPT),      minlength=n) > 0
+        waiting = np.bincount(pi, weights=(sj == UNDECIDED), minlength=n) > 0
+        pending = state == UNDECIDED
+        state[pending & dropped] = DROPPED
+        state[pending & ~dropped & ~waiting] = KEPT
+
+    return np.flatnonzero(state == KEPT)
+
+
+def keep_indices(pts, tol: float, mode: str = CONSECUTIVE, columns = None) -> np.ndarray:
+    """
+    Given points, tolerance and mode, returns sorted indices of the points to keep,
+    use them to filter points and whatever is carried along, e.g. UV parameters
+    """
+    if mode == CONSECUTIVE:
+        return consecutive(pts, tol, columns)
+    if mode == GLOBAL:
+        return grid(pts, tol, columns)
+    raise ValueError("dedupe::keep_indices: unknown mode {0}".format(mode))
+
+
+if __name__ == "__main__":
+
+    import time
+
+    rng = np.random.default_rng(12345)
+
+    pts = np.cumsum(rng.random((100000, 3)) * 1.0e-3, axis=0)
+    for previous in (True, False):
+        t = time.perf_counter()
+        k = consecutive(pts, 1.0e-3, previous=previous)
+        print("consecutive previous={0}: {1} of {2} in {3:.3f}s".format(previous, len(k), len(pts), time.perf_counter() - t))
+
+    # stepping back toward the last kept point is a duplicate
+    assert consecutive([[0.0], [0.9], [-0.2], [5.0]], 1.0).tolist() == [0, 3]
+
+    pts = rng.random((20000, 2)) * 10.0
+    pts = np.concatenate((pts, pts + 1.0e-4))
+    t = time.perf_counter()
+    k = grid(pts, 1.0e-3)
+    print("global: {0} of {1} in {2:.3f}s".format(len(k), len(pts), time.perf_counter() - t))
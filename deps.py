@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import hashlib
+import inspect
+import functools
+import importlib.util
+
+import step_cache
+
+r"""This module keeps per output folder dependency manifest: input hash, parameters and produced files"""
+
+MANIFEST: str = ".deps.json"
+
+RESOLVED = ("faces",) # parameters found by the conversion itself, recorded but not compared
+
+
+def params_of(func, *args, **kwargs):
+    """
+    Given function and the arguments it is going to be called with,
+    returns dict of all parameters including defaults, first positional one (input file) excluded
+    """
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    rc = dict(bound.arguments)
+    first = next(iter(inspect.signature(func).parameters))
+    rc.pop(first, None)
+    return json.loads(json.dumps(rc, default=repr)) # as stored, tuples become lists
+
+
+@functools.lru_cache(maxsize=None)
+def code_hash(modules) -> str:
+    """
+    Given tuple of module names, returns hash of their sources,
+    any change of the code producing the outputs makes them out of date
+    """
+    h = hashlib.sha256()
+    for name in sorted(modules):
+        try:
+            spec = importlib.util.find_spec(name)
+        except ImportError: # parent package is missing
+            spec = None
+        h.update(name.encode("utf-8"))
+        if spec is not None and spec.origin and os.path.isfile(spec.origin):
+            h.update(step_cache.file_hash(spec.origin).encode("ascii"))
+    return h.hexdigest()
+
+
+def _fingerprint(fname: str):
+    """
+    Given output file name, returns its content hash
+    """
+    return step_cache.file_hash(fname)
+
+
+def _load(outdir: str):
+    """
+    Read the manifest of the output folder, None if missing or broken
+    """
+    try:
+        with open(os.path.join(outdir, MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def check(outdir: str, input_hash: str, params):
+    """
+    Given output folder, input hash and parameters, returns None if outputs are
+    up to date, otherwise the reason why they have to be rebuilt
+    """
+    m = _load(outdir)
+    if m is None:
+        return "no manifest"
+
+    if m.get("input") != input_hash:
+        return "input changed"
+
+    old = m.get("params", {})
+    changed = sorted(k for k in (set(old) | set(params)) - set(RESOLVED) if old.get(k) != params.get(k))
+    if changed:
+        return "params changed: " + ", ".join(changed)
+
+    outputs = m.get("outputs", {})
+    if not outputs:
+        return "no outputs recorded"
+    for name, h in sorted(outputs.items()):
+        fname = os.path.join(outdir, name)
+        if not os.path.isfile(fname):
+            return "output missing: " + name
+        if _fingerprint(fname) != h:
+            return "output modified: " + name
+
+    return None
+
+
+def record(outdir: str, input_hash: str, params, outputs) -> None:
+    """
+    Given output folder, input hash, parameters and produced file names, write the manifest
+    """
+    m = {"input":   input_hash,
+         "params":  params,
+         "outputs": {name: _fingerprint(os.path.join(outdir, name)) for name in outputs}}
+
+    fname = os.path.join(outdir, MANIFEST)
+    tmp = "{0}.{1}.tmp".format(fname, os.getpid())
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(m, f, indent=1, sort_keys=True)
+    os.replace(tmp, fname)
+
+
+def snapshot(folder: str):
+    """
+    Given folder, returns dict file name -> (size, mtime_ns) of its files
+    """
+    rc = dict()
+    for entry in os.scandir(folder):
+        if entry.is_file() and entry.name != MANIFEST:
+            st = entry.stat()
+            rc[entry.name] = (st.st_size, st.st_mtime_ns)
+    return rc
+
+
+def changed(before, after):
+    """
+    Given two snapshots, returns sorted names of files created or rewritten in between
+    """
+    return sorted(name for name, st in after.items() if before.get(name) != st)
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+import math
+import itertools
+import numpy as np
+
+from collections import namedtuple, defaultdict
+
+import OCC.BRep
+
+import CADhelpers
+import surface_sampler
+
+r"""This module finds inner and outer sphere/cone/top faces of a cup"""
+
+LTOL: float = 1.0e-3 # linear tolerance, mm
+ATOL: float = 1.0e-4 # angular tolerance for axis directions
+JTOL: float = 1.0e-2 # how far cone start may be from the sphere it continues
+
+CupFaces = namedtuple("CupFaces", ["outer_sphere", "outer_cone", "outer_top",
+                                   "inner_sphere", "inner_cone", "inner_top"])
+
+FaceInfo = namedtuple("FaceInfo", ["index", "kind", "surface", "origin", "axis", "radius", "angle"])
+
+# kind to the accessor of gp primitive, which carries position and radius
+_primitives = {"Geom_SphericalSurface":   ("Sphere",   lambda g: (g.Radius(), 0.0)),
+               "Geom_ConicalSurface":     ("Cone",     lambda g: (g.RefRadius(), g.SemiAngle())),
+               "Geom_CylindricalSurface": ("Cylinder", lambda g: (g.Radius(), 0.0)),
+               "Geom_ToroidalSurface":    ("Torus",    lambda g: (g.MajorRadius(), 0.0)),
+               "Geom_Plane":              ("Pln",      lambda g: (0.0, 0.0))}
+
+
+def same_axis(o1, d1, o2, d2) -> bool:
+    """
+    Given points on two axis lines and their unit directions, returns True if
+    the lines coincide within tolerances, direction sign does not matter
+    """
+    if np.linalg.norm(np.cross(d1, d2)) > ATOL:
+        return False
+    w = o2 - o1
+    return bool(np.linalg.norm(w - np.dot(w, d1)*d1) < LTOL)
+
+
+def group_axes(faces):
+    """
+    Given face infos with axes, returns list of (origin, axis, faces),
+    one per distinct axis line in the order of first appearance.
+    Axes are compared within tolerances, not rounded, so faces near
+    a rounding boundary are not split
+    """
+    groups = list()
+    for f in faces:
+        for o, d, fs in groups:
+            if same_axis(o, d, f.origin, f.axis):
+                fs.append(f)
+                break
+        else:
+            groups.append((f.origin, f.axis, [f]))
+    return groups
+
+
+def _point_key(p):
+    """
+    Given point, returns key of its tolerance cell
+    """
+    return tuple(np.round(p / LTOL).astype(np.int64))
+
+
+def _near_keys(p):
+    """
+    Keys of the cell with the point and all its neighbours
+    """
+    k = np.round(p / LTOL).astype(np.int64)
+    for d in itertools.product((-1, 0, 1), repeat=3):
+        yield (k[0] + d[0], k[1] + d[1], k[2] + d[2])
+
+
+def face_info(index: int, face):
+    """
+    Given face and its index, returns FaceInfo with resolved kind,
+    actual surface and, for elementary surfaces, axis and radius
+    """
+    h = CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(face))
+    if h is None:
+        return FaceInfo(index, None, None, None, None, 0.0, 0.0)
+
+    ss = h.GetObject() # keep trimmed surface for sampling, its bounds are finite
+    kind, basis = surface_sampler.resolve(ss)
+
+    prim = _primitives.get(kind)
+    if prim is None:
+        return FaceInfo(index, kind, ss, None, None, 0.0, 0.0)
+
+    name, params = prim
+    g = getattr(basis, name)()
+    o, xd, yd, zd = surface_sampler.ax3_frame(g.Position())
+    radius, angle = params(g)
+
+    return FaceInfo(index, kind, ss, o, zd, radius, angle)
+
+
+class FaceIndex(object):
+    """
+    Index of the shape faces by kind and by axis line
+    """
+
+    def __init__(self, the_faces):
+        """
+        Constructor. Build index from list of faces in one pass
+        """
+        self._faces   = [face_info(i, face) for i, face in enumerate(the_faces)]
+        self._by_kind = defaultdict(list)
+
+        for f in self._faces:
+            self._by_kind[f.kind].append(f)
+
+        # per kind, faces grouped by axis line, there are few distinct axes
+        self._by_axis = {kind: group_axes([f for f in faces if f.axis is not None])
+                         for kind, faces in self._by_kind.items() if kind != "Geom_Plane"}
+
+    @property
+    def faces(self):
+        """
+        returns: list
+            FaceInfo of all faces, in the face order
+        """
+        return self._faces
+
+    def of_kind(self, kind: str):
+        """
+        Given surface kind, returns list of faces of this kind
+        """
+        return self._by_kind.get(kind, [])
+
+    def coaxial(self, kind: str, origin, axis):
+        """
+        Given surface kind and axis, returns faces of this kind on the same axis
+        """
+        for o, d, faces in self._by_axis.get(kind, []):
+            if same_axis(o, d, origin, axis):
+                return faces
+        return []
+
+    def axes(self, kind: str):
+        """
+        Given surface kind, returns distinct (origin, axis) of the faces of this kind
+        """
+        return [(o, d) for o, d, _ in group_axes([f for f in self.of_kind(kind) if f.axis is not None])]
+
+
+def _wall_point(f, u: float, which: int):
+    """
+    Given face info, returns point of its meridian at u and V1 (which = 0) or V2 (which = 1),
+    None if the surface is unbounded
+    """
+    U1, U2, V1, V2 = f.surface.Bounds()
+    v = (V1, V2)[which]
+    if abs(v) > surface_sampler.BIG:
+        return None
+    return surface_sampler.evaluate(f.surface, u, v)
+
+
+def _cone_radius(f, h: float, axis) -> float:
+    """
+    Given cone face info, returns its radius at axial coordinate h along the axis
+    """
+    s = 1.0 if np.dot(f.axis, axis) > 0.0 else -1.0
+    return f.radius + s*(h - np.dot(f.origin, axis))*math.tan(f.angle)
+
+
+def classify_cup(the_faces, u: float = 0.5*math.pi) -> CupFaces:
+    """
+    Given list of cup faces, returns indices of outer and inner sphere, cone and top faces.
+
+    Spheres and cones must share the axis, larger radius is the outer one,
+    wall cones start on a sphere and are compared at the same height. Top is the coaxial or freeform face
+    whose meridian at u starts where the cone meridian ends
+    """
+    index = FaceIndex(the_faces)
+
+    spheres = cones = None
+    for origin, axis in index.axes("Geom_SphericalSurface"):
+        cones = index.coaxial("Geom_ConicalSurface", origin, axis)
+        if cones:
+            spheres = index.coaxial("Geom_SphericalSurface", origin, axis)
+            break
+    if not spheres:
+        raise ValueError("classify_cup: no coaxial spheres and cones")
+
+    spheres = sorted(spheres, key=lambda f: f.radius)
+
+    # wall cones start on the sphere, the others are tops or chamfers
+    def on_sphere(cone):
+        p = _wall_point(cone, u, 0)
+        return p is not None and any(abs(np.linalg.norm(p - f.origin) - f.radius) < JTOL for f in spheres)
+
+    walls = [f for f in cones if on_sphere(f)]
+    if walls:
+        cones = walls
+
+    h = float(np.mean([np.dot(f.origin, axis) for f in cones]))
+    cones = sorted(cones, key=lambda f: _cone_radius(f, h, axis))
+
+    # meridian start points of the other coaxial faces
+    starts = dict()
+    for kind in ("Geom_ConicalSurface", "Geom_ToroidalSurface", "Geom_CylindricalSurface"):
+        for f in index.coaxial(kind, origin, axis):
+            p = _wall_point(f, u, 0)
+            if p is not None:
+                starts.setdefault(_point_key(p), f)
+    for f in index.faces:
+        if f.surface is not None and f.kind not in _primitives: # freeform top
+            p = _wall_point(f, u, 0)
+            if p is not None:
+                starts.setdefault(_point_key(p), f)
+
+    def top_of(cone):
+        p = _wall_point(cone, u, 1)
+        if p is None:
+            return None
+        for k in _near_keys(p):
+            f = starts.get(k)
+            if f is not None and f.index != cone.index:
+                return f
+        return None
+
+    outer_top = top_of(cones[-1])
+    inner_top = top_of(cones[0])
+    if outer_top is None:
+        outer_top = inner_top
+    if inner_top is None:
+        inner_top = outer_top
+    if inner_top is None:
+        raise ValueError("classify_cup: no top face after the cone")
+
+    return CupFaces(spheres[-1].index, cones[-1].index, outer_top.index,
+                    spheres[0].index,  cones[0].index,  inner_top.index)
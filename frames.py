@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from Idx import X, Y, Z
+
+r"""This module implements composable 4x4 affine transforms and the frames of the export paths"""
+
+_AXIS = {"x": X, "y": Y, "z": Z}
+
+
+class Transform(object):
+    """
+    Affine transform as 4x4 matrix, applied in bulk to (..., 3) or (..., 2) arrays.
+    a @ b is the transform which applies b first, then a, fused into one matrix
+    """
+
+    __slots__ = ("_m",)
+
+    def __init__(self, m = None):
+        """
+        Constructor. Build transform from 4x4 matrix, identity by default
+        """
+        self._m = np.eye(4) if m is None else np.array(m, dtype=np.float64).reshape(4, 4)
+
+    @classmethod
+    def translation(cls, dx: float = 0.0, dy: float = 0.0, dz: float = 0.0):
+        """
+        Given offsets, returns translation
+        """
+        m = np.eye(4)
+        m[:3, 3] = (dx, dy, dz)
+        return cls(m)
+
+    @classmethod
+    def scaling(cls, sx: float = 1.0, sy: float = 1.0, sz: float = 1.0):
+        """
+        Given factors, returns scaling along the axes
+        """
+        return cls(np.diag((sx, sy, sz, 1.0)))
+
+    @classmethod
+    def axes(cls, *spec: str):
+        """
+        Given three signed axis names, returns the permutation which puts them
+        into new X, Y, Z, e.g. axes("-z", "x", "-y") maps (x, y, z) -> (-z, x, -y)
+        """
+        if len(spec) != 3:
+            raise ValueError("Transform::axes: three axes expected, got {0}".format(spec))
+        m = np.zeros((4, 4))
+        m[3, 3] = 1.0
+        for row, s in enumerate(spec):
+            sign = -1.0 if s.startswith("-") else 1.0
+            m[row, _AXIS[s.lstrip("+-").lower()]] = sign
+        return cls(m)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        returns: array
+            4x4 matrix
+        """
+        return self._m
+
+    def __matmul__(self, other):
+        """
+        returns: Transform
+            other followed by self, as one matrix
+        """
+        return Transform(self._m @ other._m)
+
+    def then(self, other):
+        """
+        returns: Transform
+            self followed by other, as one matrix
+        """
+        return Transform(other._m @ self._m)
+
+    def inverse(self):
+        """
+        returns: Transform
+            inverse transform
+        """
+        return Transform(np.linalg.inv(self._m))
+
+    def apply(self, pts) -> np.ndarray:
+        """
+        Given (..., 3) array, returns transformed array of the same shape.
+        (..., 2) arrays are taken as lying in z = 0 plane and stay 2D
+        """
+        a = np.asarray(pts, dtype=np.float64)
+        d = a.shape[-1]
+        if d not in (2, 3):
+            raise ValueError("Transform::apply: 2D or 3D points expected, got {0}".format(a.shape))
+        return a @ self._m[:d, :d].T + self._m[:d, 3]
+
+    __call__ = apply
+
+    def __repr__(self):
+        """
+        returns: string
+            default representation
+        """
+        return "Transform({0})".format(self._m.tolist())
+
+
+IDENTITY = Transform()
+
+# gnuplot dumps are (X, Z, Y)
+GNUPLOT = Transform.axes("x", "z", "y")
+
+
+def ocp_fiducial(origin: float) -> Transform:
+    """
+    Given the origin, returns frame of the OCP fiducial curve,
+    (x, y, z) -> (-z, x, origin - y)
+    """
+    return Transform.translation(dz=origin) @ Transform.axes("-z", "x", "-y")
+
+
+def wall(shift: float) -> Transform:
+    """
+    Given the shift, returns frame of ICP/OCP walls,
+    (y, r) -> (shift - y, r)
+    """
+    return Transform.translation(dx=shift) @ Transform.scaling(sx=-1.0)
+
+
+if __name__ == "__main__":
+
+    import time
+
+    pts = np.random.rand(100000, 3)
+
+    # fused chain against step by step
+    chain = [ocp_fiducial(-101.0), GNUPLOT, Transform.translation(1.0, 2.0, 3.0)]
+    fused = IDENTITY
+    for t in chain:
+        fused = fused.then(t)
+
+    t0 = time.perf_counter()
+    a = pts
+    for t in chain:
+        a = t(a)
+    t0 = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    b = fused(pts)
+    t1 = time.perf_counter() - t1
+
+    print("step by step {0:.2f} ms, fused {1:.2f} ms, max diff {2}".format(1000.0*t0, 1000.0*t1, np.abs(a - b).max()))
+    print(ocp_fiducial(-101.0)(np.array([1.0, 2.0, 3.0])), wall(-105.22)(np.array([[10.0, 5.0]])))
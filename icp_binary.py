@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import os
+import numpy as np
+
+import icp_io
+
+r"""This module implements binary .icpb/.ocpb sidecars of ICP/OCP files, loaded via memory map"""
+
+MAGIC:   bytes = b"ICPB"
+VERSION: int   = 1
+ALIGN:   int   = 64 # every block starts at multiple of it
+
+NAME = "S32" # header strings, NUL padded
+
+# fixed header, counts are inner, outer, fiducial and segments rows, -1 if section is absent
+HEADER = np.dtype([("magic",    "S4"),
+                   ("version",  "<u4"),
+                   ("RU",       NAME),
+                   ("OuterCup", NAME),
+                   ("InnerCup", NAME),
+                   ("counts",   "<i8", (4,))])
+
+NAME_FIELDS = ("RU", "OuterCup", "InnerCup")
+
+# block element type and number of columns, in file order
+BLOCKS = (("<f8", 2), ("<f8", 2), ("<f8", 3), ("<i8", 2))
+
+
+def _aligned(n: int) -> int:
+    """
+    Given offset, returns it rounded up to ALIGN
+    """
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def sidecar(fname: str) -> str:
+    """
+    Given ICP/OCP file name, returns name of its binary sidecar, R8O1.ocp -> R8O1.ocpb
+    """
+    return fname + "b"
+
+
+def _encode(s: str) -> bytes:
+    """
+    Given header string, returns its bytes, they must fit into the field
+    """
+    b = s.encode("ascii")
+    if len(b) > np.dtype(NAME).itemsize:
+        raise ValueError("icp_binary: header field too long: {0}".format(s))
+    return b
+
+
+def dumps(cup: icp_io.Cup) -> bytes:
+    """
+    Given Cup, returns content of the binary file
+    """
+    sections = (cup.inner, cup.outer, cup.fiducial, cup.segments)
+
+    h = np.zeros(1, dtype=HEADER)
+    h["magic"]   = MAGIC
+    h["version"] = VERSION
+    for name in NAME_FIELDS:
+        h[name] = _encode(getattr(cup, name))
+    h["counts"] = [-1 if a is None else len(a) for a in sections]
+
+    parts = [h.tobytes()]
+    size  = HEADER.itemsize
+    for a, (dtype, ncols) in zip(sections, BLOCKS):
+        if a is None:
+            continue
+        pad = _aligned(size) - size
+        parts.append(b"\0" * pad)
+        b = np.ascontiguousarray(a, dtype=dtype).reshape(-1, ncols).tobytes()
+        parts.append(b)
+        size += pad + len(b)
+
+    return b"".join(parts)
+
+
+def write(fname: str, cup: icp_io.Cup) -> str:
+    """
+    Given binary file name and Cup, writes it atomically, returns file name
+    """
+    data = dumps(cup)
+
+    tmp = "{0}.{1}.tmp".format(fname, os.getpid())
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, fname)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    return fname
+
+
+def read(fname: str) -> icp_io.Cup:
+    """
+    Given binary file name, returns Cup which arrays are read-only
+    views of the memory mapped file, nothing is copied
+    """
+    mm = np.memmap(fname, dtype=np.uint8, mode="r")
+    if len(mm) < HEADER.itemsize:
+        raise ValueError("icp_binary: {0}: header is truncated".format(fname))
+
+    h = np.frombuffer(mm, dtype=HEADER, count=1)[0]
+    if h["magic"] != MAGIC or h["version"] != VERSION:
+        raise ValueError("icp_binary: {0}: not an ICPB v{1} file".format(fname, VERSION))
+
+    sections = list()
+    offset = HEADER.itemsize
+    for n, (dtype, ncols) in zip(h["counts"].tolist(), BLOCKS):
+        if n < 0:
+            sections.append(None)
+            continue
+        offset = _aligned(offset)
+        count  = n * ncols
+        if offset + count*np.dtype(dtype).itemsize > len(mm):
+            raise ValueError("icp_binary: {0}: block at {1} is truncated".format(fname, offset))
+        sections.append(np.frombuffer(mm, dtype=dtype, count=count, offset=offset).reshape(n, ncols))
+        offset += count*np.dtype(dtype).itemsize
+
+    names = [h[name].decode("ascii") for name in NAME_FIELDS]
+    return icp_io.Cup(*names, *sections)
+
+
+def text_to_binary(fname: str, bname: str = None) -> str:
+    """
+    Given ICP/OCP text file, writes its binary sidecar, returns its name
+    """
+    return write(bname or sidecar(fname), icp_io.read(fname))
+
+
+def binary_to_text(bname: str, fname: str) -> str:
+    """
+    Given binary file, writes ICP/OCP text file, returns its name
+    """
+    return icp_io.write(fname, read(bname))
+
+
+def load(fname: str, make: bool = True) -> icp_io.Cup:
+    """
+    Given ICP/OCP text file name, returns Cup from the binary sidecar if it is
+    up to date, otherwise parses the text and, if make is set, writes the sidecar
+    """
+    bname = sidecar(fname)
+    if os.path.isfile(bname) and os.path.getmtime(bname) >= os.path.getmtime(fname):
+        return read(bname)
+
+    cup = icp_io.read(fname)
+    if make:
+        write(bname, cup)
+    return cup
+
+
+if __name__ == "__main__":
+
+    import glob
+    import time
+    import tempfile
+
+    for fname in sorted(glob.glob("*.icp") + glob.glob("*.ocp")):
+        with tempfile.TemporaryDirectory() as tmp:
+            bname = text_to_binary(fname, os.path.join(tmp, os.path.basename(sidecar(fname))))
+            tname = binary_to_text(bname, os.path.join(tmp, os.path.basename(fname)))
+
+            with open(fname, "r", encoding="utf-8") as f, open(tname, "r", encoding="utf-8") as g:
+                same = f.read() == g.read()
+
+            t = time.perf_counter()
+            for k in range(1000):
+                icp_io.read(fname)
+            tt = (time.perf_counter() - t)
+
+            t = time.perf_counter()
+            for k in range(1000):
+                read(bname)
+            tb = (time.perf_counter() - t)
+
+        print("{0:16s} lossless {1} text {2:7.1f} us binary {3:7.1f} us".format(fname, same, 1000.0*tt, 1000.0*tb))
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import glob
+import logging
+import numpy as np
+
+import frames
+
+from collections import namedtuple
+
+r"""This module reads and writes ICP/OCP cup files as numpy arrays"""
+
+logger = logging.getLogger(__name__)
+
+# RU, OuterCup and InnerCup are the header lines as strings, for OCP the third one is distance to OC.
+# inner and outer are (n, 2) arrays of (z, r), fiducial is (m, 3) array
+# and segments is (k, 2) array of point indices, both None for ICP
+Cup = namedtuple("Cup", ["RU", "OuterCup", "InnerCup", "inner", "outer", "fiducial", "segments"])
+
+PATTERNS = ("*.icp", "*.ocp")
+
+WALL_FMT:     str = "%13.6e %13.6e"        # same as "{0:13.6e} {1:13.6e}"
+FIDUCIAL_FMT: str = "%13.6e %13.6e %13.6e"
+SEGMENT_FMT:  str = "%d %d"
+
+
+def _count(lines, k: int, fname: str) -> int:
+    """
+    Given lines and line index, returns the section size from it
+    """
+    try:
+        return int(lines[k])
+    except (IndexError, ValueError):
+        raise ValueError("icp_io: {0}: bad section size at line {1}".format(fname, k+1))
+
+
+def _block(lines, k: int, n: int, ncols: int, dtype, fname: str) -> np.ndarray:
+    """
+    Given lines, first line index, number of rows and columns, parses whole block at once
+    """
+    if k + n > len(lines):
+        raise ValueError("icp_io: {0}: section at line {1} is truncated".format(fname, k+1))
+    if n == 0:
+        return np.empty((0, ncols), dtype=dtype)
+
+    a = np.loadtxt(lines[k:k+n], dtype=dtype, ndmin=2)
+    if a.shape != (n, ncols):
+        raise ValueError("icp_io: {0}: expected {1}x{2} block at line {3}, got {4}".format(fname, n, ncols, k+1, a.shape))
+    return a
+
+
+def parse(text: str, fname: str = "<string>") -> Cup:
+    """
+    Given content of ICP/OCP file, returns Cup
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) < 4:
+        raise ValueError("icp_io: {0}: header is truncated".format(fname))
+
+    RU, OuterCup, InnerCup = (line.rstrip() for line in lines[:3])
+
+    k = 3
+    niw = _count(lines, k, fname)
+    inner = _block(lines, k+1, niw, 2, np.float64, fname)
+    k += 1 + niw
+
+    now = _count(lines, k, fname)
+    outer = _block(lines, k+1, now, 2, np.float64, fname)
+    k += 1 + now
+
+    fiducial = segments = None
+    if k < len(lines):
+        nfc = _count(lines, k, fname)
+        fiducial = _block(lines, k+1, nfc, 3, np.float64, fname)
+        k += 1 + nfc
+
+        nsg = _count(lines, k, fname)
+        segments = _block(lines, k+1, nsg, 2, np.int64, fname)
+        k += 1 + nsg
+
+        if len(segments) and (segments.min() < 0 or segments.max() >= nfc):
+            raise ValueError("icp_io: {0}: segment refers to missing fiducial point".format(fname))
+
+    if k != len(lines):
+        logger.warning("{0}: {1} trailing lines ignored".format(fname, len(lines) - k))
+
+    return Cup(RU, OuterCup, InnerCup, inner, outer, fiducial, segments)
+
+
+def read(fname: str) -> Cup:
+    """
+    Given ICP/OCP file name, returns Cup
+    """
+    with open(fname, "r", encoding="utf-8") as f:
+        return parse(f.read(), fname)
+
+
+def iter_dir(root: str = ".", patterns = PATTERNS, recursive: bool = False):
+    """
+    Given folder and file patterns, yields (file name, Cup) for every ICP/OCP file,
+    one file at a time, sorted by name
+    """
+    found = set()
+    for pattern in patterns:
+        if recursive:
+            found.update(glob.glob(os.path.join(root, "**", pattern), recursive=True))
+        else:
+            found.update(glob.glob(os.path.join(root, pattern)))
+
+    for fname in sorted(found):
+        yield (fname, read(fname))
+
+
+def icp_name(RU, OuterCup, InnerCup) -> str:
+    """
+    Given header, returns ICP file name, like R8O1IS01.icp
+    """
+    return "R" + str(RU) + "O" + str(OuterCup) + "I" + str(InnerCup) + ".icp"
+
+
+def make_cup(RU, OuterCup, InnerCup, shift: float, yiw, riw, yow, row) -> Cup:
+    """
+    Given header, shift and wall profiles as arrays or Points columns,
+    returns Cup with walls placed in frames.wall(shift), the way ICP stores them
+    """
+    yiw = np.asarray(yiw, dtype=np.float64)
+    riw = np.asarray(riw, dtype=np.float64)
+    yow = np.asarray(yow, dtype=np.float64)
+    row = np.asarray(row, dtype=np.float64)
+
+    if yiw.shape != riw.shape:
+        raise ValueError("icp_io::make_cup: inner wall y/r length mismatch {0} vs {1}".format(len(yiw), len(riw)))
+    if yow.shape != row.shape:
+        raise ValueError("icp_io::make_cup: outer wall y/r length mismatch {0} vs {1}".format(len(yow), len(row)))
+
+    wall = frames.wall(shift)
+    return Cup(str(RU), str(OuterCup), str(InnerCup),
+               wall(np.stack((yiw, riw), axis=-1)), wall(np.stack((yow, row), axis=-1)), None, None)
+
+
+def _section(buf, a, fmt: str) -> None:
+    """
+    Write section size and all its rows in one savetxt call
+    """
+    buf.write("{0}\n".format(len(a)))
+    if len(a):
+        np.savetxt(buf, a, fmt=fmt)
+
+
+def dumps(cup: Cup) -> str:
+    """
+    Given Cup, returns content of ICP/OCP file, walls and fiducial sections
+    are formatted as whole arrays
+    """
+    buf = io.StringIO()
+    buf.write("{0}\n{1}\n{2}\n".format(cup.RU, cup.OuterCup, cup.InnerCup))
+
+    _section(buf, cup.inner, WALL_FMT)
+    _section(buf, cup.outer, WALL_FMT)
+
+    if cup.fiducial is not None:
+        _section(buf, cup.fiducial, FIDUCIAL_FMT)
+        _section(buf, np.empty((0, 2)) if cup.segments is None else cup.segments, SEGMENT_FMT)
+
+    return buf.getvalue()
+
+
+def write(fname: str, cup: Cup) -> str:
+    """
+    Given file name and Cup, writes it atomically via temporary file and rename,
+    readers never see partial file. Returns file name
+    """
+    text = dumps(cup)
+
+    tmp = "{0}.{1}.tmp".format(fname, os.getpid())
+    try:
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            f.write(text)
+        os.replace(tmp, fname)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    return fname
+
+
+if __name__ == "__main__":
+
+    import time
+
+    for fname, cup in iter_dir("."):
+        t = time.perf_counter()
+        for k in range(100):
+            read(fname)
+        t = (time.perf_counter() - t) / 100.0
+
+        nfc = 0 if cup.fiducial is None else len(cup.fiducial)
+        nsg = 0 if cup.segments is None else len(cup.segments)
+        print("{0:16s} inner {1:4d} outer {2:4d} fiducial {3:4d} segments {4:4d} {5:8.3f} ms".format(os.path.basename(fname), len(cup.inner), len(cup.outer), nfc, nsg, 1000.0*t))
+
+        with open(fname, "r", encoding="utf-8") as f:
+            if f.read() != dumps(cup):
+                print("{0}: round trip differs".format(fname))
@@ -3,14 +3,12 @@
 import sys
 import logging
 import math
-
-from functools import partial
+import numpy as np
 
 import OCC.TopoDS
-import OCC.Display.SimpleGui
+import OCC.BRep
 
-import aocutils.display.topology
-import aocutils.display.backends
+import aocutils.topology
 
 import aocxchange.step
 import aocxchange.utils
@@ -21,105 +19,24 @@ from point2d       import point2d
 from point3d       import point3d
 
 import CADhelpers
+import surface_dump
 import DISPhelpers
+import step_cache
+import cup_profile
+import offset_curve
+import face_roles
 
 from XcIO.write_OCP  import write_OCP
 
-def display_faces(display, shape, pattern: str, event = None) -> None:
-    """
-    Display shape faces given the display
-    """
-    transparency=0.8
-    show_numbers=True
-    numbers_height=20
-    color_sequence = aocutils.display.color.prism_color_sequence
-
-    display.EraseAll()
-
-    the_faces = aocutils.topology.Topo(shape, return_iter=False).faces
-    ais_context = display.GetContext().GetObject()
-
-    for i, face in enumerate(the_faces):
-        s = OCC.BRep.BRep_Tool.Surface(face).GetObject() # make surface from face, get back handle
-        t = CADhelpers.get_surface(s)
-        if pattern not in t:
-            continue
-
-        ais_face = OCC.AIS.AIS_Shape(face)
-        ais_face.SetColor(color_sequence[i % len(color_sequence)])
-        ais_face.SetTransparency(transparency)
-        if show_numbers:
-            display.DisplayMessage(point=aocutils.brep.face.Face(face).midpoint,
-                                   text_to_write = "{0}".format(i),
-                                   height=numbers_height,
-                                   message_color=(1, 0, 0))
-        ais_context.Display(ais_face.GetHandle())
-
-    display.FitAll()
-    display.View_Iso()
-
-
-def display_all(display, shape):
-    """
-    display every part of the shape
-    """
-    add_menu('solids')
-    dsolids = partial(DISPhelpers.display_solids, display, shape)
-    dsolids.__name__ = "dsolids"
-    add_function_to_menu('solids', dsolids)
-    add_menu('edges')
-    dedges = partial(DISPhelpers.display_edges, display, shape)
-    dedges.__name__ = "dedges"
-    add_function_to_menu('edges', dedges)
-    add_menu('faces')
-    dfaces_bezier =  partial(display_faces, display, shape, "Geom_BezierSurface")
-    dfaces_bezier.__name__ = "Bezier"
-    dfaces_bspline = partial(display_faces, display, shape, "Geom_BSplineSurface")
-    dfaces_bspline.__name__ = "BSpline"
-    dfaces_conical = partial(display_faces, display, shape, "Geom_ConicalSurface")
-    dfaces_conical.__name__ = "Conical"
-    dfaces_cylindrical = partial(display_faces, display, shape, "Geom_CylindricalSurface")
-    dfaces_cylindrical.__name__ = "Cylindrical"
-    dfaces_spherical = partial(display_faces, display, shape, "Geom_SphericalSurface")
-    dfaces_spherical.__name__ = "Spherical"
-    dfaces_plane =  partial(display_faces, display, shape, "Geom_Plane")
-    dfaces_plane.__name__ = "Plane"
-    dfaces_toro =  partial(display_faces, display, shape, "Geom_ToroidalSurface")
-    dfaces_toro.__name__ = "Toro"
-    dfaces_rect = partial(display_faces, display, shape, "Geom_RectangularTrimmedSurface")
-    dfaces_rect.__name__ = "RecT"
-    dfaces_linext = partial(display_faces, display, shape, "Geom_SurfaceOfLinearExtrusion")
-    dfaces_linext.__name__ = "LinExt"
-    dfaces_surfrev = partial(display_faces, display, shape, "Geom_SurfaceOfRevolution")
-    dfaces_surfrev.__name__ = "SurfRev"
-    add_function_to_menu('faces', dfaces_bezier)
-    add_function_to_menu('faces', dfaces_conical)
-    add_function_to_menu('faces', dfaces_cylindrical)
-    add_function_to_menu('faces', dfaces_spherical)
-    add_function_to_menu('faces', dfaces_bspline)
-    add_function_to_menu('faces', dfaces_plane)
-    add_function_to_menu('faces', dfaces_toro)
-    add_function_to_menu('faces', dfaces_rect)
-    add_function_to_menu('faces', dfaces_linext)
-    add_function_to_menu('faces', dfaces_surfrev)
-    add_menu('shells')
-    dshells = partial(DISPhelpers.display_shells, display, shape)
-    dshells.__name__ = "dshells"
-    add_function_to_menu('shells', dshells)
-    add_menu('wires')
-    dwires = partial(DISPhelpers.display_wires, display, shape)
-    dwires.__name__ = "dwires"
-    add_function_to_menu('wires', dwires)
-
+logger = logging.getLogger(__name__)
 
 def readSTEP(filename: str):
     """
     Given the STEP filename, read shapes from it
     """
     fname = aocxchange.utils.path_from_file(__file__, filename)
-    importer = aocxchange.step.StepImporter(fname)
 
-    return importer.shapes
+    return step_cache.read_step(fname)
 
 
 def main(filename: str):
@@ -129,6 +46,7 @@ def main(filename: str):
     shapes = readSTEP(filename)
 
     print("+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
+    print("STEP cache: {0}".format(step_cache.stats()))
     print("Number of shapes: {0}".format(len(shapes)))
     for shape in shapes:
         print("{0}: {1} {2}".format(shape.ShapeType(), CADhelpers.str_shape(shape.ShapeType()), type(aocutils.topology.shape_to_topology(shape))))
@@ -139,195 +57,116 @@ def main(filename: str):
     return sol
 
 
-def make_outer_cup_shell(surfaces, thickness = 2.0):
+def outer_cup_samples(surfaces, Nv: int = 40, tol: float = None):
     """
-    Given list of surfaces, computes and returns (y, r) tuple of the cup outer shell
+    Given list of sphere, cone and top surfaces, samples them once and returns
+    (y, r) of the sphere and OffsetCurve of the cone and top at u = pi/2
     """
-    sphere = surfaces[0]
-    cone   = surfaces[1]
-    top    = surfaces[2]
+    sphere, cone, top = surfaces[0], surfaces[1], surfaces[2]
 
-    # print("Q {0} {1} {2}".format(type(sphere), type(cone), type(top)))
+    u = math.pi / 2.0
+    wall = offset_curve.OffsetCurve(*cup_profile.wall_samples(cone, top, u, Nv, tol = tol))
 
-    U1s, U2s, V1s, V2s = sphere.Bounds()
-    U1c, U2c, V1c, V2c = cone.Bounds()
-    U1t, U2t, V1t, V2t = top.Bounds()
+    return (cup_profile.sphere_samples(sphere, Nv, tol), wall)
 
-    # print("QA {0} {1} {2} {3}".format(U1s, U2s, V1s, V2s))
-    # print("QB {0} {1} {2} {3}".format(U1c, U2c, V1c, V2c))
-    # print("QC {0} {1} {2} {3}".format(U1t, U2t, V1t, V2t))
 
-    rc = list()
-    yc = list()
+def make_outer_cup_shell(surfaces, thickness = 2.0, Nv: int = 40, tol: float = None, samples = None):
+    """
+    Given list of surfaces, computes and returns (y, r) tuple of the cup outer shell.
+    Cone and top are offset along their true normals by thickness, sphere ends where
+    the offset wall starts. Samples from outer_cup_samples() may be passed in to
+    build shells of many thicknesses without sampling the surfaces again
+    """
+    sphere, wall = outer_cup_samples(surfaces, Nv, tol) if samples is None else samples
 
-    pt = OCC.gp.gp_Pnt()
+    # protrude cone and top out
+    yw, rw = wall.offset(thickness)
 
-    # determine where sphere ends
-    u = math.pi / 2.0
-    v = V1c
-    cone.D0(u, v, pt)
-    ymin = pt.Y()
-    zmin = pt.Z()
+    return cup_profile.join_profile(sphere, (yw, rw), ymin = float(yw[0]))
 
-    u = math.pi / 2.0
-    v = 0.5*(V1c + V2c)
-    cone.D0(u, v, pt)
-    ymean = pt.Y()
-    zmean = pt.Z()
 
-    l = math.sqrt(utils.squared(ymean - ymin) + utils.squared(zmean - zmin))
-    wy = (ymean - ymin) / l
-    wz = (zmean - zmin) / l
+def make_inner_cup_shell(surfaces, Nv: int = 40, tol: float = None):
+    """
+    Given list of surfaces, computes and returns (y, r) tuple of the cup inner shell
+    """
+    return cup_profile.shell_profile(surfaces, u_cut = 0.0, u_wall = math.pi / 2.0, Nv = Nv, tol = tol)
 
-    # swap to get normal
-    wy, wz = wz, wy
 
-    # protrude intersection point out
-    ymin = ymin + wy*thickness
+def cup_surfaces(the_faces, indices):
+    """
+    Given list of faces and indices, returns actual surfaces of the selected faces
+    """
+    return [CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[k])).GetObject() for k in indices]
 
-    EPS = 1.0e-3
 
-    yprev = -100000.0
-    zprev = -100000.0
+def outer_cup_fixup(yow, row):
+    """
+    Given outer wall, append the rim taken from SW drawing
+    """
+    lp = yow[-1]
+    yow = np.append(yow, [lp, 0.0])
+    row = np.append(row, [8.700000e+01,  # those number were taken from SW drawing
+                          8.795000e+01]) # total diameter 179.50
+    return (yow, row)
 
-    # sphere first
-    Nv = 40
-    u = math.pi / 2.0
-    ve = 0.5*(V1s + V2s)
-    for k in range(0, Nv+1):
-        v = utils.clamp(V1s + float(k)*(ve - V1s)/float(Nv), V1s, V2s)
-        sphere.D0(u, v, pt)
-        if pt.Y() > ymin:
-            continue
-        y = pt.Y()
-        z = pt.Z()
-        # check if it is the same point
-        dist = math.sqrt(utils.squared(y - yprev) + utils.squared(z - zprev))
-        if dist > EPS:
-            # insert in reverse order
-            yc.insert(0, y)
-            rc.insert(0, z)
-        yprev = y
-        zprev = z
-
-    # cone
-    Nv = 40
-    u = math.pi / 2.0
-    for k in range(0, Nv+1):
-        v = utils.clamp(V1c + float(k)*(V2c - V1c)/float(Nv), V1c, V2c)
-        cone.D0(u, v, pt)
-        y = pt.Y() + wy*thickness
-        z = pt.Z() + wz*thickness
-        # check if it is the same point
-        dist = math.sqrt(utils.squared(y - yprev) + utils.squared(z - zprev))
-        if dist > EPS:
-            yc.append(y)
-            rc.append(z)
-        yprev = y
-        zprev = z
-
-    # top
-    Nv = 4
-    u = math.pi / 2.0
-    for k in range(0, Nv+1):
-        v = utils.clamp(V1t + float(k)*(V2t - V1t)/float(Nv), V1t, V2t)
-        top.D0(u, v, pt)
-        y = pt.Y() + wy*thickness
-        z = pt.Z() + wz*thickness
-        # check if it is the same point
-        dist = math.sqrt(utils.squared(y - yprev) + utils.squared(z - zprev))
-        if dist > EPS:
-            yc.append(y)
-            rc.append(z)
-        yprev = y
-        zprev = z
-
-    # print("rrr {0} {1} {2}".format((U1s, U2s, V1s, V2s), (U1c, U2c, V1c, V2c), (U1t, U2t, V1t, V2t)) )
-    return (yc, rc)
-
-
-def make_inner_cup_shell(surfaces):
+
+def select_faces(the_faces, outer_faces = None, inner_faces = None):
     """
-    Given list of surfaces, computes and returns (y, r) tuple of the cup inner shell
+    Given list of faces and optional (sphere, cone, top) indices of the outer and inner walls,
+    returns both index tuples, the missing ones are found by face_roles
+    """
+    if outer_faces is None or inner_faces is None:
+        roles = face_roles.classify_cup(the_faces, u = math.pi / 2.0)
+        logger.info("face roles: {0}".format(roles))
+        if outer_faces is None:
+            outer_faces = (roles.outer_sphere, roles.inner_cone, roles.inner_top)
+        if inner_faces is None:
+            inner_faces = (roles.inner_sphere, roles.inner_cone, roles.inner_top)
+
+    return (tuple(outer_faces), tuple(inner_faces))
+
+
+def faces(filename: str, outer_faces = None, inner_faces = None):
     """
-    sphere = surfaces[0]
-    cone   = surfaces[1]
-    top    = surfaces[2]
+    Given STEP filename, returns (outer_faces, inner_faces) as select_faces() does
+    """
+    sol = main(filename)
 
-    U1s, U2s, V1s, V2s = sphere.Bounds()
-    U1c, U2c, V1c, V2c = cone.Bounds()
-    U1t, U2t, V1t, V2t = top.Bounds()
+    return select_faces(aocutils.topology.Topo(sol, return_iter=False).faces, outer_faces, inner_faces)
 
-    rc = list()
-    yc = list()
 
-    pt = OCC.gp.gp_Pnt()
+def shell_samples(filename: str, outer_faces = None, inner_faces = None, Nv: int = 40, tol: float = None):
+    """
+    Given STEP filename, samples the outer cup once and returns ((yiw, riw), samples)
+    with the inner wall arrays and outer_cup_samples() to build outer wall of any thickness.
+    Faces are found by face_roles unless (sphere, cone, top) indices are given,
+    like (39, 125, 126) and (124, 125, 126) for S 203
+    """
+    sol = main(filename)
 
-    # determine where spehre ends
-    u = 0.0
-    v = V1c
-    cone.D0(u, v, pt)
-    ymin = pt.Y()
+    the_faces = aocutils.topology.Topo(sol, return_iter=False).faces
 
-    EPS = 1.0e-3
+    outer_faces, inner_faces = select_faces(the_faces, outer_faces, inner_faces)
 
-    yprev = -100000.0
-    zprev = -100000.0
+    samples = outer_cup_samples(cup_surfaces(the_faces, outer_faces), Nv, tol)
+    inner   = make_inner_cup_shell(cup_surfaces(the_faces, inner_faces), Nv, tol)
 
-    # sphere first
-    Nv = 40
-    u = math.pi / 2.0
-    ve = 0.5*(V1s + V2s)
-    for k in range(0, Nv+1):
-        v = utils.clamp(V1s + float(k)*(ve - V1s)/float(Nv), V1s, V2s)
-        sphere.D0(u, v, pt)
-        if pt.Y() > ymin:
-            continue
-        y = pt.Y()
-        z = pt.Z()
-        # check if it is the same point
-        dist = math.sqrt(utils.squared(y - yprev) + utils.squared(z - zprev))
-        if dist > EPS:
-            # insert in reverse order
-            yc.insert(0, y)
-            rc.insert(0, z)
-        yprev = y
-        zprev = z
-
-    # cone
-    Nv = 40
-    u = math.pi / 2.0
-    # u = 0.0
-    for k in range(0, Nv+1):
-        v = utils.clamp(V1c + float(k)*(V2c - V1c)/float(Nv), V1c, V2c)
-        cone.D0(u, v, pt)
-        y = pt.Y()
-        z = pt.Z()
-        # check if it is the same point
-        dist = math.sqrt(utils.squared(y - yprev) + utils.squared(z - zprev))
-        if dist > EPS:
-            yc.append(y)
-            rc.append(z)
-        yprev = y
-        zprev = z
-
-    # top
-    Nv = 4
-    u = math.pi / 2.0
-    for k in range(0, Nv+1):
-        v = utils.clamp(V1t + float(k)*(V2t - V1t)/float(Nv), V1t, V2t)
-        top.D0(u, v, pt)
-        y = pt.Y()
-        z = pt.Z()
-        # check if it is the same point
-        dist = math.sqrt(utils.squared(y - yprev) + utils.squared(z - zprev))
-        if dist > EPS:
-            yc.append(y)
-            rc.append(z)
-        yprev = y
-        zprev = z
-
-    return (yc, rc)
+    return (inner, samples)
+
+
+def convert(filename: str, InnerCup: str = "G01", outer_faces = None, inner_faces = None,
+            DistanceToCup: float = -101.0, thickness: float = 2.0, Nv: int = 40, tol: float = None) -> str:
+    """
+    process single outer cup from filename into ICP file, without display,
+    returns ICP file name. Faces are selected as in shell_samples().
+    Outer wall is the outer sphere with the inner cone and top protruded by thickness
+    """
+    (yiw, riw), samples = shell_samples(filename, outer_faces, inner_faces, Nv, tol)
+
+    yow, row = make_outer_cup_shell(None, thickness, samples = samples)
+    yow, row = outer_cup_fixup(yow, row)
+
+    return CADhelpers.write_ICP("8", "1", InnerCup, DistanceToCup, yiw, riw, yow, row)
 
 
 if __name__ == "__main__":
@@ -336,10 +175,8 @@ if __name__ == "__main__":
 
     sol = main("cups/XMSGP030A10.01-003 breast_cup_outer_S 203.STEP")
 
-    # backend = aocutils.display.defaults.backend
-    # display, start_display, add_menu, add_function_to_menu = OCC.Display.SimpleGui.init_display(backend)
-    # display_all(display, sol)
-    # start_display()
+    if "--display" in sys.argv:
+        DISPhelpers.show(sol)
 
     #CADhelpers.print_flags(sol)
 
@@ -350,40 +187,36 @@ if __name__ == "__main__":
 
     the_faces = aocutils.topology.Topo(sol, return_iter=False).faces
 
-    outer = list()
-    inner = list()
-
-    for i, face in enumerate(the_faces):
-        s = OCC.BRep.BRep_Tool.Surface(face) # get handle to the surface
-        t = CADhelpers.get_surface(s)
-        print("{0} {1} {2} {3}".format(i, type(face), type(s), t))
-
-        if "Geom_SphericalSurface" in t:
-            ss = CADhelpers.cast_surface(s).GetObject() # specific surface
-            sphere = ss.Sphere()
-            ssl = sphere.Location()
-            ssp = sphere.Position()
-            print("  {0} {1} {2} {3}".format(sphere.Radius(), ssl.X(), ssl.Y(), ssl.Z()))
-            U1, U2, V1, V2 = ss.Bounds()
-            print("    {0} {1} {2} {3}".format(U1, U2, V1, V2))
-
-            blocks = CADhelpers.surface2gnuplot(ss)
-            CADhelpers.save_gnuplot_surface("sphere", i, blocks, True)
-
-        elif "Geom_ConicalSurface" in t:
-            ss = CADhelpers.cast_surface(s).GetObject() # specific surface
-            cone = ss.Cone()
-            blocks = CADhelpers.surface2gnuplot(ss)
-            CADhelpers.save_gnuplot_surface("cone", i, blocks, True)
-
-        elif "Geom_RectangularTrimmedSurface" in t:
-            ss = CADhelpers.cast_surface(s).GetObject() # specific surface
-            blocks = CADhelpers.surface2gnuplot(ss)
-            CADhelpers.save_gnuplot_surface("trim", i, blocks, True)
-
-    outer.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[39])).GetObject())
-    outer.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[125])).GetObject())
-    outer.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[126])).GetObject())
+    # sphere_i.dat, cone_i.dat, ... gnuplot files, or all faces into one container with --npz, same (X, Z, Y) frame
+    dump = surface_dump.SurfaceArchive("outer_S_203_faces.npz") if "--npz" in sys.argv else surface_dump.GnuplotDump()
+
+    with dump:
+        for i, face in enumerate(the_faces):
+            s = OCC.BRep.BRep_Tool.Surface(face) # get handle to the surface
+            t = CADhelpers.get_surface(s)
+            print("{0} {1} {2} {3}".format(i, type(face), type(s), t))
+
+            if "Geom_SphericalSurface" in t:
+                ss = CADhelpers.cast_surface(s).GetObject() # specific surface
+                sphere = ss.Sphere()
+                ssl = sphere.Location()
+                ssp = sphere.Position()
+                print("  {0} {1} {2} {3}".format(sphere.Radius(), ssl.X(), ssl.Y(), ssl.Z()))
+                U1, U2, V1, V2 = ss.Bounds()
+                print("    {0} {1} {2} {3}".format(U1, U2, V1, V2))
+
+                dump.add(i, ss, "sphere")
+
+            elif "Geom_ConicalSurface" in t:
+                ss = CADhelpers.cast_surface(s).GetObject() # specific surface
+                cone = ss.Cone()
+                dump.add(i, ss, "cone")
+
+            elif "Geom_RectangularTrimmedSurface" in t:
+                ss = CADhelpers.cast_surface(s).GetObject() # specific surface
+                dump.add(i, ss, "trim")
+
+    outer = cup_surfaces(the_faces, (39, 125, 126))
 
     print(sep)
 
@@ -396,9 +229,7 @@ if __name__ == "__main__":
 
     print(sep)
 
-    inner.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[124])).GetObject())
-    inner.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[125])).GetObject())
-    inner.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[126])).GetObject())
+    inner = cup_surfaces(the_faces, (124, 125, 126))
 
     for k, i in enumerate(inner):
         t = CADhelpers.get_surface(i)
@@ -408,11 +239,7 @@ if __name__ == "__main__":
     yiw, riw = make_inner_cup_shell(inner)
 
     # outer cup fixup from drawings
-    lp = yow[-1]
-    yow.append(lp)
-    row.append(8.700000e+01) # those number were taken from SW drawing
-    yow.append(0.0)
-    row.append(8.795000e+01) # total diameter 179.50
+    yow, row = outer_cup_fixup(yow, row)
 
     print(sep)
 
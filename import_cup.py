@@ -4,13 +4,10 @@ import sys
 import logging
 import math
 
-from functools import partial
-
 import OCC.TopoDS
-import OCC.Display.SimpleGui
+import OCC.BRep
 
-import aocutils.display.topology
-import aocutils.display.backends
+import aocutils.topology
 
 import aocxchange.step
 import aocxchange.utils
@@ -21,105 +18,23 @@ from point2d       import point2d
 from point3d       import point3d
 
 import CADhelpers
+import surface_dump
 import DISPhelpers
+import step_cache
+import cup_profile
+import face_roles
 
 from XcIO.write_OCP  import write_OCP
 
-def display_faces(display, shape, pattern: str, event = None) -> None:
-    """
-    Display shape faces given the display
-    """
-    transparency=0.8
-    show_numbers=True
-    numbers_height=20
-    color_sequence = aocutils.display.color.prism_color_sequence
-
-    display.EraseAll()
-
-    the_faces = aocutils.topology.Topo(shape, return_iter=False).faces
-    ais_context = display.GetContext().GetObject()
-
-    for i, face in enumerate(the_faces):
-        s = OCC.BRep.BRep_Tool.Surface(face).GetObject() # make surface from face, get back handle
-        t = CADhelpers.get_surface(s)
-        if pattern not in t:
-            continue
-
-        ais_face = OCC.AIS.AIS_Shape(face)
-        ais_face.SetColor(color_sequence[i % len(color_sequence)])
-        ais_face.SetTransparency(transparency)
-        if show_numbers:
-            display.DisplayMessage(point=aocutils.brep.face.Face(face).midpoint,
-                                   text_to_write = "{0}".format(i),
-                                   height=numbers_height,
-                                   message_color=(1, 0, 0))
-        ais_context.Display(ais_face.GetHandle())
-
-    display.FitAll()
-    display.View_Iso()
-
-
-def display_all(display, shape):
-    """
-    display every part of the shape
-    """
-    add_menu('solids')
-    dsolids = partial(DISPhelpers.display_solids, display, shape)
-    dsolids.__name__ = "dsolids"
-    add_function_to_menu('solids', dsolids)
-    add_menu('edges')
-    dedges = partial(DISPhelpers.display_edges, display, shape)
-    dedges.__name__ = "dedges"
-    add_function_to_menu('edges', dedges)
-    add_menu('faces')
-    dfaces_bezier =  partial(display_faces, display, shape, "Geom_BezierSurface")
-    dfaces_bezier.__name__ = "Bezier"
-    dfaces_bspline = partial(display_faces, display, shape, "Geom_BSplineSurface")
-    dfaces_bspline.__name__ = "BSpline"
-    dfaces_conical = partial(display_faces, display, shape, "Geom_ConicalSurface")
-    dfaces_conical.__name__ = "Conical"
-    dfaces_cylindrical = partial(display_faces, display, shape, "Geom_CylindricalSurface")
-    dfaces_cylindrical.__name__ = "Cylindrical"
-    dfaces_spherical = partial(display_faces, display, shape, "Geom_SphericalSurface")
-    dfaces_spherical.__name__ = "Spherical"
-    dfaces_plane =  partial(display_faces, display, shape, "Geom_Plane")
-    dfaces_plane.__name__ = "Plane"
-    dfaces_toro =  partial(display_faces, display, shape, "Geom_ToroidalSurface")
-    dfaces_toro.__name__ = "Toro"
-    dfaces_rect = partial(display_faces, display, shape, "Geom_RectangularTrimmedSurface")
-    dfaces_rect.__name__ = "RecT"
-    dfaces_linext = partial(display_faces, display, shape, "Geom_SurfaceOfLinearExtrusion")
-    dfaces_linext.__name__ = "LinExt"
-    dfaces_surfrev = partial(display_faces, display, shape, "Geom_SurfaceOfRevolution")
-    dfaces_surfrev.__name__ = "SurfRev"
-    add_function_to_menu('faces', dfaces_bezier)
-    add_function_to_menu('faces', dfaces_conical)
-    add_function_to_menu('faces', dfaces_cylindrical)
-    add_function_to_menu('faces', dfaces_spherical)
-    add_function_to_menu('faces', dfaces_bspline)
-    add_function_to_menu('faces', dfaces_plane)
-    add_function_to_menu('faces', dfaces_toro)
-    add_function_to_menu('faces', dfaces_rect)
-    add_function_to_menu('faces', dfaces_linext)
-    add_function_to_menu('faces', dfaces_surfrev)
-    add_menu('shells')
-    dshells = partial(DISPhelpers.display_shells, display, shape)
-    dshells.__name__ = "dshells"
-    add_function_to_menu('shells', dshells)
-    add_menu('wires')
-    dwires = partial(DISPhelpers.display_wires, display, shape)
-    dwires.__name__ = "dwires"
-    add_function_to_menu('wires', dwires)
-
+logger = logging.getLogger(__name__)
 
 def readSTEP(filename: str):
     """
     Given the STEP filename, read shapes from it
     """
     fname = aocxchange.utils.path_from_file(__file__, filename)
-    importer = aocxchange.step.StepImporter(fname)
 
-    return importer.shapes
+    return step_cache.read_step(fname)
 
 def main(filename: str):
     """
@@ -128,6 +43,7 @@ def main(filename: str):
     shapes = readSTEP(filename)
 
     print("+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
+    print("STEP cache: {0}".format(step_cache.stats()))
     print("Number of shapes: {0}".format(len(shapes)))
     for shape in shapes:
         print("{0}: {1} {2}".format(shape.ShapeType(), CADhelpers.str_shape(shape.ShapeType()), type(aocutils.topology.shape_to_topology(shape))))
@@ -137,94 +53,74 @@ def main(filename: str):
 
     return sol
 
-def make_cup_shell(surfaces):
+def make_cup_shell(surfaces, Nv: int = 40, tol: float = None):
     """
     Given list of surfaces, computes and returns (y, r) tuple of the cup shell
     """
-    sphere = surfaces[0]
-    cone   = surfaces[1]
-    top    = surfaces[2]
-
-    print("Q {0} {1} {2}".format(type(sphere), type(cone), type(top)))
-
-    U1s, U2s, V1s, V2s = sphere.Bounds()
-    U1c, U2c, V1c, V2c = cone.Bounds()
-    U1t, U2t, V1t, V2t = top.Bounds()
-
-    # print("QA {0} {1} {2} {3}".format(U1s, U2s, V1s, V2s))
-    # print("QB {0} {1} {2} {3}".format(U1c, U2c, V1c, V2c))
-    # print("QC {0} {1} {2} {3}".format(U1t, U2t, V1t, V2t))
-
-    rc = list()
-    yc = list()
-
-    pt = OCC.gp.gp_Pnt()
-
-    # determine where sphere ends
-    u = 0.0
-    v = V1c
-    cone.D0(u, v, pt)
-    ymin = pt.Y()
-
-    EPS = 1.0e-3
-
-    yprev = -1000000.0
-    zprev = -1000000.0
-
-    # sphere first
-    Nv = 40
-    u = math.pi / 2.0
-    ve = 0.5*(V1s + V2s)
-    for k in range(0, Nv+1):
-        v = utils.clamp(V1s + float(k)*(ve - V1s)/float(Nv), V1s, V2s)
-        sphere.D0(u, v, pt)
-        if pt.Y() > ymin:
-            continue
-        y = pt.Y()
-        z = pt.Z()
-        # check if it is the same point
-        dist = math.sqrt(utils.squared(y - yprev) + utils.squared(z - zprev))
-        if dist > EPS:
-            # insert in reverse order
-            yc.insert(0, y)
-            rc.insert(0, z)
-        yprev = y
-        zprev = z
-
-    # cone
-    Nv = 40
-    u = 0.0
-    for k in range(0, Nv+1):
-        v = utils.clamp(V1c + float(k)*(V2c - V1c)/float(Nv), V1c, V2c)
-        cone.D0(u, v, pt)
-        y = pt.Y()
-        z = pt.Z()
-        # check if it is the same point
-        dist = math.sqrt(utils.squared(y - yprev) + utils.squared(z - zprev))
-        if dist > EPS:
-            yc.append(y)
-            rc.append(z)
-        yprev = y
-        zprev = z
-
-    # top
-    Nv = 4
-    u = 0.0
-    for k in range(0, Nv+1):
-        v = utils.clamp(V1t + float(k)*(V2t - V1t)/float(Nv), V1t, V2t)
-        top.D0(u, v, pt)
-        y = pt.Y()
-        z = pt.Z()
-        # check if it is the same point
-        dist = math.sqrt(utils.squared(y - yprev) + utils.squared(z - zprev))
-        if dist > EPS:
-            yc.append(y)
-            rc.append(z)
-        yprev = y
-        zprev = z
-
-    # print("rrr {0} {1} {2}".format((U1s, U2s, V1s, V2s), (U1c, U2c, V1c, V2c), (U1t, U2t, V1t, V2t)) )
-    return (yc, rc)
+    print("Q {0} {1} {2}".format(type(surfaces[0]), type(surfaces[1]), type(surfaces[2])))
+
+    return cup_profile.shell_profile(surfaces, u_cut = 0.0, u_wall = 0.0, Nv = Nv, tol = tol)
+
+
+def cup_surfaces(the_faces, indices):
+    """
+    Given list of faces and indices, returns actual surfaces of the selected faces
+    """
+    return [CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[k])).GetObject() for k in indices]
+
+
+def select_faces(the_faces, outer_faces = None, inner_faces = None):
+    """
+    Given list of faces and optional (sphere, cone, top) indices of the outer and inner walls,
+    returns both index tuples, the missing ones are found by face_roles
+    """
+    if outer_faces is None or inner_faces is None:
+        roles = face_roles.classify_cup(the_faces, u = 0.0)
+        logger.info("face roles: {0}".format(roles))
+        if outer_faces is None:
+            outer_faces = (roles.outer_sphere, roles.outer_cone, roles.outer_top)
+        if inner_faces is None:
+            inner_faces = (roles.inner_sphere, roles.inner_cone, roles.inner_top)
+
+    return (tuple(outer_faces), tuple(inner_faces))
+
+
+def faces(filename: str, outer_faces = None, inner_faces = None):
+    """
+    Given STEP filename, returns (outer_faces, inner_faces) as select_faces() does
+    """
+    sol = main(filename)
+
+    return select_faces(aocutils.topology.Topo(sol, return_iter=False).faces, outer_faces, inner_faces)
+
+
+def shells(filename: str, outer_faces = None, inner_faces = None, Nv: int = 40, tol: float = None):
+    """
+    Given STEP filename, samples the cup once and returns (yiw, riw, yow, row) arrays
+    of the inner and outer walls. Faces are found by face_roles unless
+    (sphere, cone, top) indices are given, like (14, 13, 11) and (15, 16, 9) for S1
+    """
+    sol = main(filename)
+
+    the_faces = aocutils.topology.Topo(sol, return_iter=False).faces
+
+    outer_faces, inner_faces = select_faces(the_faces, outer_faces, inner_faces)
+
+    yow, row = make_cup_shell(cup_surfaces(the_faces, outer_faces), Nv, tol)
+    yiw, riw = make_cup_shell(cup_surfaces(the_faces, inner_faces), Nv, tol)
+
+    return (yiw, riw, yow, row)
+
+
+def convert(filename: str, InnerCup: str = "S01", outer_faces = None, inner_faces = None,
+            DistanceToTop: float = -101.0, FlapperShift: float = -4.22, Nv: int = 40, tol: float = None) -> str:
+    """
+    process single cup from filename into ICP file, without display,
+    returns ICP file name. Faces are selected as in shells()
+    """
+    yiw, riw, yow, row = shells(filename, outer_faces, inner_faces, Nv, tol)
+
+    return CADhelpers.write_ICP("8", "1", InnerCup, DistanceToTop + FlapperShift, yiw, riw, yow, row)
 
 
 if __name__ == "__main__":
@@ -233,10 +129,8 @@ if __name__ == "__main__":
 
     sol = main("cups/XMSGP030A10.02-033 NS01.STEP") # "XMSGP030A10.01-003 breast_cup_outer_S 214.STEP" # "cups/XMSGP030A10.01-003 breast_cup_outer_S 214.STEP"
 
-    backend = aocutils.display.defaults.backend
-    display, start_display, add_menu, add_function_to_menu = OCC.Display.SimpleGui.init_display(backend)
-    display_all(display, sol)
-    start_display()
+    if "--display" in sys.argv:
+        DISPhelpers.show(sol)
 
     #CADhelpers.print_flags(sol)
 
@@ -247,48 +141,44 @@ if __name__ == "__main__":
 
     the_faces = aocutils.topology.Topo(sol, return_iter=False).faces
 
-    outer = list()
-    inner = list()
-
-    for i, face in enumerate(the_faces):
-        s = OCC.BRep.BRep_Tool.Surface(face) # get handle to the surface
-        t = CADhelpers.get_surface(s)
-        print("{0} {1} {2} {3}".format(i, type(face), type(s), t))
-
-        if "Geom_SphericalSurface" in t:
-            ss = CADhelpers.cast_surface(s).GetObject() # specific surface
-            sphere = ss.Sphere()
-            ssl = sphere.Location()
-            ssp = sphere.Position()
-            print("  {0} {1} {2} {3}".format(sphere.Radius(), ssl.X(), ssl.Y(), ssl.Z()))
-            U1, U2, V1, V2 = ss.Bounds()
-            print("    {0} {1} {2} {3}".format(U1, U2, V1, V2))
-
-            blocks = CADhelpers.surface2gnuplot(ss)
-            CADhelpers.save_gnuplot_surface("sphere", i, blocks, True)
-
-        elif "Geom_ConicalSurface" in t:
-            ss = CADhelpers.cast_surface(s).GetObject() # specific surface
-            cone = ss.Cone()
-            blocks = CADhelpers.surface2gnuplot(ss)
-            CADhelpers.save_gnuplot_surface("cone", i, blocks, True)
-
-        elif "Geom_RectangularTrimmedSurface" in t:
-            ss = CADhelpers.cast_surface(s).GetObject() # specific surface
-            blocks = CADhelpers.surface2gnuplot(ss)
-            CADhelpers.save_gnuplot_surface("trim", i, blocks, True)
-            bs = CADhelpers.cast_surface(ss.BasisSurface()).GetObject()
-            #if "Geom_ConicalSurface" in str(type(bs)):
-            #    CADhelpers.save_gnuplot_surface("conet", i, blocks, True)
+    # sphere_i.dat, cone_i.dat, ... gnuplot files, or all faces into one container with --npz, same (X, Z, Y) frame
+    dump = surface_dump.SurfaceArchive("NS01_faces.npz") if "--npz" in sys.argv else surface_dump.GnuplotDump()
+
+    with dump:
+        for i, face in enumerate(the_faces):
+            s = OCC.BRep.BRep_Tool.Surface(face) # get handle to the surface
+            t = CADhelpers.get_surface(s)
+            print("{0} {1} {2} {3}".format(i, type(face), type(s), t))
+
+            if "Geom_SphericalSurface" in t:
+                ss = CADhelpers.cast_surface(s).GetObject() # specific surface
+                sphere = ss.Sphere()
+                ssl = sphere.Location()
+                ssp = sphere.Position()
+                print("  {0} {1} {2} {3}".format(sphere.Radius(), ssl.X(), ssl.Y(), ssl.Z()))
+                U1, U2, V1, V2 = ss.Bounds()
+                print("    {0} {1} {2} {3}".format(U1, U2, V1, V2))
+
+                dump.add(i, ss, "sphere")
+
+            elif "Geom_ConicalSurface" in t:
+                ss = CADhelpers.cast_surface(s).GetObject() # specific surface
+                cone = ss.Cone()
+                dump.add(i, ss, "cone")
+
+            elif "Geom_RectangularTrimmedSurface" in t:
+                ss = CADhelpers.cast_surface(s).GetObject() # specific surface
+                dump.add(i, ss, "trim")
+                bs = CADhelpers.cast_surface(ss.BasisSurface()).GetObject()
+                #if "Geom_ConicalSurface" in str(type(bs)):
+                #    CADhelpers.save_gnuplot_surface("conet", i, blocks, True)
 
     # for S5 - 14, 0, 11
     # for S4 - 21, 0, 18
     # for S3 - 14, 0, 11
     # for S2 - 14, 0, 11
     # for S1 - 14, 13, 11
-    outer.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[14])).GetObject())
-    outer.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[13])).GetObject())
-    outer.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[11])).GetObject())
+    outer = cup_surfaces(the_faces, (14, 13, 11))
 
     print(sep)
 
@@ -306,9 +196,7 @@ if __name__ == "__main__":
     # for S3 - 15, 16, 09
     # for S2 - 15, 16, 09
     # for S1 - 15, 16, 09
-    inner.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[15])).GetObject())
-    inner.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[16])).GetObject())
-    inner.append(CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(the_faces[9])).GetObject())
+    inner = cup_surfaces(the_faces, (15, 16, 9))
 
     for k, i in enumerate(inner):
         t = CADhelpers.get_surface(i)
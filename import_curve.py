@@ -4,64 +4,44 @@ from __future__ import print_function
 
 import sys
 import math
+import time
 import numpy as np
 import logging
 
-from functools import partial
-
+import OCC.gp
+import OCC.Geom
+import OCC.TopAbs
 import OCC.TopoDS
-import OCC.Display.SimpleGui
+import OCC.BRep
+import OCC.BRepCheck
 
-import aocutils.display.topology
-import aocutils.display.backends
+import aocutils.topology
 
 import aocxchange.step
 import aocxchange.utils
 
 import CADhelpers
 import DISPhelpers
+import step_cache
+import surface_sampler
+import shape_index
+import simplify
+import frames
+import offset_curve
 
-from XcMath          import utils
 from XcIO.write_OCP  import write_OCP
 
-from rdp             import rdp
-
-from point2d import point2d
-from point3d import point3d
-
-def display_all(display, shape):
-    """
-    display every part of the shape
-    """
-    add_menu('solids')
-    dsolids = partial(DISPhelpers.display_solids, display, shape)
-    dsolids.__name__ = "dsolids"
-    add_function_to_menu('solids', dsolids)
-    add_menu('edges')
-    dedges = partial(DISPhelpers.display_edges, display, shape)
-    dedges.__name__ = "dedges"
-    add_function_to_menu('edges', dedges)
-    add_menu('faces')
-    dfaces = partial(DISPhelpers.display_faces, display, shape)
-    dfaces.__name__ = "dfaces"
-    add_function_to_menu('faces', dfaces)
-    add_menu('shells')
-    dshells = partial(DISPhelpers.display_shells, display, shape)
-    dshells.__name__ = "dshells"
-    add_function_to_menu('shells', dshells)
-    add_menu('wires')
-    dwires = partial(DISPhelpers.display_wires, display, shape)
-    dwires.__name__ = "dwires"
-    add_function_to_menu('wires', dwires)
+from Idx     import X, Y, Z
+from point2d import point2d, Points2D
+from point3d import point3d, Points3D
 
 def readSTEP(filename):
     """
     Given the STEP filename, read shapes from it
     """
     fname = aocxchange.utils.path_from_file(__file__, filename)
-    importer = aocxchange.step.StepImporter(fname)
 
-    return importer.shapes
+    return step_cache.read_step(fname)
 
 def print_shapes():
     """
@@ -86,6 +66,7 @@ def main(filename):
     shapes = readSTEP(filename)
 
     print("+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
+    print("STEP cache: {0}".format(step_cache.stats()))
     print("Number of shapes: {0}".format(len(shapes)))
     for shape in shapes:
         print("{0}: {1}".format(shape.ShapeType(), CADhelpers.str_shape(shape.ShapeType())))
@@ -112,15 +93,85 @@ def print_flags(shape):
     print(shape.Free())
     print(shape.Infinite())
 
-def compute_bspline_midline(bspline, Nv = 100, Nu = 1024):
+def ring_centroid(rings) -> np.ndarray:
+    """
+    Given (Nv+1, Nu, 3) rings, returns (Nv+1, 3) centers as ring centroids
+    """
+    return rings.mean(axis=1)
+
+
+def ring_circle_fit(rings) -> np.ndarray:
+    """
+    Given (Nv+1, Nu, 3) rings, returns (Nv+1, 3) centers of the least-squares
+    circles, fitted in the best plane of each ring
+    """
+    c = rings.mean(axis=1)
+    d = rings - c[:, None, :]
+
+    # in-plane basis from the two leading singular vectors
+    _, _, vt = np.linalg.svd(d, full_matrices=False)
+    e1 = vt[:, 0, :]
+    e2 = vt[:, 1, :]
+
+    a = np.einsum("nkc,nc->nk", d, e1)
+    b = np.einsum("nkc,nc->nk", d, e2)
+
+    # algebraic (Kasa) fit, a^2 + b^2 = 2*a0*a + 2*b0*b + c0
+    A   = np.stack((2.0*a, 2.0*b, np.ones_like(a)), axis=-1)
+    rhs = a*a + b*b
+    sol = np.linalg.solve(np.einsum("nki,nkj->nij", A, A), np.einsum("nki,nk->ni", A, rhs)[..., None])[..., 0]
+
+    return c + sol[:, 0, None]*e1 + sol[:, 1, None]*e2
+
+
+def ring_min_radius(rings) -> np.ndarray:
+    """
+    Given (Nv+1, Nu, 3) rings, returns (Nv+1, 2) outline as (y, r)
+    of the ring point closest to the Y axis
+    """
+    r2 = np.square(rings[..., X]) + np.square(rings[..., Z])
+    k  = np.argmin(r2, axis=1)
+    n  = np.arange(len(rings))
+    return np.stack((rings[n, k, Y], np.sqrt(r2[n, k])), axis=-1)
+
+
+def sample_rings(surface, Nv = 100, Nu = 1024) -> np.ndarray:
+    """
+    Given surface with closed U and open V, returns (Nv+1, Nu, 3)
+    array of U-rings, the closing sample of each ring is not repeated
+    """
+    U1, U2, V1, V2 = surface.Bounds()
+
+    us = U1 + (U2 - U1) * np.arange(Nu) / float(Nu)
+    vs = np.linspace(V1, V2, Nv+1)
+
+    return np.ascontiguousarray(surface_sampler.sample(surface, us, vs).transpose(1, 0, 2))
+
+
+def reduce_rings(rings, reducer = ring_centroid):
+    """
+    Given sampled rings and reducer, returns Points3D for curve,
+    Points2D for cup outline
+    """
+    centers = reducer(rings)
+    outline = ring_min_radius(rings)
+
+    r3 = Points3D(centers)
+    r2 = Points2D(outline)
+
+    return (r3, r2)
+
+
+def compute_bspline_midline(bspline, Nv = 100, Nu = 1024, reducer = ring_centroid):
     """
     Given the bspline surface with one open and one closed/periodic parameter,
     compute middle/center line assuming closed parameter is a circle
 
-    Nu - number of points in U space, how much points will be returned
-    Nv - number of points in V space, how much to use to compute middle point
+    Nu - number of points in U space, how much to use to compute middle point
+    Nv - number of points in V space, how much points will be returned
+    reducer - maps (Nv+1, Nu, 3) rings into (Nv+1, 3) centers
 
-    Returns array of 3d points for curve, array of 2d points for cup outline
+    Returns Points3D for curve, Points2D for cup outline
     """
     if bspline is None:
         return None
@@ -128,143 +179,162 @@ def compute_bspline_midline(bspline, Nv = 100, Nu = 1024):
     if "Geom_RectangularTrimmedSurface" not in str(type(bspline)):
         return None
 
-    U1, U2, V1, V2 = bspline.Bounds()
+    rings = sample_rings(bspline, Nv, Nu)
+    if len(rings) == 0:
+        return None
+
+    return reduce_rings(rings, reducer)
+
+
+def compute_bspline_midline_progressive(bspline, Nv = 100, tol = 1.0e-4, Nu0 = 16, Numax = 1024, reducer = ring_centroid):
+    """
+    Given the bspline surface with one open and one closed/periodic parameter,
+    compute middle/center line, doubling U resolution of each ring
+    until its center moves less than tol
+
+    Nv    - number of points in V space, how much points will be returned
+    tol   - convergence tolerance for the ring center
+    Nu0   - initial number of points in U space
+    Numax - max number of points in U space, rings are refined to Nu0*2^k not above it
+    reducer - maps (n, Nu, 3) rings into (n, 3) centers
 
-    r2 = list()
-    r3 = list()
-
-    pt = OCC.gp.gp_Pnt()
-
-    vstep = (V2 - V1) / float(Nv)
-    ustep = (U2 - U1) / float(Nu)
-    uwght = 1.0 / float(Nu)
-
-    for kv in range(0, Nv+1):
-        v = utils.clamp(V1 + vstep * float(kv), V1, V2)
-        x = 0.0
-        y = 0.0
-        z = 0.0
-        rmin = 1000000000.0
-        ymin = 0.0
-        for ku in range(0, Nu+1):
-            u = utils.clamp(U1 + ustep * float(ku), U1, U2)
-            ss.D0(u, v, pt)
-            x += pt.X()
-            y += pt.Y()
-            z += pt.Z()
-            r = utils.squared(pt.X()) + utils.squared(pt.Z())
-            if r < rmin:
-                rmin = r
-                ymin = pt.Y()
-
-        r2.append(point2d(ymin, math.sqrt(rmin)))
-        r3.append(point3d(uwght*x, uwght*y, uwght*z))
-
-    if len(r3) == 0:
+    Returns Points3D for curve, Points2D for cup outline,
+    array with number of U samples used per ring
+    """
+    if bspline is None:
         return None
 
-    return (r3, r2)
+    if "Geom_RectangularTrimmedSurface" not in str(type(bspline)):
+        return None
+
+    U1, U2, V1, V2 = bspline.Bounds()
+    vs = np.linspace(V1, V2, Nv+1)
+
+    Nu = Nu0
+    rings   = sample_rings(bspline, Nv, Nu)
+    centers = reducer(rings)
+    outline = ring_min_radius(rings)
+    samples = np.full(Nv+1, Nu, dtype=np.int64)
+
+    active = np.arange(Nv+1) # rings which are not converged yet
+    while 2*Nu <= Numax and len(active) > 0:
+        # odd samples only, even ones are the previous level
+        us = U1 + (U2 - U1) * (2.0*np.arange(Nu) + 1.0) / float(2*Nu)
+        odd = surface_sampler.sample(bspline, us, vs[active]).transpose(1, 0, 2)
+
+        Nu *= 2
+        fine = np.empty((len(active), Nu, 3))
+        fine[:, 0::2] = rings
+        fine[:, 1::2] = odd
+
+        c = reducer(fine)
+        moved = np.linalg.norm(c - centers[active], axis=-1)
+
+        centers[active] = c
+        outline[active] = ring_min_radius(fine)
+        samples[active] = Nu
+
+        going  = moved >= tol
+        rings  = fine[going]
+        active = active[going]
+
+    r3 = Points3D(centers)
+    r2 = Points2D(outline)
+
+    return (r3, r2, samples)
+
+
+def extend_to_plane(a, origin: float) -> np.ndarray:
+    """
+    Given (n, 3) polyline, returns (n+2, 3) polyline with both ends
+    extended along the end segments to the plane z = origin
+    """
+    ends = a[[0, -1]]
+    d    = np.stack((a[1] - a[0], a[-1] - a[-2]))
+    p    = ends + d * ((origin - ends[:, Z]) / d[:, Z])[:, None]
+    return np.concatenate((p[:1], a, p[1:]))
+
+
+def convert_fiducial(pts, origin) -> np.ndarray:
+    """
+    Convert fiducial curve from (n, 3) array or Points3D into proper OCP format,
+    returns (n+2, 3) array with end points extended to the origin plane
+    """
+    return extend_to_plane(frames.ocp_fiducial(origin)(pts), origin)
+
+
+FLANGE_R = np.array([8.138100e+01, 8.600000e+01, 8.800000e+01, 8.800000e+01]) # outer wall flange from drawings
+
+
+def convert_outline(pts, origin, thickness: float = 2.0):
+    """
+    Convert 2d points fiducial curve from (n, 2) array or Points2D of (y, r) into proper OCP format,
+    wall goes until radius starts to grow, inner wall is normal offset by thickness towards the origin.
+
+    Returns X and R arrays of outer wall, X and R arrays of inner wall
+    """
+    a = np.asarray(pts, dtype=np.float64)
+    y = a[:, 0]
+    r = a[:, 1]
+
+    grows = np.flatnonzero(np.diff(r) > 0.0)
+    n = grows[0] + 1 if len(grows) else len(r)
+    y = y[:n]
+    r = r[:n]
+
+    if n < 2:
+        raise ValueError("convert_outline: radius grows from the first point, no wall")
+
+    # true normal offset towards (0, 0), loops are trimmed
+    yi, ri = offset_curve.OffsetCurve.from_points(y, r).offset(-thickness)
+
+    # close at the bottom, revert and place relative to origin
+    wall = frames.wall(origin)
+    xow, yow = wall(np.stack((np.append(y,  origin - 2.0),             np.append(r,  0.0)), axis=-1))[::-1].T
+    xiw, yiw = wall(np.stack((np.append(yi, origin - 2.0 + thickness), np.append(ri, 0.0)), axis=-1))[::-1].T
+
+    flange_x = np.array([xow[-1], -99.0, -99.0, origin])
+
+    return (np.concatenate((xow, flange_x)), np.concatenate((yow, FLANGE_R)), xiw, yiw)
+
+
+def write_fiducial(pts, outline, distToOC: float = 101.0):
+    """
+    Given midline points and cup outline, convert them to OCP format and write OCP file
+    """
+    fc                 = convert_fiducial(pts, origin = -distToOC)
+    xow, yow, xiw, yiw = convert_outline(outline, origin = -distToOC)
+
+    iw = Points2D.from_xy(xiw, yiw).remove_dupes(0.5)
+    ow = Points2D.from_xy(xow, yow).remove_dupes(0.5)
+
+    keep, dev = simplify.simplify(fc, 0.01)
+    logging.info("fiducial curve: {0} of {1} points kept, max deviation {2:.4f}".format(len(keep), len(fc), dev))
+    fc = Points3D(fc[keep])
+
+    write_OCP(8, 1, distToOC, iw, ow, fc)
+
+
+def convert(filename: str, distToOC: float = 101.0, Nv: int = 220, tol: float = 1.0e-4) -> int:
+    """
+    process single fiducial from filename into OCP file, without display,
+    returns number of fiducial surfaces processed
+    """
+    sol = main(filename)
+
+    n = 0
+    index = shape_index.ShapeIndex(sol)
+    for k in index.faces_of_kind("Geom_RectangularTrimmedSurface"):
+        ss = CADhelpers.cast_surface(OCC.BRep.BRep_Tool.Surface(index.faces[k])).GetObject()
+        pts, outline, samples = compute_bspline_midline_progressive(ss, Nv = Nv, tol = tol)
+        write_fiducial(pts, outline, distToOC)
+        n += 1
+
+    if n == 0:
+        raise RuntimeError("No fiducial surface in {0}".format(filename))
+
+    return n
 
-def convert_fiducial(pts, origin):
-    """
-    Convert fiducial curve from list of points into proper OCP format
-    """
-    xfc = list()
-    yfc = list()
-    zfc = list()
-
-    for pt in pts:
-        xfc.append(-pt.z)
-        yfc.append(pt.x)
-        zfc.append( - (pt.y - origin))
-
-    # first point insertion
-    l = math.sqrt(utils.squared(xfc[0] - xfc[1]) + utils.squared(yfc[0] - yfc[1]) + utils.squared(zfc[0] - zfc[1]))
-    wx = (xfc[1] - xfc[0]) / l
-    wy = (yfc[1] - yfc[0]) / l
-    wz = (zfc[1] - zfc[0]) / l
-
-    s = (origin - zfc[0]) / wz
-
-    xfc.insert(0, xfc[0] + wx*s)
-    yfc.insert(0, yfc[0] + wy*s)
-    zfc.insert(0, zfc[0] + wz*s)
-
-    # last point insertion
-    l = math.sqrt(utils.squared(xfc[-1] - xfc[-2]) + utils.squared(yfc[-1] - yfc[-2]) + utils.squared(zfc[-1] - zfc[-2]))
-    wx = (xfc[-1] - xfc[-2]) / l
-    wy = (yfc[-1] - yfc[-2]) / l
-    wz = (zfc[-1] - zfc[-2]) / l
-
-    s = (origin - zfc[-1]) / wz
-
-    xfc.append(xfc[-1] + wx*s)
-    yfc.append(yfc[-1] + wy*s)
-    zfc.append(zfc[-1] + wz*s)
-
-    return (xfc, yfc, zfc)
-
-def convert_outline(pts, origin):
-    """
-    Convert 2d points fiducial curve from list of points into proper OCP format
-    """
-    xow = list()
-    yow = list()
-    xiw = list()
-    yiw = list()
-
-    thickness = 2.0
-
-    rprev = 111111.0
-    for pt in pts:
-        y = pt.x
-        r = pt.y
-        if r > rprev:
-            break
-        l  = math.sqrt(y*y + r*r)
-        wr = r / l
-        wy = y / l
-        xow.append(y)
-        yow.append(r)
-        xiw.append(y - wy*thickness)
-        yiw.append(r - wr*thickness)
-        rprev = r
-
-    xow.append(origin - 2.0)
-    yow.append(0.0)
-
-    xiw.append(origin - 2.0 + thickness)
-    yiw.append(0.0)
-
-    # revert outer and place relative to origin
-    xxow = list()
-    yyow = list()
-    for y, r in zip(xow, yow):
-        xxow.insert(0, origin - y)
-        yyow.insert(0, r)
-    del yow
-    del xow
-
-    t = xxow[-1]
-    xxow.append(t)
-    yyow.append(8.138100e+01)
-    xxow.append(-99.0)
-    yyow.append(8.600000e+01)
-    xxow.append(-99.0)
-    yyow.append(8.800000e+01)
-    xxow.append(origin)
-    yyow.append(8.800000e+01)
-
-    # revert inner and place relative to origin
-    xxiw = list()
-    yyiw = list()
-    for y, r in zip(xiw, yiw):
-        xxiw.insert(0, origin - y)
-        yyiw.insert(0, r)
-    del yiw
-    del xiw
-
-    return xxow, yyow, xxiw, yyiw
 
 if __name__ == "__main__":
 
@@ -273,10 +343,8 @@ if __name__ == "__main__":
     sep = "          -----------------             "
     sol = main("cups/XMSGP030A10.01-003 breast_cup_outer_S fiducial wire.STEP") # "XMSGP030A10.01-003 breast_cup_outer_S 214.STEP"
 
-    # backend = aocutils.display.defaults.backend
-    # display, start_display, add_menu, add_function_to_menu = OCC.Display.SimpleGui.init_display(backend)
-    # display_all(display, sol)
-    # start_display()
+    if "--display" in sys.argv:
+        DISPhelpers.show(sol, by_kind = False)
 
     #print_flags(sol)
 
@@ -284,22 +352,20 @@ if __name__ == "__main__":
     CADhelpers.print_all(sol, sep)
     print(sep)
 
-    the_faces = aocutils.topology.Topo(sol, return_iter=False).faces
+    index = shape_index.ShapeIndex(sol)
+    rings = set(index.select("Geom_Plane", 2)) # planar faces with two wires
+
+    the_faces = index.faces
     for i, face in enumerate(the_faces):
         s = OCC.BRep.BRep_Tool.Surface(face) # make surface from face, get back handle
         t = CADhelpers.get_surface(s)
         print("{0} {1} {2} {3}".format(i, type(face), type(s), t))
         if "Geom_Plane" in t:
-            the_wires = aocutils.topology.Topo(face, return_iter=False).wires
-            if len(the_wires) == 2:
-                wire0 = the_wires[0]
-                wire1 = the_wires[1]
-
-                edges0 = aocutils.topology.Topo(wire0, return_iter=False).edges
-                edges1 = aocutils.topology.Topo(wire1, return_iter=False).edges
+            if i in rings:
+                wire0, wire1 = index.wires_of_face(i)
 
-                e0 = edges0[0]
-                e1 = edges1[0]
+                e0 = index.edges[index.edges_of_wire(wire0)[0]]
+                e1 = index.edges[index.edges_of_wire(wire1)[0]]
 
                 c0, f0, l0 = OCC.BRep.BRep_Tool.Curve(e0)     # curve handle and first/last
                 if not ("Geom_Circle" in CADhelpers.get_curve(c0)):
@@ -336,35 +402,16 @@ if __name__ == "__main__":
             print("      {0} {1} {2} {3}".format(U1, U2, V1, V2))
 
             print(sep)
-            pts, outline = compute_bspline_midline(ss, Nv = 220)
+            t = time.perf_counter()
+            pts, outline, samples = compute_bspline_midline_progressive(ss, Nv = 220)
+            print("      midline in {0:.1f} ms, U samples per ring {1}..{2}, total {3}".format(1000.0*(time.perf_counter() - t),
+                  samples.min(), samples.max(), samples.sum()))
             if pts is None:
                 raise RuntimeError("Something wrong with ")
 
             distToOC = 101.0
 
-            xfc, yfc, zfc      = convert_fiducial(pts, origin = -distToOC)
-            xow, yow, xiw, yiw = convert_outline(outline, origin = -distToOC)
-
-            # for x, y, z in map(lambda x, y, z: (x,y,z), xfc, yfc, zfc):
-            #     print("        {0}    {1}    {2}".format(x, y, z))
-            # print(sep)
-            # for y, r in map(lambda x, y: (x,y), xow, yow):
-            #     print("        {0}    {1}".format(y, r))
-            # print(sep)
-            # for y, r in map(lambda x, y: (x,y), xiw, yiw):
-            #     print("        {0}    {1}".format(y, r))
-            # print(sep)
-
-            iw = [point2d(np.float32(x), np.float32(y)) for x, y in zip(xiw, yiw)]
-            iw = point2d.remove_dupes(iw, 0.5)
-
-            ow = [point2d(np.float32(x), np.float32(y)) for x, y in zip(xow, yow)]
-            ow = point2d.remove_dupes(ow, 0.5)
-
-            fc = list(zip(xfc, yfc, zfc))
-            fc = point3d.cvt2array(rdp(fc, 0.01))
-
-            write_OCP(8, 1, distToOC, iw, ow, fc)
+            write_fiducial(pts, outline, distToOC)
 
             # the_wires = aocutils.topology.Topo(face, return_iter=False).wires
 
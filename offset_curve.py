@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+r"""This module computes normal offsets of sampled (y, r) profiles with self-intersection trimming"""
+
+SWALLOW: float = 1.0e-3 # relative distance deficit at which offset point is dropped
+
+SHRINK: float = 0.9 # offset to original segment length ratio below which end points are checked
+
+PAIRS: int = 1 << 20 # candidate pairs per chunk of the box tests
+
+BIG_CELLS: int = 64 # boxes covering more grid cells are checked against all boxes
+
+
+def _cells(boxes, h: float, y0: float, r0: float):
+    """
+    Given boxes (ylo, yhi, rlo, rhi), cell size and grid origin,
+    returns (iy0, iy1, ir0, ir1) integer cell ranges covered by every box
+    """
+    ylo, yhi, rlo, rhi = boxes
+    return (np.floor((ylo - y0) / h).astype(np.int64), np.floor((yhi - y0) / h).astype(np.int64),
+            np.floor((rlo - r0) / h).astype(np.int64), np.floor((rhi - r0) / h).astype(np.int64))
+
+
+def _expand(cells, which):
+    """
+    Given cell ranges and indices of the boxes, returns (box, iy, ir) for every cell of every box
+    """
+    iy0, iy1, ir0, ir1 = (c[which] for c in cells)
+    ny = iy1 - iy0 + 1
+    nr = ir1 - ir0 + 1
+    n  = ny*nr
+
+    box = np.repeat(which, n)
+    k   = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    nrr = np.repeat(nr, n)
+    return (box, np.repeat(iy0, n) + k // nrr, np.repeat(ir0, n) + k % nrr)
+
+
+def box_pairs(a, b):
+    """
+    Given two sets of boxes as (ylo, yhi, rlo, rhi) arrays, yields (i, j) arrays
+    of pairs of overlapping boxes, in chunks of at most PAIRS candidates.
+
+    Boxes are binned on a uniform 2D grid with the cell of the typical box size of the
+    second set, pairs are taken from shared cells and counted once, in the lowest
+    shared cell. Boxes covering more than BIG_CELLS cells are checked against all boxes
+    """
+    na = len(a[0])
+    nb = len(b[0])
+    if na == 0 or nb == 0:
+        return
+
+    y0 = min(a[0].min(), b[0].min())
+    r0 = min(a[2].min(), b[2].min())
+    span = max(a[1].max(), b[1].max()) - y0 + max(a[3].max(), b[3].max()) - r0
+
+    h = float(np.median(np.maximum(b[1] - b[0], b[3] - b[2])))
+    h = max(h, 1.0e-9*span, 1.0e-300)
+
+    ca = _cells(a, h, y0, r0)
+    cb = _cells(b, h, y0, r0)
+
+    big_a = (ca[1] - ca[0] + 1)*(ca[3] - ca[2] + 1) > BIG_CELLS
+    big_b = (cb[1] - cb[0] + 1)*(cb[3] - cb[2] + 1) > BIG_CELLS
+
+    def overlap(i, j):
+        return (a[0][i] <= b[1][j]) & (b[0][j] <= a[1][i]) & (a[2][i] <= b[3][j]) & (b[2][j] <= a[3][i])
+
+    # big boxes against everything, then small ones against big ones of the other set
+    for i in np.flatnonzero(big_a).tolist():
+        j = np.arange(nb)
+        ok = overlap(np.full(nb, i), j)
+        yield (np.full(int(ok.sum()), i), j[ok])
+    small_a = np.flatnonzero(~big_a)
+    for j in np.flatnonzero(big_b).tolist():
+        ok = overlap(small_a, np.full(len(small_a), j))
+        yield (small_a[ok], np.full(int(ok.sum()), j))
+
+    # small against small via shared cells
+    ia, ya, ra = _expand(ca, small_a)
+    jb, yb, rb = _expand(cb, np.flatnonzero(~big_b))
+    if len(ia) == 0 or len(jb) == 0:
+        return
+
+    width = int(max(ra.max(), rb.max()) - min(ra.min(), rb.min())) + 1
+    rmin  = min(ra.min(), rb.min())
+    ka = ya*width + (ra - rmin)
+    kb = yb*width + (rb - rmin)
+
+    order = np.argsort(kb, kind="stable")
+    kb = kb[order]
+    jb = jb[order]
+
+    first = np.searchsorted(kb, ka, side="left")
+    count = np.searchsorted(kb, ka, side="right") - first
+    total = np.cumsum(count)
+
+    start = 0
+    while start < len(ka):
+        stop = int(np.searchsorted(total, (total[start-1] if start else 0) + PAIRS, side="right"))
+        stop = max(stop, start + 1)
+
+        c = count[start:stop]
+        e = np.repeat(np.arange(start, stop), c)
+        k = np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c) + np.repeat(first[start:stop], c)
+        i = ia[e]
+        j = jb[k]
+
+        # count the pair in the lowest cell both boxes share only
+        cy = ya[e]
+        cr = ra[e]
+        ok = (cy == np.maximum(ca[0][i], cb[0][j])) & (cr == np.maximum(ca[2][i], cb[2][j])) & overlap(i, j)
+        yield (i[ok], j[ok])
+
+        start = stop
+
+
+def _boxes(y, r, pad: float = 0.0):
+    """
+    Given polyline as (y, r) arrays, returns y and r bounds of its segments, padded
+    """
+    return (np.minimum(y[:-1], y[1:]) - pad, np.maximum(y[:-1], y[1:]) + pad,
+            np.minimum(r[:-1], r[1:]) - pad, np.maximum(r[:-1], r[1:]) + pad)
+
+
+def crossings(y, r):
+    """
+    Given polyline as (y, r) arrays, returns (i, j, t) arrays of all crossings
+    of segment i with non adjacent segment j > i + 1, t is the parameter along segment i.
+    Only segments with overlapping bounds are tested, a chunk of pairs at once
+    """
+    ay = y[:-1]
+    ar = r[:-1]
+    dy = y[1:] - ay
+    dr = r[1:] - ar
+
+    boxes = _boxes(y, r)
+
+    ii = [np.empty(0, dtype=np.int64)]
+    jj = [np.empty(0, dtype=np.int64)]
+    tt = [np.empty(0)]
+    for i, j in box_pairs(boxes, boxes):
+        ok = j > i + 1
+        i = i[ok]
+        j = j[ok]
+
+        den = dy[i]*dr[j] - dr[i]*dy[j]
+        ey  = ay[j] - ay[i]
+        er  = ar[j] - ar[i]
+        ok  = den != 0.0
+        den = np.where(ok, den, 1.0)
+        t   = (ey*dr[j] - er*dy[j]) / den
+        s   = (ey*dr[i] - er*dy[i]) / den
+
+        hit = ok & (t >= 0.0) & (t <= 1.0) & (s >= 0.0) & (s <= 1.0)
+        ii.append(i[hit])
+        jj.append(j[hit])
+        tt.append(t[hit])
+
+    return (np.concatenate(ii), np.concatenate(jj), np.concatenate(tt))
+
+
+def trim_loops(y, r):
+    """
+    Given polyline as (y, r) arrays, returns (y, r, src) with the loops cut off:
+    for the first crossing segment i the farthest crossing segment j is taken,
+    points in between are replaced by the crossing point, then search goes on after j.
+    src is index of the source point, -1 for the crossing points
+    """
+    src = np.arange(len(y))
+    i, j, t = crossings(y, r)
+    if len(i) == 0:
+        return (y, r, src)
+
+    order = np.lexsort((-j, i))
+    i = i[order]
+    j = j[order]
+    t = t[order]
+
+    ys = list()
+    rs = list()
+    ss = list()
+    k = 0
+    for a, b, s in zip(i.tolist(), j.tolist(), t.tolist()):
+        if a < k:
+            continue
+        ys.append(y[k:a+1])
+        rs.append(r[k:a+1])
+        ss.append(src[k:a+1])
+        ys.append([y[a] + s*(y[a+1] - y[a])])
+        rs.append([r[a] + s*(r[a+1] - r[a])])
+        ss.append([-1])
+        k = b + 1
+    ys.append(y[k:])
+    rs.append(r[k:])
+    ss.append(src[k:])
+
+    return (np.concatenate(ys), np.concatenate(rs), np.concatenate(ss))
+
+
+def closer_than(qy, qr, y, r, d: float):
+    """
+    Given probe points as (qy, qr) arrays, polyline as (y, r) arrays and distance,
+    returns boolean array, True for probes closer than d to the polyline.
+    Only segments which bounds padded by d contain the probe are measured
+    """
+    ay = y[:-1]
+    ar = r[:-1]
+    dy = y[1:] - ay
+    dr = r[1:] - ar
+    ll = dy*dy + dr*dr
+    ll = np.where(ll > 0.0, ll, 1.0)
+
+    rc = np.zeros(len(qy), dtype=bool)
+    for k, j in box_pairs((qy, qy, qr, qr), _boxes(y, r, d)):
+        py = qy[k] - ay[j]
+        pr = qr[k] - ar[j]
+        t  = np.clip((py*dy[j] + pr*dr[j]) / ll[j], 0.0, 1.0)
+        rc[k[np.hypot(py - t*dy[j], pr - t*dr[j]) < d]] = True
+    return rc
+
+
+class OffsetCurve(object):
+    """
+    Sampled (y, r) profile with unit normals, offset to any distance
+    without sampling the surfaces again.
+    Positive distance moves the profile away from the center
+    """
+
+    def __init__(self, y, r, ty, tr, center = (0.0, 0.0)):
+        """
+        Constructor. Build offset curve from points and tangents along the profile,
+        tangents are oriented along the point order, normals away from the center
+        """
+        self._y = np.asarray(y, dtype=np.float64)
+        self._r = np.asarray(r, dtype=np.float64)
+        if len(self._y) < 2:
+            raise ValueError("OffsetCurve: at least two points expected, got {0}".format(len(self._y)))
+
+        ty = np.asarray(ty, dtype=np.float64)
+        tr = np.asarray(tr, dtype=np.float64)
+
+        # orient tangents along the chords, pieces may go either way
+        cy = np.gradient(self._y)
+        cr = np.gradient(self._r)
+        sign = np.where(ty*cy + tr*cr < 0.0, -1.0, 1.0)
+
+        l  = np.hypot(ty, tr)
+        l  = np.where(l > 0.0, l, 1.0)
+        ny =  sign*tr / l
+        nr = -sign*ty / l
+
+        # single side for the whole profile
+        if np.sum(ny*(self._y - center[0]) + nr*(self._r - center[1])) < 0.0:
+            ny = -ny
+            nr = -nr
+
+        self._ny = ny
+        self._nr = nr
+
+    @classmethod
+    def from_points(cls, y, r, center = (0.0, 0.0)):
+        """
+        Given (y, r) arrays without derivatives, returns offset curve
+        with tangents estimated by central differences
+        """
+        y = np.asarray(y, dtype=np.float64)
+        r = np.asarray(r, dtype=np.float64)
+        order = 2 if len(y) > 2 else 1
+        return cls(y, r, np.gradient(y, edge_order=order), np.gradient(r, edge_order=order), center)
+
+    @property
+    def points(self):
+        """
+        returns: tuple
+            (y, r) arrays of the profile
+        """
+        return (self._y, self._r)
+
+    @property
+    def normals(self):
+        """
+        returns: tuple
+            (ny, nr) arrays of unit normals
+        """
+        return (self._ny, self._nr)
+
+    def offset(self, d: float, trim: bool = True):
+        """
+        Given distance, returns (y, r) arrays of the profile moved along the normals.
+        If trim is set, loops are cut off, ends which went backwards are dropped
+        and so are points which came closer than d to the profile
+        """
+        y = self._y + d*self._ny
+        r = self._r + d*self._nr
+        if not trim:
+            return (y, r)
+
+        # end segments reversed against the profile are swallowed by the offset
+        ly = np.diff(self._y)
+        lr = np.diff(self._r)
+        oy = np.diff(y)
+        orr = np.diff(r)
+        good = np.flatnonzero(oy*ly + orr*lr > 0.0)
+        if len(good) == 0:
+            return (y[:1], r[:1])
+
+        # points next to segments which shrank, d times curvature is not small there
+        shrunk = np.hypot(oy, orr) < SHRINK*np.hypot(ly, lr)
+        suspect = np.zeros(len(y), dtype=bool)
+        suspect[:-1] |= shrunk
+        suspect[1:]  |= shrunk
+
+        lo = good[0]
+        hi = good[-1] + 2
+        y, r, src = trim_loops(y[lo:hi], r[lo:hi])
+        suspect = np.where(src < 0, True, suspect[lo:][src])
+
+        # points swallowed at concave corners, where neighbour normals disagree
+        k = np.flatnonzero(suspect)
+        near = k[closer_than(y[k], r[k], self._y, self._r, abs(d)*(1.0 - SWALLOW))]
+        keep = np.ones(len(y), dtype=bool)
+        keep[near] = False
+        return (y[keep], r[keep])
+
+
+if __name__ == "__main__":
+
+    import time
+
+    # straight wall, fillet of radius 10 and straight top, offsets into the
+    # fillet center go beyond its radius of curvature and make loops
+    t = np.linspace(0.0, 0.5*np.pi, 100)
+    y = np.concatenate((np.linspace(-40.0, -10.0, 100)[:-1], -10.0 + 10.0*np.sin(t), np.zeros(99)))
+    r = np.concatenate((np.full(99, 60.0), 70.0 - 10.0*np.cos(t), np.linspace(70.0, 100.0, 100)[1:]))
+
+    curve = OffsetCurve.from_points(y, r, center=(-100.0, 0.0))
+    for d in (2.0, -2.0, -15.0):
+        oy, orr = curve.offset(d)
+        print("d {0:6.1f} points {1:4d} -> {2:4d}, closer than |d| {3}".format(d, len(y), len(oy), closer_than(oy, orr, y, r, abs(d)*(1.0 - SWALLOW)).sum()))
+
+    t0 = time.perf_counter()
+    for d in np.linspace(0.5, 5.0, 100):
+        curve.offset(d)
+    print("100 thicknesses {0:.2f} ms".format(1000.0*(time.perf_counter() - t0)))
+
+    t = np.linspace(-0.5*np.pi, 0.0, 100000)
+    curve = OffsetCurve(100.0*np.sin(t), 100.0*np.cos(t), np.cos(t), -np.sin(t))
+    t0 = time.perf_counter()
+    oy, orr = curve.offset(-2.0)
+    print("{0} points {1:.2f} ms".format(len(oy), 1000.0*(time.perf_counter() - t0)))
+
+    # flat run, all segments at the same y
+    for n in (2000, 16000, 100000):
+        r = np.linspace(0.0, 100.0, n)
+        curve = OffsetCurve.from_points(np.zeros(n), r)
+        t0 = time.perf_counter()
+        oy, orr = curve.offset(-2.0)
+        print("flat {0} points {1:.2f} ms, crossings {2}".format(n, 1000.0*(time.perf_counter() - t0), len(crossings(np.zeros(n), r)[0])))
@@ -1,6 +1,8 @@
 #%%
 import matplotlib.pyplot as plt
 
+import icp_io
+
 def readICP(fname):
     """
     read ICP file and return IC ow and iw
@@ -9,47 +11,9 @@ def readICP(fname):
     if fname is None:
         return None
 
-    with open(fname) as f:
-        # RU
-        line = f.readline().rstrip('\n')
-
-        # Outer cup
-        line = f.readline().rstrip('\n')
-
-        # Inner cup
-        line = f.readline().rstrip('\n')
-
-        # nof points in the inner wall
-        line = f.readline().rstrip('\n')
-        niw = int(line)
-
-        # inner wall
-        riw = list()
-        ziw = list()
-        for k in range(niw):
-            line = f.readline().rstrip('\n')
-            s = line.split(' ')
-            s = [x for x in s if x] # remove empty lines
-            ziw.append(float(s[0]))
-            riw.append(float(s[1]))
-
-        # nof points in the outer wall
-        line = f.readline().rstrip('\n')
-        now = int(line)
-
-        # outer wall
-        row = list()
-        zow = list()
-        for k in range(now):
-            line = f.readline().rstrip('\n')
-            s = line.split(' ')
-            s = [x for x in s if x] # remove empty lines
-            zow.append(float(s[0]))
-            row.append(float(s[1]))
-
-        return (ziw, riw, zow, row)
+    cup = icp_io.read(fname)
 
-    return None
+    return (cup.inner[:, 0], cup.inner[:, 1], cup.outer[:, 0], cup.outer[:, 1])
 
 #ziwO, riwO, zowO, rowO = readICP("D:/Ceres/Resource/PlanEngine/R8/Cup/R8O1IS01.icp")
 #ziwO, riwO, zowO, rowO = readICP("R8O1.ocp")
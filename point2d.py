@@ -1,18 +1,23 @@
 # -*- coding: utf-8 -*-
 
+import sys
 import math
 import numpy as np
 
+import dedupe
+
 from Idx import X, Y
 
 r"""This module implements 2D FP point"""
 
 class point2d(object):
     """
-    2D point made from two floats
+    2D point made from two floats, immutable and hashable unless made with mutable=True
     """
 
-    def __init__(self, x = np.float32(0.0), y = np.float32(0.0)):
+    __slots__ = ("_x", "_y", "_mutable")
+
+    def __init__(self, x = 0.0, y = 0.0, mutable: bool = False):
         """
         Constructor. Build point from x and y
 
@@ -23,10 +28,13 @@ class point2d(object):
             point X position
         y: float
             point Y position
+        mutable: bool
+            allow item assignment, such point is not hashable
         """
 
-        self._x = np.float32( x )
-        self._y = np.float32( y )
+        self._x = float(x)
+        self._y = float(y)
+        self._mutable = mutable
 
     @property
     def x(self):
@@ -73,37 +81,297 @@ class point2d(object):
 
     def __setitem__(self, i, value):
         """
-        Given the index i, set proper item to value
+        Given the index i, set proper item to value, mutable points only, use replace() otherwise
         """
-        if i < X:
-            raise IndexError("point2d::__setitem__: negative index {0}".format(i))
+        if not self._mutable:
+            raise TypeError("point2d::__setitem__: point is immutable, use replace({0}, value)".format(i))
         if i == X:
-            self._x = value
+            self._x = float(value)
             return
         if i == Y:
-            self._y = value
+            self._y = float(value)
             return
-        # beyond Y
-        raise IndexError("point2d::__setitem__: index too large {0}".format(i))
+        raise IndexError("point2d::__setitem__: bad index {0}".format(i))
+
+    def replace(self, i, value):
+        """
+        Given the index i, returns new point with item i set to value
+        """
+        if i == X:
+            return point2d(value, self._y)
+        if i == Y:
+            return point2d(self._x, value)
+        raise IndexError("point2d::replace: bad index {0}".format(i))
+
+    def __eq__(self, other):
+        """
+        Exact comparison with another point
+        """
+        if not isinstance(other, point2d):
+            return NotImplemented
+        return self._x == other._x and self._y == other._y
+
+    def __hash__(self):
+        """
+        returns: int
+            hash of the coordinates
+        """
+        if self._mutable:
+            raise TypeError("point2d::__hash__: mutable point is not hashable")
+        return hash((self._x, self._y))
+
+    def __add__(self, other):
+        """
+        returns: point2d
+            sum of two points/vectors
+        """
+        return point2d(self._x + other._x, self._y + other._y)
+
+    def __sub__(self, other):
+        """
+        returns: point2d
+            difference of two points/vectors
+        """
+        return point2d(self._x - other._x, self._y - other._y)
+
+    def __neg__(self):
+        """
+        returns: point2d
+            opposite vector
+        """
+        return point2d(-self._x, -self._y)
+
+    def __mul__(self, s):
+        """
+        returns: point2d
+            vector scaled by s
+        """
+        return point2d(self._x * s, self._y * s)
+
+    __rmul__ = __mul__
+
+    def scale(self, s):
+        """
+        returns: point2d
+            vector scaled by s
+        """
+        return point2d(self._x * s, self._y * s)
+
+    def dot(self, other) -> float:
+        """
+        returns: float
+            dot product
+        """
+        return self._x * other._x + self._y * other._y
+
+    def cross(self, other) -> float:
+        """
+        returns: float
+            Z component of the cross product
+        """
+        return self._x * other._y - self._y * other._x
+
+    def norm(self) -> float:
+        """
+        returns: float
+            vector length
+        """
+        return math.hypot(self._x, self._y)
+
+    def normalized(self):
+        """
+        returns: point2d
+            unit vector of the same direction
+        """
+        l = self.norm()
+        return point2d(self._x / l, self._y / l)
 
     @staticmethod
     def remove_dupes(pts, tol):
         """
-        Given list of points, remove duplicates
+        Given list of points, remove the ones which X is within tol
+        from the previous point
+        """
+        keep = dedupe.consecutive([pt.x for pt in pts], tol, previous=True)
+        return [pts[k] for k in keep.tolist()]
+
+
+class point2d_view(object):
+    """
+    Lightweight point2d look-alike, refers to a row of Points2D buffer
+    """
+
+    __slots__ = ("_a", "_k")
+
+    def __init__(self, a, k: int):
+        """
+        Constructor. Build view of row k of (n, 2) array a
         """
+        self._a = a
+        self._k = k
 
-        l = len(pts)
-        rc = []
-        pt_prev = pts[0]
-        rc.append(pt_prev)
-        for k in range(1, l):
-            pt = pts[k]
-            if math.fabs(pt_prev._x - pt._x) > tol:
-                rc.append(pt)
+    @property
+    def x(self):
+        """
+        returns: float
+            point X position
+        """
+        return self._a[self._k, X]
 
-            pt_prev = pt
+    @property
+    def y(self):
+        """
+        returns: float
+            point Y position
+        """
+        return self._a[self._k, Y]
+
+    def __str__(self):
+        """
+        returns: string
+            default string representation
+        """
+        return "({0}, {1})".format(self.x, self.y)
+
+    def __repr__(self):
+        """
+        returns: string
+            default representation
+        """
+        return "{0} {1}".format(self.x, self.y)
+
+    def __getitem__(self, i):
+        """
+        Given the index i, returns the proper item
+        """
+        if i < X or i > Y:
+            raise IndexError("point2d_view::__getitem__: bad index {0}".format(i))
+        return self._a[self._k, i]
+
+    def __setitem__(self, i, value):
+        """
+        Given the index i, set proper item to value in the buffer
+        """
+        if i < X or i > Y:
+            raise IndexError("point2d_view::__setitem__: bad index {0}".format(i))
+        self._a[self._k, i] = value
+
+
+class Points2D(object):
+    """
+    Array of 2D points kept in a single contiguous (n, 2) buffer
+    """
+
+    __slots__ = ("_a",)
+
+    def __init__(self, a = None, dtype = np.float32):
+        """
+        Constructor. Build points from (n, 2) array-like
+
+        Parameters
+        ----------
+
+        a: array-like
+            point coordinates, one point per row
+        dtype: numpy type
+            buffer type, float32 or float64 as point2d
+        """
+        if a is None:
+            a = np.empty((0, 2), dtype=dtype)
+        self._a = np.ascontiguousarray(a, dtype=dtype).reshape(-1, 2)
+
+    @classmethod
+    def from_xy(cls, x, y, dtype = np.float32):
+        """
+        Given X and Y sequences, returns points
+        """
+        return cls(np.stack((np.asarray(x, dtype=dtype), np.asarray(y, dtype=dtype)), axis=-1), dtype)
+
+    @classmethod
+    def from_points(cls, pts, dtype = np.float32):
+        """
+        Given list of point2d, returns points
+        """
+        return cls([(pt.x, pt.y) for pt in pts], dtype)
+
+    def to_points(self):
+        """
+        returns: list
+            list of point2d
+        """
+        return [point2d(x, y) for x, y in self._a.tolist()]
+
+    @property
+    def array(self):
+        """
+        returns: array
+            (n, 2) buffer, no copy
+        """
+        return self._a
+
+    @property
+    def x(self):
+        """
+        returns: array
+            X column view
+        """
+        return self._a[:, X]
+
+    @property
+    def y(self):
+        """
+        returns: array
+            Y column view
+        """
+        return self._a[:, Y]
+
+    def __len__(self):
+        """
+        returns: int
+            number of points
+        """
+        return len(self._a)
+
+    def __array__(self, dtype = None, copy = None):
+        """
+        numpy interop, returns the buffer
+        """
+        return self._a if dtype is None else self._a.astype(dtype)
+
+    def __getitem__(self, k):
+        """
+        Given integer index, returns point2d_view,
+        given slice, mask or index array, returns Points2D
+        """
+        if isinstance(k, (int, np.integer)):
+            if k < 0:
+                k += len(self._a)
+            if k < 0 or k >= len(self._a):
+                raise IndexError("Points2D::__getitem__: index out of range {0}".format(k))
+            return point2d_view(self._a, int(k))
+        return Points2D(self._a[k], self._a.dtype)
+
+    def __iter__(self):
+        """
+        Iterate over points as views
+        """
+        for k in range(len(self._a)):
+            yield point2d_view(self._a, k)
+
+    def __repr__(self):
+        """
+        returns: string
+            short representation
+        """
+        return "Points2D({0})".format(len(self._a))
+
+    def remove_dupes(self, tol):
+        """
+        Given tolerance, returns points without the ones which
+        X is within tol from the previous point, same as point2d.remove_dupes
+        """
+        return self[dedupe.consecutive(self._a, tol, columns=[X], previous=True)]
 
-        return rc
 
 if __name__ == "__main__":
 
@@ -112,4 +380,11 @@ if __name__ == "__main__":
     print("X = {0}".format(p.x))
     print("Y = {0}".format(p.y))
     print(str(p))
-    print(repr(p))
\ No newline at end of file
+    print(repr(p))
+
+    # memory per point, legacy object vs buffer row
+    n = 100000
+    pts = [point2d(float(k), float(k)) for k in range(n)]
+    obj = sys.getsizeof(pts[0]) + 2*sys.getsizeof(pts[0].x) + 8
+    arr = Points2D.from_points(pts)
+    print("point2d {0} bytes/point, Points2D {1} bytes/point".format(obj, arr.array.nbytes / n))
\ No newline at end of file
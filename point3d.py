@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import math
 import numpy as np
 
 from Idx import X, Y, Z
@@ -8,10 +9,12 @@ r"""This module implements 3D FP point"""
 
 class point3d(object):
     """
-    3D point made from three floats
+    3D point made from three floats, immutable and hashable unless made with mutable=True
     """
 
-    def __init__(self, x = np.float32(0.0), y = np.float32(0.0), z = np.float32(0.0)):
+    __slots__ = ("_x", "_y", "_z", "_mutable")
+
+    def __init__(self, x = 0.0, y = 0.0, z = 0.0, mutable: bool = False):
         """
         Constructor. Build point from x and y and z
 
@@ -24,11 +27,14 @@ class point3d(object):
             point Y position
         z: float
             point Z position
+        mutable: bool
+            allow item assignment, such point is not hashable
         """
 
-        self._x = np.float32( x )
-        self._y = np.float32( y )
-        self._z = np.float32( z )
+        self._x = float(x)
+        self._y = float(y)
+        self._z = float(z)
+        self._mutable = mutable
 
     @property
     def x(self):
@@ -59,10 +65,7 @@ class point3d(object):
         """
         Convert list of tuples into list of points
         """
-        rc = []
-        for t in tuples:
-            rc.append(point3d(np.float32(t[X]), np.float32(t[Y]), np.float32(t[Z])))
-        return rc
+        return [point3d(t[X], t[Y], t[Z]) for t in tuples]
 
     def __str__(self):
 
@@ -96,21 +99,304 @@ class point3d(object):
 
     def __setitem__(self, i, value):
         """
-        Given the index i, set proper item to value
+        Given the index i, set proper item to value, mutable points only, use replace() otherwise
         """
-        if i < X:
-            raise IndexError("point3d::__setitem__: negative index {0}".format(i))
+        if not self._mutable:
+            raise TypeError("point3d::__setitem__: point is immutable, use replace({0}, value)".format(i))
         if i == X:
-            self._x = value
+            self._x = float(value)
             return
         if i == Y:
-            self._y = value
+            self._y = float(value)
             return
         if i == Z:
-            self._z = value
+            self._z = float(value)
             return
-        # beyond Z
-        raise IndexError("point3d::__setitem__: index too large {0}".format(i))
+        raise IndexError("point3d::__setitem__: bad index {0}".format(i))
+
+    def replace(self, i, value):
+        """
+        Given the index i, returns new point with item i set to value
+        """
+        if i == X:
+            return point3d(value, self._y, self._z)
+        if i == Y:
+            return point3d(self._x, value, self._z)
+        if i == Z:
+            return point3d(self._x, self._y, value)
+        raise IndexError("point3d::replace: bad index {0}".format(i))
+
+    def __eq__(self, other):
+        """
+        Exact comparison with another point
+        """
+        if not isinstance(other, point3d):
+            return NotImplemented
+        return self._x == other._x and self._y == other._y and self._z == other._z
+
+    def __hash__(self):
+        """
+        returns: int
+            hash of the coordinates
+        """
+        if self._mutable:
+            raise TypeError("point3d::__hash__: mutable point is not hashable")
+        return hash((self._x, self._y, self._z))
+
+    def __add__(self, other):
+        """
+        returns: point3d
+            sum of two points/vectors
+        """
+        return point3d(self._x + other._x, self._y + other._y, self._z + other._z)
+
+    def __sub__(self, other):
+        """
+        returns: point3d
+            difference of two points/vectors
+        """
+        return point3d(self._x - other._x, self._y - other._y, self._z - other._z)
+
+    def __neg__(self):
+        """
+        returns: point3d
+            opposite vector
+        """
+        return point3d(-self._x, -self._y, -self._z)
+
+    def __mul__(self, s):
+        """
+        returns: point3d
+            vector scaled by s
+        """
+        return point3d(self._x * s, self._y * s, self._z * s)
+
+    __rmul__ = __mul__
+
+    def scale(self, s):
+        """
+        returns: point3d
+            vector scaled by s
+        """
+        return point3d(self._x * s, self._y * s, self._z * s)
+
+    def dot(self, other) -> float:
+        """
+        returns: float
+            dot product
+        """
+        return self._x * other._x + self._y * other._y + self._z * other._z
+
+    def cross(self, other):
+        """
+        returns: point3d
+            cross product
+        """
+        return point3d(self._y * other._z - self._z * other._y,
+                       self._z * other._x - self._x * other._z,
+                       self._x * other._y - self._y * other._x)
+
+    def norm(self) -> float:
+        """
+        returns: float
+            vector length
+        """
+        return math.sqrt(self._x * self._x + self._y * self._y + self._z * self._z)
+
+    def normalized(self):
+        """
+        returns: point3d
+            unit vector of the same direction
+        """
+        l = self.norm()
+        return point3d(self._x / l, self._y / l, self._z / l)
+
+
+class point3d_view(object):
+    """
+    Lightweight point3d look-alike, refers to a row of Points3D buffer
+    """
+
+    __slots__ = ("_a", "_k")
+
+    def __init__(self, a, k: int):
+        """
+        Constructor. Build view of row k of (n, 3) array a
+        """
+        self._a = a
+        self._k = k
+
+    @property
+    def x(self):
+        """
+        returns: float
+            point X position
+        """
+        return self._a[self._k, X]
+
+    @property
+    def y(self):
+        """
+        returns: float
+            point Y position
+        """
+        return self._a[self._k, Y]
+
+    @property
+    def z(self):
+        """
+        returns: float
+            point Z position
+        """
+        return self._a[self._k, Z]
+
+    def __str__(self):
+        """
+        returns: string
+            default string representation
+        """
+        return "({0}, {1}, {2})".format(self.x, self.y, self.z)
+
+    def __repr__(self):
+        """
+        returns: string
+            default representation
+        """
+        return "{0} {1} {2}".format(self.x, self.y, self.z)
+
+    def __getitem__(self, i):
+        """
+        Given the index i, returns the proper item
+        """
+        if i < X or i > Z:
+            raise IndexError("point3d_view::__getitem__: bad index {0}".format(i))
+        return self._a[self._k, i]
+
+    def __setitem__(self, i, value):
+        """
+        Given the index i, set proper item to value in the buffer
+        """
+        if i < X or i > Z:
+            raise IndexError("point3d_view::__setitem__: bad index {0}".format(i))
+        self._a[self._k, i] = value
+
+
+class Points3D(object):
+    """
+    Array of 3D points kept in a single contiguous (n, 3) buffer
+    """
+
+    __slots__ = ("_a",)
+
+    def __init__(self, a = None, dtype = np.float32):
+        """
+        Constructor. Build points from (n, 3) array-like
+
+        Parameters
+        ----------
+
+        a: array-like
+            point coordinates, one point per row
+        dtype: numpy type
+            buffer type, float32 or float64 as point3d
+        """
+        if a is None:
+            a = np.empty((0, 3), dtype=dtype)
+        self._a = np.ascontiguousarray(a, dtype=dtype).reshape(-1, 3)
+
+    @classmethod
+    def from_xyz(cls, x, y, z, dtype = np.float32):
+        """
+        Given X, Y and Z sequences, returns points
+        """
+        return cls(np.stack((np.asarray(x, dtype=dtype), np.asarray(y, dtype=dtype), np.asarray(z, dtype=dtype)), axis=-1), dtype)
+
+    @classmethod
+    def from_points(cls, pts, dtype = np.float32):
+        """
+        Given list of point3d, returns points
+        """
+        return cls([(pt.x, pt.y, pt.z) for pt in pts], dtype)
+
+    def to_points(self):
+        """
+        returns: list
+            list of point3d
+        """
+        return [point3d(x, y, z) for x, y, z in self._a.tolist()]
+
+    @property
+    def array(self):
+        """
+        returns: array
+            (n, 3) buffer, no copy
+        """
+        return self._a
+
+    @property
+    def x(self):
+        """
+        returns: array
+            X column view
+        """
+        return self._a[:, X]
+
+    @property
+    def y(self):
+        """
+        returns: array
+            Y column view
+        """
+        return self._a[:, Y]
+
+    @property
+    def z(self):
+        """
+        returns: array
+            Z column view
+        """
+        return self._a[:, Z]
+
+    def __len__(self):
+        """
+        returns: int
+            number of points
+        """
+        return len(self._a)
+
+    def __array__(self, dtype = None, copy = None):
+        """
+        numpy interop, returns the buffer
+        """
+        return self._a if dtype is None else self._a.astype(dtype)
+
+    def __getitem__(self, k):
+        """
+        Given integer index, returns point3d_view,
+        given slice, mask or index array, returns Points3D
+        """
+        if isinstance(k, (int, np.integer)):
+            if k < 0:
+                k += len(self._a)
+            if k < 0 or k >= len(self._a):
+                raise IndexError("Points3D::__getitem__: index out of range {0}".format(k))
+            return point3d_view(self._a, int(k))
+        return Points3D(self._a[k], self._a.dtype)
+
+    def __iter__(self):
+        """
+        Iterate over points as views
+        """
+        for k in range(len(self._a)):
+            yield point3d_view(self._a, k)
+
+    def __repr__(self):
+        """
+        returns: string
+            short representation
+        """
+        return "Points3D({0})".format(len(self._a))
+
 
 if __name__ == "__main__":
 
@@ -125,3 +411,6 @@ if __name__ == "__main__":
     print(p[0])
     print(p[1])
     print(p[2])
+
+    pts = Points3D.from_xyz([1.0, 2.0], [3.0, 4.0], [5.0, 6.0])
+    print(pts[1], pts.z, len(pts))
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from collections import defaultdict
+
+import OCC.Bnd
+import OCC.BRep
+import OCC.BRepBndLib
+import OCC.TopAbs
+import OCC.TopoDS
+import OCC.TopTools
+
+import CADhelpers
+
+r"""This module implements face/wire/edge index of a shape, built in one traversal"""
+
+NONE  = -1 # kind code for null curve or unknown kind
+MIXED = -2 # wire kind code when its edges are of different kinds
+
+# shape types we keep, from the top down to the edges
+_levels = {OCC.TopAbs.TopAbs_SOLID: "solids",
+           OCC.TopAbs.TopAbs_SHELL: "shells",
+           OCC.TopAbs.TopAbs_FACE:  "faces",
+           OCC.TopAbs.TopAbs_WIRE:  "wires",
+           OCC.TopAbs.TopAbs_EDGE:  "edges"}
+
+
+def surface_code(kind: str) -> int:
+    """
+    Given surface kind, returns its code, index in CADhelpers.surfaces
+    """
+    return CADhelpers.surfaces.index(kind) if kind in CADhelpers.surfaces else NONE
+
+
+def curve_code(kind: str) -> int:
+    """
+    Given curve kind, returns its code, index in CADhelpers.curves
+    """
+    return CADhelpers.curves.index(kind) if kind in CADhelpers.curves else NONE
+
+
+def _bbox(shape):
+    """
+    Given shape, returns its bounding box as (xmin, ymin, zmin, xmax, ymax, zmax)
+    """
+    box = OCC.Bnd.Bnd_Box()
+    OCC.BRepBndLib.brepbndlib_Add(shape, box)
+    if box.IsVoid():
+        return (np.nan,)*6
+    return box.Get()
+
+
+def _csr(children, n: int):
+    """
+    Given dict parent -> list of children and number of parents,
+    returns (offsets, indices) arrays of the compressed adjacency
+    """
+    counts  = np.array([len(children.get(k, ())) for k in range(n)], dtype=np.int64)
+    offsets = np.zeros(n+1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    indices = np.array([c for k in range(n) for c in children.get(k, ())], dtype=np.int64)
+    return (offsets, indices)
+
+
+class ShapeIndex(object):
+    """
+    Solids, shells, faces, wires and edges of a shape with parent-child
+    adjacency, surface/curve kind codes and bounding boxes
+    """
+
+    def __init__(self, shape):
+        """
+        Constructor. Build index in a single top-down traversal,
+        shared sub-shapes are visited once
+        """
+        self._maps     = {name: OCC.TopTools.TopTools_IndexedMapOfShape() for name in _levels.values()}
+        self._shapes   = {name: list() for name in _levels.values()}
+        self._children = {name: defaultdict(list) for name in _levels.values()}
+
+        self._walk(shape, None, None)
+
+        self.solids = self._shapes["solids"]
+        self.shells = self._shapes["shells"]
+        self.faces  = self._shapes["faces"]
+        self.wires  = self._shapes["wires"]
+        self.edges  = self._shapes["edges"]
+
+        self.shell_faces = _csr(self._children["shells"], len(self.shells))
+        self.face_wires  = _csr(self._children["faces"],  len(self.faces))
+        self.wire_edges  = _csr(self._children["wires"],  len(self.wires))
+
+        self.wire_faces = self._parents(self.face_wires, len(self.wires))
+        self.edge_wires = self._parents(self.wire_edges, len(self.edges))
+
+        # kinds
+        self.face_kind = np.array([surface_code(CADhelpers.get_surface(OCC.BRep.BRep_Tool.Surface(f))) for f in self.faces], dtype=np.int8)
+        self.edge_kind = np.array([self._edge_code(e) for e in self.edges], dtype=np.int8)
+        self.wire_kind = np.array([self._wire_code(k) for k in range(len(self.wires))], dtype=np.int8)
+
+        # boxes
+        self.face_bbox = np.array([_bbox(f) for f in self.faces], dtype=np.float64).reshape(-1, 6)
+        self.edge_bbox = np.array([_bbox(e) for e in self.edges], dtype=np.float64).reshape(-1, 6)
+
+        # face signature (kind, number of wires, common wire kind) -> faces
+        self._by_kind = defaultdict(list)
+        self._by_sign = defaultdict(list)
+        for k in range(len(self.faces)):
+            self._by_kind[int(self.face_kind[k])].append(k)
+            self._by_sign[self.face_signature(k)].append(k)
+
+    def _walk(self, shape, parent_level, parent) -> None:
+        """
+        Register shape and descend into its children which were not seen before
+        """
+        level = _levels.get(shape.ShapeType())
+        if level is not None:
+            m = self._maps[level]
+            k = m.FindIndex(shape) - 1
+            fresh = k < 0
+            if fresh:
+                k = m.Add(shape) - 1
+                self._shapes[level].append(CADhelpers.factory_shapes(shape))
+            if parent_level is not None:
+                self._children[parent_level][parent].append(k)
+            if not fresh or level == "edges":
+                return
+            parent_level, parent = level, k
+
+        it = OCC.TopoDS.TopoDS_Iterator(shape)
+        while it.More():
+            self._walk(it.Value(), parent_level, parent)
+            it.Next()
+
+    @staticmethod
+    def _parents(csr, n: int):
+        """
+        Given (offsets, indices) adjacency, returns the reversed one for n children
+        """
+        offsets, indices = csr
+        owner = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        order = np.argsort(indices, kind="stable")
+        counts = np.bincount(indices, minlength=n)
+        roff = np.zeros(n+1, dtype=np.int64)
+        np.cumsum(counts, out=roff[1:])
+        return (roff, owner[order])
+
+    @staticmethod
+    def _edge_code(edge) -> int:
+        """
+        Given edge, returns code of its 3D curve
+        """
+        c, first, last = OCC.BRep.BRep_Tool.Curve(edge)
+        if c.IsNull():
+            return NONE
+        return curve_code(CADhelpers.get_curve(c))
+
+    def _wire_code(self, k: int) -> int:
+        """
+        Given wire index, returns common kind code of its edges or MIXED
+        """
+        codes = set(self.edge_kind[self.edges_of_wire(k)].tolist())
+        if len(codes) == 1:
+            return codes.pop()
+        return MIXED if codes else NONE
+
+    @staticmethod
+    def _slice(csr, k: int):
+        """
+        Given (offsets, indices) adjacency, returns children of k
+        """
+        offsets, indices = csr
+        return indices[offsets[k]:offsets[k+1]]
+
+    def wires_of_face(self, k: int):
+        """
+        Given face index, returns indices of its wires
+        """
+        return self._slice(self.face_wires, k)
+
+    def edges_of_wire(self, k: int):
+        """
+        Given wire index, returns indices of its edges
+        """
+        return self._slice(self.wire_edges, k)
+
+    def faces_of_wire(self, k: int):
+        """
+        Given wire index, returns indices of faces it bounds
+        """
+        return self._slice(self.wire_faces, k)
+
+    def wires_of_edge(self, k: int):
+        """
+        Given edge index, returns indices of wires containing it
+        """
+        return self._slice(self.edge_wires, k)
+
+    def face_signature(self, k: int):
+        """
+        Given face index, returns (face kind, number of wires, common wire kind)
+        """
+        wk = set(self.wire_kind[self.wires_of_face(k)].tolist())
+        return (int(self.face_kind[k]), len(self.wires_of_face(k)), wk.pop() if len(wk) == 1 else MIXED)
+
+    def faces_of_kind(self, kind: str):
+        """
+        Given surface kind, returns indices of the faces of this kind
+        """
+        return self._by_kind.get(surface_code(kind), [])
+
+    def select(self, kind: str, nwires: int = None, edge_kind: str = None):
+        """
+        Given surface kind, optional number of wires and optional curve kind
+        all the wire edges must be of, returns indices of matching faces,
+        e.g. select("Geom_Plane", 2, "Geom_Circle")
+        """
+        if nwires is not None and edge_kind is not None:
+            return self._by_sign.get((surface_code(kind), nwires, curve_code(edge_kind)), [])
+
+        rc = self.faces_of_kind(kind)
+        if nwires is not None:
+            rc = [k for k in rc if len(self.wires_of_face(k)) == nwires]
+        if edge_kind is not None:
+            c = curve_code(edge_kind)
+            rc = [k for k in rc if self.face_signature(k)[2] == c]
+        return rc
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+import math
+import heapq
+import numpy as np
+
+r"""This module simplifies 2D/3D polylines with bounded deviation, returning kept indices"""
+
+RDP:         str = "rdp"         # Ramer-Douglas-Peucker
+VISVALINGAM: str = "visvalingam" # Visvalingam-Whyatt, smallest area first
+
+
+def segment_distance(p, a, b) -> np.ndarray:
+    """
+    Given (n, d) points and segment end points a and b,
+    returns distances from the points to the segment
+    """
+    ab = b - a
+    l2 = np.dot(ab, ab)
+    ap = p - a
+    if l2 == 0.0:
+        return np.linalg.norm(ap, axis=-1)
+    t = np.clip(np.dot(ap, ab) / l2, 0.0, 1.0)
+    return np.linalg.norm(ap - t[:, None]*ab, axis=-1)
+
+
+def _as_array(pts) -> np.ndarray:
+    """
+    Given array-like or Points2D/Points3D, returns (n, d) float64 array
+    """
+    return np.asarray(pts, dtype=np.float64).reshape(len(pts), -1)
+
+
+def _span_distance2(a, points, starts, ends) -> np.ndarray:
+    """
+    Given (n, d) points, indices of the points to measure and
+    start/end indices of their spans, returns squared distances to the span segments
+    """
+    pa = a.take(starts, axis=0)
+    ab = a.take(ends, axis=0)
+    ab -= pa
+    ap = a.take(points, axis=0)
+    ap -= pa
+    l2 = np.einsum("ij,ij->i", ab, ab)
+    t  = np.einsum("ij,ij->i", ap, ab)
+    t  = np.clip(np.divide(t, l2, out=np.zeros_like(t), where=l2 > 0.0), 0.0, 1.0)
+    ap -= t[:, None]*ab
+    return np.einsum("ij,ij->i", ap, ap)
+
+
+def rdp(pts, eps: float) -> np.ndarray:
+    """
+    Given polyline and tolerance, returns sorted indices of the points kept by
+    Ramer-Douglas-Peucker, every dropped point is within eps from the simplified polyline.
+
+    Iterative and level synchronous: all spans of a level are split in one pass over the points
+    """
+    a = _as_array(pts)
+    n = len(a)
+    if n < 3:
+        return np.arange(n, dtype=np.int64)
+
+    keep = np.zeros(n, dtype=np.bool_)
+    keep[0] = keep[-1] = True
+
+    eps2 = eps*eps
+    live = np.arange(1, n-1) # points of the spans which may still be split, never kept ones
+    while len(live) > 0:
+        kept = np.flatnonzero(keep)
+        span = np.searchsorted(kept, live, side="right") - 1
+
+        d = _span_distance2(a, live, kept.take(span), kept.take(span+1))
+
+        # max over each span, live points are sorted so spans are contiguous
+        starts = np.flatnonzero(np.r_[True, span[1:] != span[:-1]])
+        dmax = np.maximum.reduceat(d, starts)
+        split = dmax > eps2
+        if not split.any():
+            break
+
+        # first point with the max distance in every span to split
+        counts = np.diff(np.r_[starts, len(live)])
+        dspan  = np.repeat(dmax, counts)
+        sspan  = np.repeat(split, counts)
+        hit = np.flatnonzero((d == dspan) & sspan)
+        _, first = np.unique(span[hit], return_index=True)
+        keep[live[hit[first]]] = True
+
+        live = live[sspan & ~keep[live]]
+
+    return np.flatnonzero(keep)
+
+
+def _area(a, i: int, j: int, k: int) -> float:
+    """
+    Area of the triangle made from points i, j and k of the list of 3D coordinates
+    """
+    (px, py, pz), (qx, qy, qz), (rx, ry, rz) = a[i], a[j], a[k]
+    ux, uy, uz = qx - px, qy - py, qz - pz
+    vx, vy, vz = rx - px, ry - py, rz - pz
+    return 0.5*math.sqrt((uy*vz - uz*vy)**2 + (uz*vx - ux*vz)**2 + (ux*vy - uy*vx)**2)
+
+
+def _areas(a) -> np.ndarray:
+    """
+    Given (n, 3) points, returns areas of the triangles made from every point and its neighbours
+    """
+    return 0.5*np.linalg.norm(np.cross(a[1:-1] - a[:-2], a[2:] - a[:-2]), axis=-1)
+
+
+def _point_distance(a, k: int, i: int, j: int) -> float:
+    """
+    Distance from point k to the segment between points i and j of the list of 3D coordinates
+    """
+    (px, py, pz), (qx, qy, qz), (rx, ry, rz) = a[i], a[j], a[k]
+    bx, by, bz = qx - px, qy - py, qz - pz
+    cx, cy, cz = rx - px, ry - py, rz - pz
+    l2 = bx*bx + by*by + bz*bz
+    t  = min(max((cx*bx + cy*by + cz*bz) / l2, 0.0), 1.0) if l2 > 0.0 else 0.0
+    return math.sqrt((cx - t*bx)**2 + (cy - t*by)**2 + (cz - t*bz)**2)
+
+
+def visvalingam(pts, eps: float) -> np.ndarray:
+    """
+    Given 2D or 3D polyline and tolerance, returns sorted indices of the points kept by
+    Visvalingam-Whyatt. Points are removed smallest effective area first, but only
+    while all original points of the merged span stay within eps from the new segment.
+
+    Every span keeps a bound of its deviation, merged span is bounded by the larger of
+    the two plus the distance of the removed point to the new segment. Original points
+    are measured only when the bound exceeds eps. Heap driven, loops in Python,
+    an order of magnitude slower than rdp, which is the one for large midlines
+    """
+    a = _as_array(pts)
+    n = len(a)
+    if n < 3:
+        return np.arange(n, dtype=np.int64)
+
+    a3    = np.zeros((n, 3))
+    a3[:, :a.shape[1]] = a # 2D points lie in z = 0
+    xs    = a3.tolist()
+    prev  = list(range(-1, n-1))
+    nxt   = list(range(1, n+1))
+    alive = [True]*n
+    stamp = [0]*n   # bumped when area of the point changes
+    dev   = [0.0]*n # deviation bound of the span ending at the point
+
+    heap = list(zip(_areas(a3).tolist(), [0]*(n-2), range(1, n-1)))
+    heapq.heapify(heap)
+
+    while heap:
+        area, s, k = heapq.heappop(heap)
+        if not alive[k] or s != stamp[k]:
+            continue
+
+        i, j = prev[k], nxt[k]
+        d = max(dev[k], dev[j]) + _point_distance(xs, k, i, j)
+        if d > eps:
+            d = float(segment_distance(a[i+1:j], a[i], a[j]).max())
+            if d > eps:
+                continue # point stays, its area entry is gone
+
+        alive[k] = False
+        nxt[i]  = j
+        prev[j] = i
+        dev[j]  = d
+        for m in (i, j):
+            if 0 < m < n-1:
+                stamp[m] += 1
+                heapq.heappush(heap, (max(_area(xs, prev[m], m, nxt[m]), area), stamp[m], m))
+
+    return np.flatnonzero(alive)
+
+
+def deviation(pts, keep) -> float:
+    """
+    Given polyline and sorted kept indices, returns max distance
+    from the original points to the simplified polyline
+    """
+    a = _as_array(pts)
+    keep = np.asarray(keep)
+    rc = 0.0
+    for i, j in zip(keep[:-1].tolist(), keep[1:].tolist()):
+        if j - i > 1:
+            rc = max(rc, float(segment_distance(a[i+1:j], a[i], a[j]).max()))
+    return rc
+
+
+def simplify(pts, eps: float, method: str = RDP):
+    """
+    Given polyline, tolerance and method, returns (kept indices, max deviation)
+    """
+    if method == RDP:
+        keep = rdp(pts, eps)
+    elif method == VISVALINGAM:
+        keep = visvalingam(pts, eps)
+    else:
+        raise ValueError("simplify::simplify: unknown method {0}".format(method))
+
+    return (keep, deviation(pts, keep))
+
+
+if __name__ == "__main__":
+
+    import time
+
+    # helix-like midline
+    t = np.linspace(0.0, 20.0*np.pi, 100000)
+    pts = np.stack((30.0*np.cos(t), t, 30.0*np.sin(t)), axis=-1)
+
+    for method, f in ((RDP, rdp), (VISVALINGAM, visvalingam)):
+        t0 = time.perf_counter()
+        keep = f(pts, 0.01)
+        t0 = time.perf_counter() - t0
+        print("{0:12s} {1:6d} of {2} points, max deviation {3:.5f}, {4:.1f} ms".format(method, len(keep), len(pts), deviation(pts, keep), 1000.0*t0))
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import hashlib
+import logging
+
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # not POSIX, index is updated without lock
+    fcntl = None
+
+import OCC.BRep
+import OCC.BRepTools
+import OCC.TopoDS
+
+import aocxchange.step
+
+r"""This module implements on-disk cache of the parsed STEP files, keyed by file content"""
+
+logger = logging.getLogger(__name__)
+
+MAX_BYTES: int = 512*1024*1024 # default cache size limit
+
+CHUNK: int = 1024*1024 # read size for hashing
+
+
+def _brep_io():
+    """
+    Returns (extension, write, read) for the native shape format,
+    binary BinTools if this OCC build exposes it, text BRepTools otherwise
+    """
+    try:
+        from OCC import BinTools
+        w = getattr(BinTools, "bintools_Write", None)
+        r = getattr(BinTools, "bintools_Read",  None)
+        if w is not None and r is not None:
+            return (".bbrep", w, r)
+    except ImportError:
+        pass
+
+    def read(shape, fname):
+        return OCC.BRepTools.breptools_Read(shape, fname, OCC.BRep.BRep_Builder())
+
+    return (".brep", OCC.BRepTools.breptools_Write, read)
+
+
+def file_hash(fname: str) -> str:
+    """
+    Given the file name, returns SHA-256 hex digest of its content
+    """
+    h = hashlib.sha256()
+    with open(fname, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class StepCache(object):
+    """
+    Cache of shapes read from STEP files, stored in OCC native format,
+    with size bounded LRU eviction
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = MAX_BYTES):
+        """
+        Constructor. Build cache in the cache_dir, by default .step_cache
+        next to this module or FIDUCIAL_STEP_CACHE from the environment
+
+        Parameters
+        ----------
+
+        cache_dir: str
+            where cached shapes and index live
+        max_bytes: int
+            total size of cached shapes to keep
+        """
+        if cache_dir is None:
+            cache_dir = os.environ.get("FIDUCIAL_STEP_CACHE",
+                                       os.path.join(os.path.dirname(os.path.abspath(__file__)), ".step_cache"))
+
+        self._dir       = cache_dir
+        self._max_bytes = max_bytes
+        self._ext, self._write, self._read = _brep_io()
+
+        self._hits        = 0
+        self._misses      = 0
+        self._bytes_saved = 0
+
+        os.makedirs(self._dir, exist_ok=True)
+
+    @property
+    def stats(self):
+        """
+        returns: dict
+            hits, misses and STEP bytes which were not parsed thanks to the cache
+        """
+        return {"hits": self._hits, "misses": self._misses, "bytes_saved": self._bytes_saved}
+
+    def _index_name(self) -> str:
+        return os.path.join(self._dir, "index.json")
+
+    @contextmanager
+    def _locked(self):
+        """
+        Hold exclusive lock on index.lock while the index is read, changed and written,
+        batch workers share the cache
+        """
+        with open(os.path.join(self._dir, "index.lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _load_index(self):
+        """
+        Read the index, empty one if missing or broken
+        """
+        try:
+            with open(self._index_name(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index) -> None:
+        """
+        Write the index atomically
+        """
+        tmp = self._index_name() + ".{0}.tmp".format(os.getpid())
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, self._index_name())
+
+    def _evict(self, index) -> None:
+        """
+        Drop least recently used entries until the cache fits into max_bytes
+        """
+        total = sum(e["size"] for e in index.values())
+        for key in sorted(index, key=lambda k: index[k]["used"]):
+            if total <= self._max_bytes:
+                break
+            for name in index[key]["files"]:
+                try:
+                    os.remove(os.path.join(self._dir, name))
+                except OSError:
+                    pass
+            total -= index[key]["size"]
+            del index[key]
+            logger.debug("evicted {0}".format(key))
+
+    def _lookup(self, entry):
+        """
+        Given the index entry, read back the cached shapes, None if any file is gone
+        """
+        shapes = list()
+        for name in entry["files"]:
+            shape = OCC.TopoDS.TopoDS_Shape()
+            fname = os.path.join(self._dir, name)
+            if not os.path.isfile(fname) or not self._read(shape, fname) or shape.IsNull():
+                return None
+            shapes.append(shape)
+        return shapes
+
+    def shapes(self, fname: str):
+        """
+        Given the STEP file name, returns list of its shapes,
+        from the cache if the same content was read before
+        """
+        key = file_hash(fname)
+        step_size = os.path.getsize(fname)
+
+        with self._locked():
+            entry = self._load_index().get(key)
+
+        if entry is not None:
+            shapes = self._lookup(entry)
+            if shapes is not None:
+                self._hits += 1
+                self._bytes_saved += step_size
+                with self._locked():
+                    index = self._load_index()
+                    if key in index:
+                        index[key]["used"] = time.time()
+                        self._save_index(index)
+                logger.debug("cache hit {0} for {1}".format(key, fname))
+                return shapes
+
+        self._misses += 1
+        shapes = aocxchange.step.StepImporter(fname).shapes
+
+        files = list()
+        size  = 0
+        try:
+            for k, shape in enumerate(shapes):
+                name = "{0}.{1}{2}".format(key, k, self._ext)
+                path = os.path.join(self._dir, name)
+                tmp  = path + ".{0}.tmp".format(os.getpid())
+                files.append(os.path.basename(tmp))
+                if not self._write(shape, tmp):
+                    logger.warning("cannot cache shape {0} of {1}".format(k, fname))
+                    break
+                size += os.path.getsize(tmp)
+                if size > self._max_bytes:
+                    logger.debug("{0} does not fit into the cache".format(fname))
+                    break
+                os.replace(tmp, path)
+                files[-1] = name
+            else:
+                with self._locked():
+                    index = self._load_index()
+                    index[key] = {"files": files, "size": size, "step": os.path.basename(fname), "used": time.time()}
+                    self._evict(index)
+                    self._save_index(index)
+                files = None
+        finally:
+            if files is not None:
+                self._discard(key, files)
+
+        return shapes
+
+    def _discard(self, key: str, files) -> None:
+        """
+        Remove files of the entry which did not make it into the index,
+        unless another process has indexed the same content meanwhile
+        """
+        with self._locked():
+            if key in self._load_index():
+                files = [name for name in files if name.endswith(".tmp")]
+            for name in files:
+                try:
+                    os.remove(os.path.join(self._dir, name))
+                except OSError:
+                    pass
+
+
+_default = None
+
+
+def read_step(fname: str):
+    """
+    Given the STEP file name, returns list of its shapes via the default cache
+    """
+    global _default
+    if _default is None:
+        _default = StepCache()
+    return _default.shapes(fname)
+
+
+def stats():
+    """
+    returns: dict
+        statistics of the default cache
+    """
+    if _default is None:
+        return {"hits": 0, "misses": 0, "bytes_saved": 0}
+    return _default.stats
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+import json
+import zipfile
+import numpy as np
+
+import frames
+
+r"""This module dumps sampled faces of a shape into one .npz container with per-face metadata.
+Readers do not need OCC, samplers are imported by the writers only"""
+
+INDEX: str = "index" # member with JSON list of face records
+
+
+def _member(i: int, what: str) -> str:
+    """
+    Given face index and array name, returns zip member name
+    """
+    return "face_{0}_{1}".format(i, what)
+
+
+class SurfaceArchive(object):
+    """
+    Writes sampled faces into single .npz file, each face array is its own
+    zip member written as soon as the face is added, so any face can be loaded
+    alone with np.load. Index with kind, bounds, tag, face index and frame goes last,
+    it is written on close even if the writer failed, with the faces added so far
+    """
+
+    def __init__(self, fname: str, compress: bool = True, Nu: int = 40, Nv: int = 40,
+                 frame: frames.Transform = frames.GNUPLOT):
+        """
+        Constructor. Open the container for writing
+
+        Parameters
+        ----------
+
+        fname: str
+            container name, .npz
+        compress: bool
+            deflate the members
+        Nu, Nv: int
+            default grid size
+        frame: Transform
+            applied to positions, (X, Z, Y) as in gnuplot dumps by default
+        """
+        self._fname = fname
+        self._Nu = Nu
+        self._Nv = Nv
+        self._frame = frame
+        self._zip = zipfile.ZipFile(fname, "w", zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED, allowZip64=True)
+        self._index = list()
+
+    def _write(self, name: str, a) -> None:
+        """
+        Write array as .npy member of the container
+        """
+        with self._zip.open(name + ".npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.ascontiguousarray(a), allow_pickle=False)
+
+    def add(self, i: int, surface, tag: str = "", Nu: int = None, Nv: int = None) -> bool:
+        """
+        Given face index, its surface and tag (sphere, cone, trim, ...),
+        sample it and store, returns False if surface is unbounded
+        """
+        import CADhelpers
+        import surface_sampler
+
+        Nu = self._Nu if Nu is None else Nu
+        Nv = self._Nv if Nv is None else Nv
+
+        grid = surface_sampler.sample_grid(surface, Nu, Nv)
+        if grid is None:
+            return False
+
+        xyz, uv = grid
+        self._write(_member(i, "xyz"), self._frame(xyz))
+        self._write(_member(i, "uv"),  uv)
+
+        kind, _ = surface_sampler.resolve(surface)
+        self._index.append({"face":   i,
+                            "tag":    tag,
+                            "kind":   CADhelpers.get_surface(surface),
+                            "basis":  kind,
+                            "bounds": list(surface.Bounds()),
+                            "Nu":     Nu,
+                            "Nv":     Nv,
+                            "frame":  self._frame.matrix.tolist()})
+        return True
+
+    def close(self) -> None:
+        """
+        Write the index and close the container
+        """
+        if self._zip is None:
+            return
+        self._write(INDEX, np.array(json.dumps(self._index)))
+        self._zip.close()
+        self._zip = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class GnuplotDump(object):
+    """
+    Same interface as SurfaceArchive, writes tag_i.dat gnuplot text file per face
+    """
+
+    def __init__(self, Nu: int = 40, Nv: int = 40):
+        """
+        Constructor, Nu and Nv are default grid size
+        """
+        self._Nu = Nu
+        self._Nv = Nv
+
+    def add(self, i: int, surface, tag: str = "", Nu: int = None, Nv: int = None) -> bool:
+        """
+        Given face index, its surface and tag, write tag_i.dat,
+        returns False if surface is unbounded
+        """
+        import CADhelpers
+
+        blocks = CADhelpers.surface2gnuplot(surface, self._Nu if Nu is None else Nu, self._Nv if Nv is None else Nv)
+        CADhelpers.save_gnuplot_surface(tag, i, blocks, True)
+        return blocks is not None
+
+    def close(self) -> None:
+        """
+        Nothing to close, every file is written in add()
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_index(fname: str):
+    """
+    Given container name, returns list of face records
+    """
+    with np.load(fname, allow_pickle=False) as npz:
+        return json.loads(npz[INDEX].item())
+
+
+def load_face(fname: str, i: int):
+    """
+    Given container name and face index, returns (xyz, uv) arrays
+    of this face only, other faces are not read
+    """
+    with np.load(fname, allow_pickle=False) as npz:
+        return (npz[_member(i, "xyz")], npz[_member(i, "uv")])
+
+
+if __name__ == "__main__":
+
+    import sys
+
+    fname = sys.argv[1] if len(sys.argv) > 1 else "faces.npz"
+    for rec in load_index(fname):
+        xyz, uv = load_face(fname, rec["face"])
+        print("{0:4d} {1:6s} {2:32s} {3} {4}".format(rec["face"], rec["tag"], rec["basis"], xyz.shape, rec["bounds"]))
@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+
+import math
+import numpy as np
+
+import OCC.gp
+import OCC.Geom
+
+import CADhelpers
+
+from Idx import X, Y, Z
+
+r"""This module implements vectorized sampling of the surfaces on a (u, v) grid"""
+
+BIG: float = 2.0e99 # OCC marks infinite bounds with 2e100
+
+
+def ax3_frame(ax3):
+    """
+    Given the gp_Ax3 position, returns origin and X, Y, Z directions as numpy arrays
+    """
+    o  = ax3.Location()
+    xd = ax3.XDirection()
+    yd = ax3.YDirection()
+    zd = ax3.Direction()
+
+    return (np.array([o.X(),  o.Y(),  o.Z()]),
+            np.array([xd.X(), xd.Y(), xd.Z()]),
+            np.array([yd.X(), yd.Y(), yd.Z()]),
+            np.array([zd.X(), zd.Y(), zd.Z()]))
+
+
+def _combine(frame, a, b, c):
+    """
+    Given the frame and coefficient arrays, returns O + a*XD + b*YD + c*ZD
+    """
+    o, xd, yd, zd = frame
+    return o + a[..., None]*xd + b[..., None]*yd + c[..., None]*zd
+
+
+def _direction(frame, a, b, c):
+    """
+    Given the frame and coefficient arrays, returns a*XD + b*YD + c*ZD
+    """
+    o, xd, yd, zd = frame
+    return a[..., None]*xd + b[..., None]*yd + c[..., None]*zd
+
+
+def _sphere(surface, u, v):
+    """
+    Closed form of the Geom_SphericalSurface, see ElSLib::SphereValue
+    """
+    sphere = surface.Sphere()
+    R  = sphere.Radius()
+    rc = R * np.cos(v)
+    return _combine(ax3_frame(sphere.Position()), rc*np.cos(u), rc*np.sin(u), R*np.sin(v))
+
+
+def _cone(surface, u, v):
+    """
+    Closed form of the Geom_ConicalSurface, see ElSLib::ConeValue
+    """
+    cone = surface.Cone()
+    a  = cone.SemiAngle()
+    rc = cone.RefRadius() + v*np.sin(a)
+    return _combine(ax3_frame(cone.Position()), rc*np.cos(u), rc*np.sin(u), v*np.cos(a))
+
+
+def _plane(surface, u, v):
+    """
+    Closed form of the Geom_Plane, see ElSLib::PlaneValue
+    """
+    return _combine(ax3_frame(surface.Pln().Position()), u, v, np.zeros_like(u))
+
+
+def _cylinder(surface, u, v):
+    """
+    Closed form of the Geom_CylindricalSurface, see ElSLib::CylinderValue
+    """
+    cylinder = surface.Cylinder()
+    R = cylinder.Radius()
+    return _combine(ax3_frame(cylinder.Position()), R*np.cos(u), R*np.sin(u), v)
+
+
+def _torus(surface, u, v):
+    """
+    Closed form of the Geom_ToroidalSurface, see ElSLib::TorusValue
+    """
+    torus = surface.Torus()
+    r  = torus.MinorRadius()
+    rc = torus.MajorRadius() + r*np.cos(v)
+    return _combine(ax3_frame(torus.Position()), rc*np.cos(u), rc*np.sin(u), r*np.sin(v))
+
+
+# surface kind to closed form evaluator
+analytic = {"Geom_SphericalSurface":   _sphere,
+            "Geom_ConicalSurface":     _cone,
+            "Geom_Plane":              _plane,
+            "Geom_CylindricalSurface": _cylinder,
+            "Geom_ToroidalSurface":    _torus}
+
+
+def _sphere_dv(surface, u, v):
+    """
+    Closed form of the Geom_SphericalSurface derivative along v, see ElSLib::SphereD1
+    """
+    sphere = surface.Sphere()
+    R  = sphere.Radius()
+    rs = -R * np.sin(v)
+    return _direction(ax3_frame(sphere.Position()), rs*np.cos(u), rs*np.sin(u), R*np.cos(v))
+
+
+def _cone_dv(surface, u, v):
+    """
+    Closed form of the Geom_ConicalSurface derivative along v, see ElSLib::ConeD1
+    """
+    cone = surface.Cone()
+    a  = cone.SemiAngle()
+    sa = np.full_like(v, math.sin(a))
+    return _direction(ax3_frame(cone.Position()), sa*np.cos(u), sa*np.sin(u), np.full_like(v, math.cos(a)))
+
+
+def _plane_dv(surface, u, v):
+    """
+    Closed form of the Geom_Plane derivative along v
+    """
+    return _direction(ax3_frame(surface.Pln().Position()), np.zeros_like(u), np.ones_like(v), np.zeros_like(u))
+
+
+def _cylinder_dv(surface, u, v):
+    """
+    Closed form of the Geom_CylindricalSurface derivative along v
+    """
+    return _direction(ax3_frame(surface.Cylinder().Position()), np.zeros_like(u), np.zeros_like(u), np.ones_like(v))
+
+
+def _torus_dv(surface, u, v):
+    """
+    Closed form of the Geom_ToroidalSurface derivative along v, see ElSLib::TorusD1
+    """
+    torus = surface.Torus()
+    r  = torus.MinorRadius()
+    rs = -r*np.sin(v)
+    return _direction(ax3_frame(torus.Position()), rs*np.cos(u), rs*np.sin(u), r*np.cos(v))
+
+
+# surface kind to closed form derivative along v
+analytic_dv = {"Geom_SphericalSurface":   _sphere_dv,
+               "Geom_ConicalSurface":     _cone_dv,
+               "Geom_Plane":              _plane_dv,
+               "Geom_CylindricalSurface": _cylinder_dv,
+               "Geom_ToroidalSurface":    _torus_dv}
+
+
+def basis_functions(knots, p: int, n: int, t):
+    """
+    Given flat knot vector, degree p, number of poles n and parameters t,
+    returns (span, N) where N[:, k] is the value of the basis function span-p+k,
+    see The NURBS Book, A2.1 and A2.2, here done for all parameters at once
+    """
+    t = np.asarray(t, dtype=np.float64).ravel()
+    m = len(t)
+
+    span = np.clip(np.searchsorted(knots, t, side="right") - 1, p, n - 1)
+
+    N     = np.zeros((m, p+1))
+    left  = np.zeros((m, p+1))
+    right = np.zeros((m, p+1))
+    N[:, 0] = 1.0
+    for j in range(1, p+1):
+        left[:, j]  = t - knots[span + 1 - j]
+        right[:, j] = knots[span + j] - t
+        saved = np.zeros(m)
+        for r in range(j):
+            denom = right[:, r+1] + left[:, j-r]
+            temp  = np.divide(N[:, r], denom, out=np.zeros(m), where=denom != 0.0)
+            N[:, r] = saved + right[:, r+1]*temp
+            saved   = left[:, j-r]*temp
+        N[:, j] = saved
+
+    return (span, N)
+
+
+def basis_matrix(knots, p: int, n: int, t) -> np.ndarray:
+    """
+    Given flat knot vector, degree p, number of poles n and parameters t,
+    returns dense (len(t), n) matrix of basis function values
+    """
+    span, N = basis_functions(knots, p, n, t)
+    B = np.zeros((len(span), n))
+    rows = np.arange(len(span))[:, None]
+    B[rows, span[:, None] - p + np.arange(p+1)] = N
+    return B
+
+
+class BSplineEvaluator(object):
+    """
+    Evaluates Geom_BSplineSurface with numpy, poles, weights
+    and knots are extracted from OCC once
+    """
+
+    def __init__(self, surface):
+        """
+        Constructor. Build evaluator from Geom_BSplineSurface,
+        periodic directions are converted on a copy to the non-periodic form
+        """
+        self._uperiod = None
+        self._vperiod = None
+
+        if surface.IsUPeriodic() or surface.IsVPeriodic():
+            U1, U2, V1, V2 = surface.Bounds()
+            if surface.IsUPeriodic():
+                self._uperiod = (U1, U2 - U1)
+            if surface.IsVPeriodic():
+                self._vperiod = (V1, V2 - V1)
+            surface = OCC.Geom.Handle_Geom_BSplineSurface.DownCast(surface.Copy()).GetObject()
+            if surface.IsUPeriodic():
+                surface.SetUNotPeriodic()
+            if surface.IsVPeriodic():
+                surface.SetVNotPeriodic()
+
+        self._p  = surface.UDegree()
+        self._q  = surface.VDegree()
+        self._nu = surface.NbUPoles()
+        self._nv = surface.NbVPoles()
+
+        self._uknots = np.repeat([surface.UKnot(i) for i in range(1, surface.NbUKnots()+1)],
+                                 [surface.UMultiplicity(i) for i in range(1, surface.NbUKnots()+1)])
+        self._vknots = np.repeat([surface.VKnot(i) for i in range(1, surface.NbVKnots()+1)],
+                                 [surface.VMultiplicity(i) for i in range(1, surface.NbVKnots()+1)])
+
+        # homogeneous poles, (nu, nv, 4)
+        pw = np.empty((self._nu, self._nv, 4))
+        for i in range(self._nu):
+            for j in range(self._nv):
+                pt = surface.Pole(i+1, j+1)
+                w  = surface.Weight(i+1, j+1)
+                pw[i, j] = (w*pt.X(), w*pt.Y(), w*pt.Z(), w)
+        self._pw = pw
+
+    @staticmethod
+    def _wrap(t, period):
+        """
+        Bring parameters of the periodic direction into the base period
+        """
+        if period is None:
+            return t
+        t0, T = period
+        return t0 + np.mod(t - t0, T)
+
+    def grid(self, us, vs) -> np.ndarray:
+        """
+        Given 1D parameter arrays, returns (len(us), len(vs), 3) positions
+        """
+        Bu = basis_matrix(self._uknots, self._p, self._nu, self._wrap(us, self._uperiod))
+        Bv = basis_matrix(self._vknots, self._q, self._nv, self._wrap(vs, self._vperiod))
+        h  = np.einsum("ik,klc,jl->ijc", Bu, self._pw, Bv, optimize=True)
+        return h[..., :3] / h[..., 3:]
+
+    def __call__(self, u, v) -> np.ndarray:
+        """
+        Given broadcastable parameter arrays, returns positions with shape + (3,)
+        """
+        u, v = np.broadcast_arrays(u, v)
+        shape = u.shape
+
+        su, Nu = basis_functions(self._uknots, self._p, self._nu, self._wrap(u, self._uperiod))
+        sv, Nv = basis_functions(self._vknots, self._q, self._nv, self._wrap(v, self._vperiod))
+
+        iu = su[:, None] - self._p + np.arange(self._p+1)
+        iv = sv[:, None] - self._q + np.arange(self._q+1)
+        h  = np.einsum("mk,ml,mklc->mc", Nu, Nv, self._pw[iu[:, :, None], iv[:, None, :]])
+
+        return (h[:, :3] / h[:, 3:]).reshape(shape + (3,))
+
+
+def resolve(surface):
+    """
+    Given surface or its handle, returns (kind, surface) with the surface
+    downcasted to the actual type. Rectangular trimmed surfaces over
+    analytic or B-spline basis are unwrapped, they share parametrization with the basis
+    """
+    ss = surface
+    if "Handle" in str(type(ss)):
+        ss = CADhelpers.cast_surface(surface).GetObject()
+
+    kind = CADhelpers.get_surface(ss)
+    if kind == "Geom_RectangularTrimmedSurface":
+        bs = CADhelpers.cast_surface(ss.BasisSurface())
+        if bs is not None:
+            bs = bs.GetObject()
+            bk = CADhelpers.get_surface(bs)
+            if bk in analytic or bk == "Geom_BSplineSurface":
+                return (bk, bs)
+
+    return (kind, ss)
+
+
+def _evaluate_occ(surface, u, v):
+    """
+    Evaluate surface with OCC D0 into preallocated array,
+    used for surfaces without closed form or numpy evaluator
+    """
+    rc = np.empty(u.shape + (3,), dtype=np.float64)
+    flat = rc.reshape(-1, 3)
+
+    pt = OCC.gp.gp_Pnt()
+    D0 = surface.D0
+    for k, (uu, vv) in enumerate(zip(u.ravel().tolist(), v.ravel().tolist())):
+        D0(uu, vv, pt)
+        flat[k, X] = pt.X()
+        flat[k, Y] = pt.Y()
+        flat[k, Z] = pt.Z()
+
+    return rc
+
+
+def _derivative_v_occ(surface, u, v):
+    """
+    Evaluate surface derivative along v with OCC D1 into preallocated array,
+    used for surfaces without closed form
+    """
+    rc = np.empty(u.shape + (3,), dtype=np.float64)
+    flat = rc.reshape(-1, 3)
+
+    pt = OCC.gp.gp_Pnt()
+    du = OCC.gp.gp_Vec()
+    dv = OCC.gp.gp_Vec()
+    D1 = surface.D1
+    for k, (uu, vv) in enumerate(zip(u.ravel().tolist(), v.ravel().tolist())):
+        D1(uu, vv, pt, du, dv)
+        flat[k, X] = dv.X()
+        flat[k, Y] = dv.Y()
+        flat[k, Z] = dv.Z()
+
+    return rc
+
+
+def evaluate(surface, u, v) -> np.ndarray:
+    """
+    Given surface (or handle) and broadcastable arrays of parameters,
+    returns array of shape broadcast(u, v).shape + (3,) with the positions
+    """
+    u, v = np.broadcast_arrays(np.asarray(u, dtype=np.float64), np.asarray(v, dtype=np.float64))
+
+    kind, ss = resolve(surface)
+    f = analytic.get(kind)
+    if f is not None:
+        return f(ss, u, v)
+
+    if kind == "Geom_BSplineSurface":
+        return BSplineEvaluator(ss)(u, v)
+
+    return _evaluate_occ(ss, u, v)
+
+
+def derivative_v(surface, u, v) -> np.ndarray:
+    """
+    Given surface (or handle) and broadcastable arrays of parameters,
+    returns array of shape broadcast(u, v).shape + (3,) with the derivatives along v
+    """
+    u, v = np.broadcast_arrays(np.asarray(u, dtype=np.float64), np.asarray(v, dtype=np.float64))
+
+    kind, ss = resolve(surface)
+    f = analytic_dv.get(kind)
+    if f is not None:
+        return f(ss, u, v)
+
+    return _derivative_v_occ(ss, u, v)
+
+
+def sample(surface, us, vs) -> np.ndarray:
+    """
+    Given surface and 1D arrays of parameters, returns
+    (len(us), len(vs), 3) array of positions on the tensor grid
+    """
+    us = np.asarray(us, dtype=np.float64)
+    vs = np.asarray(vs, dtype=np.float64)
+
+    kind, ss = resolve(surface)
+    if kind == "Geom_BSplineSurface":
+        return BSplineEvaluator(ss).grid(us, vs)
+
+    return evaluate(ss, us[:, None], vs[None, :])
+
+
+def grid_params(surface, Nu: int = 40, Nv: int = 40):
+    """
+    Given surface, returns u and v 1D parameter grids spanning the bounds,
+    None if the surface is unbounded
+    """
+    U1, U2, V1, V2 = surface.Bounds()
+
+    for b in (U1, U2, V1, V2):
+        if b > BIG or b < -BIG:
+            return None
+
+    return (np.linspace(U1, U2, Nu+1), np.linspace(V1, V2, Nv+1))
+
+
+def sample_grid(surface, Nu: int = 40, Nv: int = 40):
+    """
+    Sample surface on the regular (Nu+1)x(Nv+1) grid over its bounds.
+
+    Returns tuple of C-contiguous arrays, positions with shape (Nu+1, Nv+1, 3)
+    and parameters with shape (Nu+1, Nv+1, 2), or None if surface is unbounded
+    """
+    params = grid_params(surface, Nu, Nv)
+    if params is None:
+        return None
+
+    us, vs = params
+    u, v = np.meshgrid(us, vs, indexing="ij")
+
+    xyz = np.ascontiguousarray(sample(surface, us, vs))
+    uv  = np.ascontiguousarray(np.stack((u, v), axis=-1))
+
+    return (xyz, uv)
+
+
+def sample_rows(surface, Nu: int = 40, Nv: int = 40):
+    """
+    Given surface, yields (positions, parameters) of the regular (Nu+1)x(Nv+1)
+    grid one U row at a time, with shapes (Nv+1, 3) and (Nv+1, 2).
+    Surface is resolved and B-spline poles are extracted once, memory does not depend on Nu
+    """
+    params = grid_params(surface, Nu, Nv)
+    if params is None:
+        return
+
+    us, vs = params
+
+    kind, ss = resolve(surface)
+    f = analytic.get(kind)
+    if f is not None:
+        row = lambda u: f(ss, np.full_like(vs, u), vs)
+    elif kind == "Geom_BSplineSurface":
+        ev  = BSplineEvaluator(ss)
+        row = lambda u: ev.grid(np.array([u]), vs)[0]
+    else:
+        row = lambda u: _evaluate_occ(ss, np.full_like(vs, u), vs)
+
+    for u in us.tolist():
+        yield (row(u), np.stack((np.full_like(vs, u), vs), axis=-1))
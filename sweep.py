@@ -0,0 +1,191 @@
+# coding: utf-8
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import itertools
+
+from concurrent.futures import ProcessPoolExecutor
+
+import icp_io
+
+r"""This module sweeps ICP parameters: geometry is sampled once, every parameter set
+is an array transform of the cached base profiles, variants are written in parallel"""
+
+logger = logging.getLogger(__name__)
+
+
+def grid(**axes):
+    """
+    Given parameter names with lists of values, returns list of dicts,
+    one per combination, last parameter changes fastest
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def variant_name(params) -> str:
+    """
+    Given parameter set, returns its folder name, like DistanceToTop=-101.0_FlapperShift=-4.22
+    """
+    return "_".join("{0}={1}".format(k, float(v)) for k, v in params.items())
+
+
+class CupBase(object):
+    """
+    Sampled walls of a cup, variant is the ICP shift DistanceToTop + FlapperShift
+    """
+
+    defaults = {"DistanceToTop": -101.0, "FlapperShift": -4.22}
+
+    def __init__(self, RU, OuterCup, InnerCup, yiw, riw, yow, row):
+        """
+        Constructor. Keep header and wall arrays
+        """
+        self.header = (str(RU), str(OuterCup), str(InnerCup))
+        self._walls = (yiw, riw, yow, row)
+
+    @classmethod
+    def from_step(cls, filename: str, InnerCup: str = "S01", outer_faces = None, inner_faces = None,
+                  Nv: int = 40, tol: float = None):
+        """
+        Given STEP filename, reads and samples the cup once
+        """
+        import import_cup
+
+        return cls("8", "1", InnerCup, *import_cup.shells(filename, outer_faces, inner_faces, Nv, tol))
+
+    def variant(self, DistanceToTop: float = -101.0, FlapperShift: float = -4.22) -> icp_io.Cup:
+        """
+        Given parameters, returns Cup of the variant
+        """
+        return icp_io.make_cup(*self.header, DistanceToTop + FlapperShift, *self._walls)
+
+
+class OuterCupBase(object):
+    """
+    Sampled inner wall and offset curve of the outer wall of an outer cup,
+    variant is the ICP shift DistanceToCup and wall thickness
+    """
+
+    defaults = {"DistanceToCup": -101.0, "thickness": 2.0}
+
+    def __init__(self, RU, OuterCup, InnerCup, inner, samples):
+        """
+        Constructor. Keep header, (yiw, riw) arrays and outer_cup_samples()
+        """
+        self.header = (str(RU), str(OuterCup), str(InnerCup))
+        self._inner   = inner
+        self._samples = samples
+
+    @classmethod
+    def from_step(cls, filename: str, InnerCup: str = "G01", outer_faces = None, inner_faces = None,
+                  Nv: int = 40, tol: float = None):
+        """
+        Given STEP filename, reads and samples the outer cup once
+        """
+        import import_Ocup
+
+        return cls("8", "1", InnerCup, *import_Ocup.shell_samples(filename, outer_faces, inner_faces, Nv, tol))
+
+    def variant(self, DistanceToCup: float = -101.0, thickness: float = 2.0) -> icp_io.Cup:
+        """
+        Given parameters, returns Cup of the variant, outer wall is offset
+        from the cached samples, surfaces are not touched
+        """
+        import import_Ocup
+
+        yow, row = import_Ocup.make_outer_cup_shell(None, thickness, samples = self._samples)
+        yow, row = import_Ocup.outer_cup_fixup(yow, row)
+
+        return icp_io.make_cup(*self.header, DistanceToCup, *self._inner, yow, row)
+
+
+_base = None # base of the sweep in the worker process
+
+
+def _init_worker(base) -> None:
+    """
+    Worker initializer, base is sent once per process, not once per variant
+    """
+    global _base
+    _base = base
+
+
+def _write_chunk(outdir: str, chunk):
+    """
+    Given output folder and list of parameter sets, writes their ICP files,
+    returns list of (variant folder, file name)
+    """
+    rc = list()
+    for params in chunk:
+        cup   = _base.variant(**params)
+        vdir  = os.path.join(outdir, variant_name(params))
+        os.makedirs(vdir, exist_ok=True)
+        rc.append((vdir, icp_io.write(os.path.join(vdir, icp_io.icp_name(*_base.header)), cup)))
+    return rc
+
+
+def run_sweep(base, variants, outdir: str = "sweep_out", workers: int = None, chunksize: int = 16):
+    """
+    Given sampled base, list of parameter sets and output folder, writes one ICP file
+    per parameter set into its own subfolder, chunks of variants go to a process pool.
+    Writes sweep.json into outdir, returns (records, variants per second)
+    """
+    variants = [dict(base.defaults, **params) for params in variants]
+    chunks = [variants[k:k+chunksize] for k in range(0, len(variants), chunksize)]
+
+    os.makedirs(outdir, exist_ok=True)
+
+    t = time.perf_counter()
+    if workers == 1:
+        _init_worker(base)
+        written = [_write_chunk(outdir, chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(base,)) as pool:
+            written = list(pool.map(_write_chunk, itertools.repeat(outdir), chunks))
+    wall = time.perf_counter() - t
+
+    records = [{"params": params, "dir": vdir, "file": fname}
+               for params, (vdir, fname) in zip(variants, itertools.chain.from_iterable(written))]
+    rate = len(records) / wall if wall > 0.0 else float("inf")
+
+    with open(os.path.join(outdir, "sweep.json"), "w", encoding="utf-8") as f:
+        json.dump({"wall_seconds": wall, "variants_per_second": rate, "variants": records}, f, indent=1)
+
+    logger.info("{0} variants in {1:.3f}s, {2:.1f} variants/s".format(len(records), wall, rate))
+    return (records, rate)
+
+
+if __name__ == "__main__":
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s :: %(levelname)6s :: %(module)20s :: %(lineno)3d :: %(message)s')
+
+    parser = argparse.ArgumentParser(description="Write ICP variants of one cup for all combinations of the parameters")
+    parser.add_argument("step", help="STEP file of the cup")
+    parser.add_argument("--outer",         action="store_true", help="outer cup, swept over DistanceToCup and thickness")
+    parser.add_argument("--inner",         default=None, help="inner cup name, S01 for cup and G01 for outer cup by default")
+    parser.add_argument("--DistanceToTop", type=float, nargs="+", default=[-101.0])
+    parser.add_argument("--FlapperShift",  type=float, nargs="+", default=[-4.22])
+    parser.add_argument("--DistanceToCup", type=float, nargs="+", default=[-101.0])
+    parser.add_argument("--thickness",     type=float, nargs="+", default=[2.0])
+    parser.add_argument("--outdir",  default="sweep_out", help="output folder, one subfolder per variant")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    t = time.perf_counter()
+    if args.outer:
+        base = OuterCupBase.from_step(args.step, args.inner or "G01")
+        variants = grid(DistanceToCup=args.DistanceToCup, thickness=args.thickness)
+    else:
+        base = CupBase.from_step(args.step, args.inner or "S01")
+        variants = grid(DistanceToTop=args.DistanceToTop, FlapperShift=args.FlapperShift)
+    t = time.perf_counter() - t
+
+    records, rate = run_sweep(base, variants, args.outdir, args.workers)
+    print("sampled once in {0:.2f}s, {1} variants at {2:.1f} variants/s, index in {3}".format(t, len(records), rate, os.path.join(args.outdir, "sweep.json")))
+
+    sys.exit(0)